@@ -0,0 +1,284 @@
+# account_clustering.py
+
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import streamlit as st
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+from inference import request_inference, run_inferences
+from process_pools import process_pool
+from snapshot_cache import SNAPSHOT_DIR
+
+STRATEGY_COLUMNS = ['strategy1', 'strategy2', 'strategy3']
+VISIT_COLUMNS = ['salesvisit1', 'salesvisit2', 'salesvisit3', 'salesvisit4', 'salesvisit5']
+
+# Numbers of clusters tried; the one with the best silhouette score is kept
+CLUSTER_COUNTS = range(2, 11)
+
+# MiniBatchKMeans settings, and the accounts the silhouette score of each k is computed on
+BATCH_SIZE = 4096
+N_INIT = 3
+SILHOUETTE_SAMPLE = 5000
+CLUSTERING_SEED = 0
+
+# Column the cluster of each account is attached as
+CLUSTER_COLUMN = 'cluster'
+
+
+@dataclass
+class ClusteringResult:
+    features: pd.DataFrame  # One row per account (indexed by accid), one column per feature
+    assignments: pd.DataFrame  # 'accid' and 'cluster' (1 = largest cluster)
+    profiles: pd.DataFrame  # Mean of every feature per cluster, with the number of accounts
+    sweep: pd.DataFrame  # Per number of clusters: inertia and silhouette score
+    n_clusters: int
+
+    def summary(self):
+        return {
+            "Number of Clusters": self.n_clusters,
+            "Silhouette Score": self.sweep.loc[self.n_clusters, 'silhouette'],
+            "Cluster Profiles": self.profiles.to_dict(orient='index'),
+        }
+
+
+def account_features(df):
+    """
+    One feature vector per account from grouped aggregations over its rows: the share of each
+    strategy in its total spend, its average sales visits and size, its sales growth (the monthly
+    trend of sales relative to its average sales) and its average number of competitor brands.
+    Features whose columns are missing are left out.
+    """
+    columns = df.columns.str.strip().str.lower()
+    if 'accid' not in columns:
+        raise ValueError("Column 'accid' is required to cluster accounts.")
+    data = df.set_axis(columns, axis=1)
+    codes, accounts = pd.factorize(data['accid'])
+    keep = codes >= 0
+    codes = codes[keep]
+    n_accounts = len(accounts)
+
+    def numeric(col):
+        return pd.to_numeric(data[col], errors='coerce').to_numpy(dtype=float)[keep]
+
+    def grouped_mean(values):
+        present = ~np.isnan(values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (np.bincount(codes, weights=np.where(present, values, 0.0), minlength=n_accounts)
+                    / np.bincount(codes, weights=present, minlength=n_accounts))
+
+    features = {}
+
+    # Spend mix across the strategies
+    strategies = [col for col in STRATEGY_COLUMNS if col in columns]
+    if strategies:
+        spend = {col: np.bincount(codes, weights=np.nan_to_num(numeric(col)), minlength=n_accounts) for col in strategies}
+        total = sum(spend.values())
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for col in strategies:
+                features[f'{col} share'] = np.where(total > 0, spend[col] / total, np.nan)
+
+    for col in [col for col in VISIT_COLUMNS + ['accsize'] if col in columns]:
+        features[col] = grouped_mean(numeric(col))
+
+    # Sales growth: least-squares slope of sales on the month, relative to the average sales
+    if 'sales' in columns and 'month' in columns:
+        month = pd.to_datetime(data['month'], errors='coerce')[keep]
+        t = (month.dt.year * 12 + month.dt.month).to_numpy(dtype=float)
+        sales = numeric('sales')
+        present = ~(np.isnan(t) | np.isnan(sales))
+        t = np.where(present, t - np.nanmean(t), 0.0)
+        sales = np.where(present, sales, 0.0)
+
+        def sums(weights):
+            return np.bincount(codes, weights=weights, minlength=n_accounts)
+
+        n, sum_t, sum_s = sums(present.astype(float)), sums(t), sums(sales)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (n * sums(t * sales) - sum_t * sum_s) / (n * sums(t * t) - sum_t ** 2)
+            features['sales growth'] = np.where(sum_s != 0, slope / (sum_s / n), np.nan)
+
+    if 'compbrand' in columns:
+        features['compbrand exposure'] = grouped_mean(numeric('compbrand'))
+
+    if not features:
+        raise ValueError("No feature columns (strategies, sales visits, size, sales or competitor brands) to cluster on.")
+    return pd.DataFrame(features, index=pd.Index(accounts, name='accid'))
+
+
+def standardize(features):
+    """
+    Features scaled to mean 0 and standard deviation 1, with missing values (and constant
+    features) at 0.
+    """
+    values = features.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+    return np.nan_to_num(scaled, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _fit_k(X, k, sample, seed):
+    """
+    Cluster X into k clusters with MiniBatchKMeans. Runs in a worker process.
+    Returns (labels, inertia, silhouette score on the sample rows).
+    """
+    model = MiniBatchKMeans(n_clusters=k, batch_size=BATCH_SIZE, n_init=N_INIT, random_state=seed)
+    labels = model.fit_predict(X)
+    if len(np.unique(labels[sample])) < 2:
+        return labels, model.inertia_, np.nan
+    return labels, model.inertia_, silhouette_score(X[sample], labels[sample])
+
+
+def compute_account_clusters(df, cluster_counts=CLUSTER_COUNTS, seed=CLUSTERING_SEED, max_workers=None):
+    """
+    Behavioural segmentation: cluster the accounts on their feature vectors (see account_features)
+    with MiniBatchKMeans for every number of clusters in cluster_counts, in parallel across a
+    process pool, and keep the clustering with the best silhouette score. The score is computed
+    on a sample of SILHOUETTE_SAMPLE accounts, so the sweep stays fast with 100k+ accounts.
+    Clusters are numbered from 1 by decreasing size.
+    """
+    features = account_features(df)
+    X = standardize(features)
+    cluster_counts = [k for k in cluster_counts if 1 < k < len(X)]
+    if not cluster_counts:
+        raise ValueError(f"Not enough accounts ({len(X)}) to cluster.")
+
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(X), size=min(SILHOUETTE_SAMPLE, len(X)), replace=False))
+    tasks = [(X, k, sample, seed) for k in cluster_counts]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(tasks))
+    if max_workers > 1:
+        with process_pool(max_workers) as executor:
+            fits = list(executor.map(_fit_k, *zip(*tasks)))
+    else:
+        fits = [_fit_k(*task) for task in tasks]
+
+    sweep = pd.DataFrame(
+        [(k, inertia, silhouette) for k, (_, inertia, silhouette) in zip(cluster_counts, fits)],
+        columns=['k', 'inertia', 'silhouette'],
+    ).set_index('k')
+    best = int(sweep['silhouette'].fillna(-1).idxmax())
+    labels = fits[cluster_counts.index(best)][0]
+
+    # Number the clusters by decreasing size
+    sizes = np.bincount(labels, minlength=best)
+    order = np.argsort(-sizes, kind='stable')
+    rank = np.empty(best, dtype=np.int64)
+    rank[order] = np.arange(1, best + 1)
+    clusters = rank[labels]
+
+    assignments = pd.DataFrame({'accid': features.index, CLUSTER_COLUMN: clusters})
+    profiles = features.groupby(clusters).mean()
+    profiles.insert(0, 'accounts', np.bincount(clusters)[1:])
+    profiles.index.name = CLUSTER_COLUMN
+    return ClusteringResult(features, assignments, profiles, sweep, best)
+
+
+def cluster_paths(base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Where the cluster assignments of a table's accounts are stored, next to the table's snapshot:
+    (assignments, metadata).
+    """
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', f"{base_id}__{table_name}")
+    return (
+        os.path.join(snapshot_dir, f"{slug}.clusters.parquet"),
+        os.path.join(snapshot_dir, f"{slug}.clusters.json"),
+    )
+
+
+def save_assignments(result, base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    data_path, meta_path = cluster_paths(base_id, table_name, snapshot_dir)
+
+    # Write to temporary files first so an interrupted save never leaves torn assignments
+    assignments = result.assignments.assign(accid=result.assignments['accid'].astype(str))
+    assignments.to_parquet(data_path + '.tmp', index=False)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump({
+            'n_clusters': result.n_clusters,
+            'features': list(result.features.columns),
+            'silhouette': float(result.sweep.loc[result.n_clusters, 'silhouette']),
+        }, f, indent=2)
+    os.replace(data_path + '.tmp', data_path)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def load_assignments(base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Load stored cluster assignments ('accid' and 'cluster'), or None if there are none (or they
+    cannot be read).
+    """
+    data_path, _ = cluster_paths(base_id, table_name, snapshot_dir)
+    if not os.path.exists(data_path):
+        return None
+    try:
+        return pd.read_parquet(data_path)
+    except (OSError, ValueError):
+        return None
+
+
+def attach_clusters(df, assignments):
+    """
+    df with the cluster of each row's account in CLUSTER_COLUMN (missing for accounts without
+    one). The lookup is done once per distinct account.
+    """
+    codes, accounts = pd.factorize(df['accid'])
+    lookup = pd.Series(assignments[CLUSTER_COLUMN].to_numpy(), index=assignments['accid'].astype(str))
+    lookup = lookup[~lookup.index.duplicated()]
+    per_account = lookup.reindex(pd.Index(accounts).astype(str)).to_numpy(dtype=float)
+    clusters = np.where(codes >= 0, per_account[codes], np.nan)
+    return df.assign(**{CLUSTER_COLUMN: pd.array(clusters, dtype='Int64')})
+
+
+def render_account_clusters(result):
+    """
+    Display the behavioural clusters: the k sweep, the cluster sizes and their feature profiles.
+    """
+    st.header("Behavioural Segmentation: Account Clusters")
+    st.write(f"{len(result.assignments):,} accounts in {result.n_clusters} clusters "
+             f"(silhouette score {result.sweep.loc[result.n_clusters, 'silhouette']:.3f}).")
+
+    # Silhouette score of every number of clusters tried
+    fig, ax = plt.subplots(figsize=(10, 4))
+    ax.plot(result.sweep.index, result.sweep['silhouette'], marker='o')
+    ax.axvline(result.n_clusters, color='red', linestyle='--', label=f'Chosen: {result.n_clusters} clusters')
+    ax.set_xlabel('Number of clusters')
+    ax.set_ylabel(f'Silhouette score ({SILHOUETTE_SAMPLE:,}-account sample)')
+    ax.legend()
+    ax.grid(True)
+    st.pyplot(fig)
+    plt.close(fig)
+
+    st.subheader("Cluster Profiles (Average Feature Values)")
+    st.dataframe(result.profiles)
+
+    # Profiles relative to all accounts, so the features are comparable
+    features = result.profiles.drop(columns='accounts')
+    overall = result.features.mean()
+    spread = result.features.std().replace(0, np.nan)
+    fig, ax = plt.subplots(figsize=(12, 6))
+    sns.heatmap((features - overall) / spread, annot=True, fmt='.2f', cmap='coolwarm', center=0, ax=ax)
+    ax.set_title('Cluster Profiles (Standard Deviations From the Average Account)')
+    st.pyplot(fig)
+    plt.close(fig)
+
+    return [request_inference(result.summary(), "Behavioural Account Segmentation")]
+
+
+def cluster_accounts(df):
+    """
+    Cluster the accounts on their behaviour and display the clusters.
+    """
+    result = compute_account_clusters(df)
+    run_inferences(render_account_clusters(result))
+    return result.summary()
@@ -0,0 +1,190 @@
+# airtable_loader.py
+
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+
+import pandas as pd
+import requests
+
+AIRTABLE_API_URL = "https://api.airtable.com/v0"
+
+# Characters that follow the "rec" prefix of an Airtable record ID
+RECORD_ID_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def record_id_partitions(n_partitions):
+    """
+    Split a table into disjoint slices on the first character after the "rec" prefix
+    of the record ID, so that each slice can be paginated independently.
+
+    Returns a list of filterByFormula strings ([None] means "the whole table").
+    """
+    if n_partitions <= 1:
+        return [None]
+
+    chunk_size = -(-len(RECORD_ID_ALPHABET) // n_partitions)  # Ceiling division
+    chunks = [
+        RECORD_ID_ALPHABET[start:start + chunk_size]
+        for start in range(0, len(RECORD_ID_ALPHABET), chunk_size)
+    ]
+    return [f"REGEX_MATCH(RECORD_ID(), '^rec[{chunk}]')" for chunk in chunks]
+
+
+def _retry_delay(retry_after, fallback):
+    """
+    Seconds to wait before retrying, from a Retry-After header (delay in seconds or HTTP-date),
+    or the fallback when the header is missing or cannot be parsed.
+    """
+    if not retry_after:
+        return fallback
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return fallback
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _get_page(session, url, params, timeout, max_retries, backoff):
+    """
+    Fetch a single page, retrying with exponential backoff on rate limits (429) and server errors.
+    """
+    for attempt in range(max_retries + 1):
+        response = session.get(url, params=params, timeout=timeout)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            if attempt == max_retries:
+                response.raise_for_status()
+
+            # Honour the server's hint when it gives one, otherwise back off exponentially
+            delay = _retry_delay(response.headers.get('Retry-After'), backoff * 2 ** attempt)
+            time.sleep(delay + random.uniform(0, backoff))
+            continue
+
+        response.raise_for_status()
+        return response.json()
+
+
+def _page_to_frame(records, record_id_column=None):
+    """
+    Convert one page of Airtable records into a small columnar DataFrame.
+    """
+    columns = {}
+    for position, record in enumerate(records):
+        for name, value in record.get('fields', {}).items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = [None] * len(records)
+            column[position] = value
+
+    frame = pd.DataFrame(columns, index=pd.RangeIndex(len(records)))
+    if record_id_column:
+        frame.insert(0, record_id_column, [record['id'] for record in records])
+    return frame
+
+
+def _fetch_partition(url, api_token, formula, page_size, fields, record_id_column,
+                     timeout, max_retries, backoff, events, stop):
+    """
+    Walk the offset chain of one partition, converting each page to columns as it arrives.
+    """
+    frames = []
+    params = {'pageSize': page_size}
+    if formula:
+        params['filterByFormula'] = formula
+    if fields:
+        params['fields[]'] = list(fields)
+
+    with requests.Session() as session:
+        session.headers['Authorization'] = f"Bearer {api_token}"
+
+        while not stop.is_set():
+            payload = _get_page(session, url, params, timeout, max_retries, backoff)
+            records = payload.get('records', [])
+            frames.append(_page_to_frame(records, record_id_column))
+            events.put(len(records))
+
+            offset = payload.get('offset')
+            if not offset:
+                break
+            params['offset'] = offset
+
+    return frames
+
+
+def fetch_table_frame(api_token, base_id, table_name, max_workers=4, partitions=None,
+                      page_size=100, fields=None, record_id_column=None, on_progress=None,
+                      api_url=AIRTABLE_API_URL, timeout=30, max_retries=5, backoff=1.0):
+    """
+    Load an Airtable table into a DataFrame, paginating several partitions concurrently.
+
+    Args:
+    api_token: Airtable API token
+    base_id: Airtable base ID
+    table_name: Airtable table name
+    max_workers: Size of the worker pool (concurrent requests in flight)
+    partitions: List of filterByFormula strings, one offset chain each
+        (defaults to record_id_partitions(max_workers); use [None] for a single chain)
+    page_size: Records per page (Airtable allows at most 100)
+    fields: Optional list of field names to fetch
+    record_id_column: If given, the Airtable record ID is stored in a column of this name
+    on_progress: Optional callback(records_loaded, pages_loaded), called from the calling thread
+    api_url: Root of the Airtable REST API (point this at a local stand-in server for testing)
+
+    Returns:
+    DataFrame containing the loaded data
+    """
+    if partitions is None:
+        partitions = record_id_partitions(max_workers)
+
+    url = f"{api_url.rstrip('/')}/{base_id}/{quote(table_name, safe='')}"
+    events = queue.Queue()
+    stop = threading.Event()
+    records_loaded = pages_loaded = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _fetch_partition, url, api_token, formula, page_size, fields, record_id_column,
+                timeout, max_retries, backoff, events, stop
+            )
+            for formula in partitions
+        ]
+
+        try:
+            # Report progress from this thread so the callback may safely touch Streamlit
+            while True:
+                try:
+                    n_records = events.get(timeout=0.1)
+                except queue.Empty:
+                    if any(future.done() and future.exception() for future in futures):
+                        break
+                    if all(future.done() for future in futures) and events.empty():
+                        break
+                    continue
+
+                records_loaded += n_records
+                pages_loaded += 1
+                if on_progress is not None:
+                    on_progress(records_loaded, pages_loaded)
+        finally:
+            stop.set()
+
+        frames = [frame for future in futures for frame in future.result()]
+
+    if not frames:
+        return pd.DataFrame()
+
+    # Concatenate once, after all pages have arrived
+    return pd.concat(frames, ignore_index=True, sort=False)
@@ -1,198 +1,362 @@
 import streamlit as st
 import pandas as pd
-from data_cleaning import clean_data
-from eda import plot_correlation_matrix, plot_sales_by_account_type, plot_sales_trend
-from regression import perform_regression
-from time_series_analysis import analyze_time_series
-from market_segmentation import perform_segmentation
-from competitor_analysis import run_competitor_analysis
-from future_budget import future_budget_forecasting, plot_weighted_budget_allocation
-from dollar_value_sales import calculate_sales_from_strategy
+from datetime import datetime, timezone
+from data_cleaning import clean_data, render_cleaning_report
+from eda import (
+    compute_correlation_matrix, render_correlation_matrix,
+    compute_sales_by_account_type, render_sales_by_account_type,
+    compute_sales_trend, render_sales_trend
+)
+from regression import INCREMENTAL_MODELS, SEGMENTATIONS, compute_regression, render_regression
+from time_series_analysis import TIME_SERIES_GRAINS, compute_time_series, render_time_series
+from market_segmentation import compute_segmentation, render_segmentation
+from competitor_analysis import compute_competitor_analysis, render_competitor_analysis
+from event_study import compute_event_study, entry_months, render_event_study
+from future_budget import (
+    compute_future_budget_forecast, render_future_budget_forecast,
+    compute_weighted_budget_allocation, render_weighted_budget_allocation
+)
+from dollar_value_sales import compute_sales_from_strategy, render_sales_from_strategy
 from simulate_reallocation_and_switching_cost import (
-    simulate_reallocation_and_switching_costs,
-    calculate_average_marginal_impact
+    compute_reallocation_and_switching_costs, render_reallocation_and_switching_costs,
+    compute_average_marginal_impact, render_average_marginal_impact
 )
-from inference import generate_inference
-from pyairtable import Api
-
-# Title of the Streamlit app
-st.title("Market Strategy Analyser")
-
-# Sidebar for Airtable Base ID and Table Name input
-st.sidebar.header("Airtable Input")
-
-# Option to use secrets or manual input
-use_secrets = st.sidebar.checkbox("Use credentials from secrets", value=True)
-
-if use_secrets:
-    airtable_token = st.secrets["airtable"]["token"]
-    base_id = st.secrets["airtable"]["base_id"]
-    table_name = st.secrets["airtable"]["table_name"]
-else:
-    airtable_token = st.sidebar.text_input("Enter your Airtable API Token:", "")
-    base_id = st.sidebar.text_input("Enter your Airtable Base ID:", "")
-    table_name = st.sidebar.text_input("Enter your Airtable Table Name:", "")
-
-# Initialize session state for the data if not already set
-if 'df_cleaned' not in st.session_state:
-    st.session_state.df_cleaned = None
-
-# Load data from Airtable
-if airtable_token and base_id and table_name:
-    st.sidebar.header("Data Processing")
-
-    if st.sidebar.button("Load and Clean Data"):
-        try:
-            api = Api(airtable_token)
-            table = api.table(base_id, table_name)
-            records = table.all()
-            df = pd.DataFrame([record['fields'] for record in records])
-            df_cleaned = clean_data(df)
-            st.session_state.df_cleaned = df_cleaned
-
-            # Display data types
-            st.write("Data Types of Cleaned DataFrame:")
-            st.write(df_cleaned.dtypes)
-
-            # Display the cleaned DataFrame
-            st.write("Cleaned Data:")
-            st.dataframe(df_cleaned)
-
-        except Exception as e:
-            st.error(f"Error loading or cleaning data: {e}")
-
-    # Analysis options
-    if st.session_state.df_cleaned is not None:
-        st.sidebar.header("Analysis")
-
-        # Correlation Matrix
-        if st.sidebar.button("Plot Correlation Matrix"):
-            try:
-                corr_matrix = plot_correlation_matrix(st.session_state.df_cleaned)
-                inference = generate_inference(f"Correlation matrix values: {corr_matrix}", "Correlation Matrix")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error plotting correlation matrix: {e}")
-
-        # Sales by Account Type
-        if st.sidebar.button("Plot Sales by Account Type"):
-            try:
-                sales_summary = plot_sales_by_account_type(st.session_state.df_cleaned)
-                inference = generate_inference(f"Sales summary by account type: {sales_summary}", "Sales by Account Type")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error plotting sales by account type: {e}")
-
-
-        # Sales Trend
-        if st.sidebar.button("Plot Sales Trend"):
-            try:
-                sales_trend = plot_sales_trend(st.session_state.df_cleaned)
-                inference = generate_inference(f"Sales trend over time: {sales_trend}", "Sales Trend")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error plotting sales trend: {e}")
-
-
-        # Regression Analysis
-        if st.sidebar.button("Run Regression Analysis"):
-            try:
-                model_summary = perform_regression(st.session_state.df_cleaned)
-                st.session_state.model = model_summary  # Store model in session state
-                inference = generate_inference(f"Regression results: {model_summary}", "Regression Analysis")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error performing regression analysis: {e}")
-
-        # Time Series Analysis
-        #if st.sidebar.button("Time Series Analysis"):
-            #try:
-                #time_series_summary = analyze_time_series(st.session_state.df_cleaned)
-                #inference = generate_inference(f"Time series analysis results: {time_series_summary}", "Time Series Analysis")
-                #st.write(inference)
-            #except Exception as e:
-                #st.error(f"Error performing time series analysis: {e}")
-
-        # Market Segmentation
-        if st.sidebar.button("Market Segmentation"):
-            try:
-                segmentation_summary = perform_segmentation(st.session_state.df_cleaned)
-                inference = generate_inference(f"Market segmentation summary: {segmentation_summary}", "Market Segmentation")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error performing market segmentation: {e}")
-
-        # Competitor Analysis
-        if st.sidebar.button("Competitor Analysis"):
+from inference import run_inferences
+from airtable_loader import fetch_table_frame
+from snapshot_cache import DELETION_CHECK_MAX_AGE, RECORD_ID_COLUMN, sync_table
+from result_cache import RESULT_CACHE, dataset_fingerprint
+from model_registry import MODEL_REGISTRY
+from fixed_effects import FIXED_EFFECTS
+from incremental_ols import update_model_stats
+from rollup_cube import CUBE_DIMENSIONS, build_rollup_cube, update_rollup_cube
+from arima_models import model_store_path
+from filter_index import build_filter_index, filtered_fingerprint, month_range, normalize_filters
+from account_clustering import (CLUSTER_COLUMN, attach_clusters, compute_account_clusters, load_assignments,
+                                render_account_clusters, save_assignments)
+
+
+def run_analysis(compute, **params):
+    """
+    Run a compute function on the cleaned data (restricted by the sidebar filters), reusing the
+    cached result when the same data and parameters were analysed before (in this or any other session).
+    """
+    return RESULT_CACHE.compute(
+        compute, st.session_state.df_view, fingerprint=st.session_state.view_fingerprint, **params
+    )
+
+
+def set_cleaned_data(df_cleaned):
+    """
+    Make df_cleaned the data every analysis runs on: its fingerprint and filter index are
+    rebuilt and the filtered view is reset.
+    """
+    st.session_state.df_cleaned = df_cleaned
+    st.session_state.df_fingerprint = dataset_fingerprint(df_cleaned)
+    st.session_state.filter_index = build_filter_index(df_cleaned)
+    st.session_state.pop('view_filters', None)
+
+
+def apply_filters(filters):
+    """
+    Set the filtered view of the cleaned data (rows, fingerprint and rollup cube) in the session.
+    The rows come from the filter index bitmaps and the view is kept until the filters change.
+    """
+    filters = normalize_filters(filters)
+    if st.session_state.get('view_filters') == filters and 'df_view' in st.session_state:
+        return
+    cube = st.session_state.rollup_cube
+    st.session_state.df_view = st.session_state.filter_index.select(st.session_state.df_cleaned, filters)
+    st.session_state.view_fingerprint = filtered_fingerprint(st.session_state.df_fingerprint, filters)
+    if cube is not None and filters:
+        # The cube only answers filters on its dimensions (not e.g. on behavioural clusters)
+        cube = cube.where(filters) if set(filters) <= set(CUBE_DIMENSIONS) else None
+    st.session_state.view_cube = cube
+    st.session_state.view_filters = filters
+
+
+# Pool workers import this script as '__mp_main__', so the page itself only runs as the main script
+if __name__ == '__main__':
+    # Title of the Streamlit app
+    st.title("Market Strategy Analyser")
+
+    # Sidebar for Airtable Base ID and Table Name input
+    st.sidebar.header("Airtable Input")
+
+    # Option to use secrets or manual input
+    use_secrets = st.sidebar.checkbox("Use credentials from secrets", value=True)
+
+    if use_secrets:
+        airtable_token = st.secrets["airtable"]["token"]
+        base_id = st.secrets["airtable"]["base_id"]
+        table_name = st.secrets["airtable"]["table_name"]
+    else:
+        airtable_token = st.sidebar.text_input("Enter your Airtable API Token:", "")
+        base_id = st.sidebar.text_input("Enter your Airtable Base ID:", "")
+        table_name = st.sidebar.text_input("Enter your Airtable Table Name:", "")
+
+    # Initialize session state for the data if not already set
+    if 'df_cleaned' not in st.session_state:
+        st.session_state.df_cleaned = None
+    if 'rollup_cube' not in st.session_state:
+        st.session_state.rollup_cube = None
+
+    # Load data from Airtable
+    if airtable_token and base_id and table_name:
+        st.sidebar.header("Data Processing")
+        use_snapshot = st.sidebar.checkbox("Use local snapshot (only fetch changed records)", value=True)
+        # Deleted records are only found by scanning every record ID, which takes one request per 100 records,
+        # so the scan runs on request or once the previous one is older than DELETION_CHECK_MAX_AGE
+        check_deletions = use_snapshot and st.sidebar.checkbox(
+            "Also check for deleted records (scans the whole table)", value=False,
+            help=f"Done automatically when the last check is more than {DELETION_CHECK_MAX_AGE.total_seconds() / 3600:.0f} hours old")
+
+        if st.sidebar.button("Load and Clean Data"):
             try:
-                competitor_summary = run_competitor_analysis(st.session_state.df_cleaned)
-                inference = generate_inference(f"Competitor analysis results: {competitor_summary}", "Competitor Analysis")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error performing competitor analysis: {e}")
-
-        if st.sidebar.button("Future Budget Forecasting"):
-            try:
-                budget_forecast = future_budget_forecasting()
-                inference = generate_inference(f"Budget forecasting results: {budget_forecast}", "Future Budget Forecasting")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error in Future Budget Forecasting: {e}")
-
-
-        # Weighted Budget Allocation
-        if st.sidebar.button("Weighted Budget Allocation"):
-            try:
-                weighted_budget_summary = plot_weighted_budget_allocation()
-                inference = generate_inference(f"Weighted budget allocation results: {weighted_budget_summary}", "Weighted Budget Allocation")
-                st.write(inference)
-            except Exception as e:
-                st.error(f"Error in Weighted Budget Allocation: {e}")
-
-        if st.sidebar.button("Dollar Value Sales Analysis"):
-            try:
-                # Calculate sales summary from the strategy
-                dollar_sales_summary = calculate_sales_from_strategy(st.session_state.df_cleaned)
-
-                # Check if a valid summary is returned before generating the inference
-                if dollar_sales_summary and len(dollar_sales_summary) > 0:
-                    # Generate inference using the OpenAI function
-                    inference = generate_inference(dollar_sales_summary, "Dollar Value Sales Analysis")
-                    st.write(f"Inference: {inference}")
+                # Fetch pages concurrently and show progress in the sidebar
+                progress_text = st.sidebar.empty()
+
+                def show_progress(records_loaded, pages_loaded):
+                    progress_text.text(f"Fetched {records_loaded:,} records ({pages_loaded:,} pages)")
+
+                if use_snapshot:
+                    sync = sync_table(airtable_token, base_id, table_name, detect_deletions=check_deletions,
+                                      on_progress=show_progress)
+                    df = sync.frame.drop(columns=[RECORD_ID_COLUMN])
+                    if not sync.full_reload:
+                        if sync.deletions_checked:
+                            age = datetime.now(timezone.utc) - sync.deletions_checked
+                            checked = (f"{sync.deletions_checked.strftime('%Y-%m-%d %H:%M UTC')}, "
+                                       f"{age.total_seconds() / 3600:.1f} hours ago")
+                        else:
+                            checked = "never"
+                        st.sidebar.caption(
+                            f"Snapshot synced: {len(sync.added):,} records fetched, "
+                            f"{len(sync.removed):,} replaced or deleted (deletions last checked: {checked}; "
+                            f"records deleted since then are still included)"
+                        )
                 else:
-                    # Show this warning only when there's no valid data summary
-                    st.warning("No data available for Dollar Value Sales Analysis.")
-            except Exception as e:
-                # Catch any exceptions and display error messages
-                st.error(f"Error calculating dollar value sales: {e}")
-
-
-        # Simulate Strategy Reallocation & Switching Costs
-        if st.sidebar.button("Simulate Strategy Reallocation & Switching Costs"):
-            try:
-                if 'model' in st.session_state:
-                    # Assuming the function `simulate_reallocation_and_switching_costs()` returns a summary or result
-                    reallocation_summary = simulate_reallocation_and_switching_costs(st.session_state.df_cleaned, st.session_state.model)
-            
-                    # Generate inference for the reallocation and switching costs analysis
-                    inference = generate_inference(reallocation_summary, "Strategy Reallocation & Switching Costs")
-                    st.write(inference)
+                    df = fetch_table_frame(airtable_token, base_id, table_name, on_progress=show_progress)
+                df_cleaned = clean_data(df)
+
+                # Reuse the behavioural clusters stored for this table, if any
+                assignments = load_assignments(base_id, table_name)
+                if assignments is not None:
+                    df_cleaned = attach_clusters(df_cleaned, assignments)
+                set_cleaned_data(df_cleaned)
+
+                # Keep the regression statistics and the rollup cube next to the snapshot,
+                # updated with only the changed rows (or months)
+                if use_snapshot:
+                    update_model_stats(sync, clean_data, df_cleaned, base_id, table_name, INCREMENTAL_MODELS)
+                    st.session_state.rollup_cube = update_rollup_cube(sync, clean_data, df_cleaned, base_id, table_name)
                 else:
-                    st.warning("Please run the regression analysis first to create a model.")
-            except Exception as e:
-                    st.error(f"Error simulating reallocation and switching costs: {e}")
+                    st.session_state.rollup_cube = build_rollup_cube(df_cleaned)
 
+                # Display data types and memory usage
+                render_cleaning_report(df_cleaned)
 
+                # Display the cleaned DataFrame
+                st.write("Cleaned Data:")
+                st.dataframe(df_cleaned)
 
-        # Example for Average Marginal Impact calculation
-        if st.sidebar.button("Calculate Average Marginal Impact"):
-            try:
-                ami_summary = calculate_average_marginal_impact(st.session_state.df_cleaned)
-                inference = generate_inference(f"Average Marginal Impact results: {ami_summary}", "Average Marginal Impact")
-                st.write(inference)
             except Exception as e:
-                st.error(f"Error calculating Average Marginal Impact: {e}")
-
-
-else:
-    st.info("Please provide your Airtable credentials to load and clean data.")
+                st.error(f"Error loading or cleaning data: {e}")
+
+        # Analysis options
+        if st.session_state.df_cleaned is not None:
+            # Global filters, applied to every analysis below
+            st.sidebar.header("Filters")
+            filter_index = st.session_state.filter_index
+            filters = {}
+            for column, label in [('district', "Districts"), ('acctype', "Account types"), ('compbrand', "Competitor brands"),
+                                  (CLUSTER_COLUMN, "Behavioural clusters")]:
+                if filter_index.values(column):
+                    filters[column] = st.sidebar.multiselect(label, filter_index.values(column))
+            months = filter_index.values('month')
+            if len(months) > 1:
+                start, end = st.sidebar.select_slider(
+                    "Months", options=months, value=(months[0], months[-1]),
+                    format_func=lambda month: pd.Timestamp(month).strftime('%Y-%m'),
+                )
+                if (start, end) != (months[0], months[-1]):
+                    filters['month'] = month_range(months, start, end)
+            apply_filters(filters)
+            if st.session_state.view_filters:
+                st.sidebar.caption(f"{len(st.session_state.df_view):,} of {len(st.session_state.df_cleaned):,} rows selected")
+
+            st.sidebar.header("Analysis")
+
+            # Correlation Matrix
+            if st.sidebar.button("Plot Correlation Matrix"):
+                try:
+                    correlation_result = run_analysis(compute_correlation_matrix)
+                    run_inferences(render_correlation_matrix(correlation_result))
+                except Exception as e:
+                    st.error(f"Error plotting correlation matrix: {e}")
+
+            # Sales by Account Type
+            if st.sidebar.button("Plot Sales by Account Type"):
+                try:
+                    sales_result = run_analysis(compute_sales_by_account_type)
+                    run_inferences(render_sales_by_account_type(sales_result))
+                except Exception as e:
+                    st.error(f"Error plotting sales by account type: {e}")
+
+
+            # Sales Trend
+            if st.sidebar.button("Plot Sales Trend"):
+                try:
+                    # Competitor entries are detected from the rows once per dataset, whatever the filters
+                    entry_dates = RESULT_CACHE.compute(
+                        entry_months, st.session_state.df_cleaned, fingerprint=st.session_state.df_fingerprint
+                    )
+                    trend_result = run_analysis(compute_sales_trend, cube=st.session_state.view_cube, entry_dates=entry_dates)
+                    run_inferences(render_sales_trend(trend_result))
+                except Exception as e:
+                    st.error(f"Error plotting sales trend: {e}")
+
+
+            # Behavioural clusters, once computed (or loaded), are also used as segments and filters
+            has_clusters = CLUSTER_COLUMN in st.session_state.df_cleaned.columns
+
+            # Regression Analysis
+            segmentations = dict(SEGMENTATIONS, **({"Behavioural cluster": (CLUSTER_COLUMN,)} if has_clusters else {}))
+            regression_segmentation = st.sidebar.selectbox("Segment regression by", list(segmentations))
+            full_regression_summary = st.sidebar.checkbox("Full regression summaries", value=False)
+            # Also applies to the Average Marginal Impact calculation
+            fixed_effects = FIXED_EFFECTS[st.sidebar.selectbox("Fixed effects", list(FIXED_EFFECTS))]
+            if st.sidebar.button("Run Regression Analysis"):
+                try:
+                    regression_result = run_analysis(
+                        compute_regression,
+                        segment_by=segmentations[regression_segmentation],
+                        full_summary=full_regression_summary,
+                        fixed_effects=fixed_effects,
+                    )
+                    run_inferences(render_regression(regression_result))
+                    st.session_state.model = regression_result.summary()  # Store model in session state
+                except Exception as e:
+                    st.error(f"Error performing regression analysis: {e}")
+
+            # Time Series Analysis
+            time_series_grain = st.sidebar.selectbox("Forecast sales by", list(TIME_SERIES_GRAINS))
+            if st.sidebar.button("Time Series Analysis"):
+                try:
+                    grain = TIME_SERIES_GRAINS[time_series_grain]
+                    time_series_result = run_analysis(
+                        compute_time_series,
+                        grain=grain,
+                        cube=st.session_state.view_cube,
+                        # Models are kept per table for the unfiltered series only; filtered series
+                        # search the orders next to those of the unfiltered models
+                        store=None if st.session_state.view_filters else model_store_path(base_id, table_name, grain),
+                        seed_store=model_store_path(base_id, table_name, grain) if st.session_state.view_filters else None,
+                    )
+                    render_time_series(time_series_result)
+                except Exception as e:
+                    st.error(f"Error performing time series analysis: {e}")
+
+            # Behavioural Segmentation
+            if st.sidebar.button("Cluster Accounts"):
+                try:
+                    # Accounts are clustered on all of their data, whatever the filters
+                    clustering_result = RESULT_CACHE.compute(
+                        compute_account_clusters, st.session_state.df_cleaned, fingerprint=st.session_state.df_fingerprint
+                    )
+                    run_inferences(render_account_clusters(clustering_result))
+                    save_assignments(clustering_result, base_id, table_name)
+                    set_cleaned_data(attach_clusters(st.session_state.df_cleaned, clustering_result.assignments))
+                    st.info("The clusters are now available to segment the market and the regression, and as a filter.")
+                except Exception as e:
+                    st.error(f"Error clustering accounts: {e}")
+
+            # Market Segmentation
+            segment_market_by = st.sidebar.selectbox(
+                "Segment market by", ["Account type"] + (["Behavioural cluster"] if has_clusters else [])
+            )
+            if st.sidebar.button("Market Segmentation"):
+                try:
+                    if segment_market_by == "Behavioural cluster":
+                        segmentation_result = run_analysis(compute_segmentation, segment_by=CLUSTER_COLUMN)
+                    else:
+                        segmentation_result = run_analysis(compute_segmentation, cube=st.session_state.view_cube)
+                    run_inferences(render_segmentation(segmentation_result))
+                except Exception as e:
+                    st.error(f"Error performing market segmentation: {e}")
+
+            # Competitor Analysis
+            if st.sidebar.button("Competitor Analysis"):
+                try:
+                    competitor_result = run_analysis(compute_competitor_analysis, cube=st.session_state.view_cube)
+                    run_inferences(render_competitor_analysis(competitor_result))
+                except Exception as e:
+                    st.error(f"Error performing competitor analysis: {e}")
+
+            # Competitor Entry Event Study
+            if st.sidebar.button("Competitor Entry Event Study"):
+                try:
+                    event_study_result = run_analysis(compute_event_study)
+                    run_inferences(render_event_study(event_study_result))
+                except Exception as e:
+                    st.error(f"Error performing competitor entry event study: {e}")
+
+            if st.sidebar.button("Future Budget Forecasting"):
+                try:
+                    forecast_result = compute_future_budget_forecast()
+                    run_inferences(render_future_budget_forecast(forecast_result))
+                except Exception as e:
+                    st.error(f"Error in Future Budget Forecasting: {e}")
+
+
+            # Weighted Budget Allocation
+            if st.sidebar.button("Weighted Budget Allocation"):
+                try:
+                    weighted_budget_result = compute_weighted_budget_allocation()
+                    run_inferences(render_weighted_budget_allocation(weighted_budget_result))
+                except Exception as e:
+                    st.error(f"Error in Weighted Budget Allocation: {e}")
+
+            if st.sidebar.button("Dollar Value Sales Analysis"):
+                try:
+                    # Calculate sales summary from the strategy
+                    dollar_sales_result = run_analysis(compute_sales_from_strategy)
+                    run_inferences(render_sales_from_strategy(dollar_sales_result))
+                except Exception as e:
+                    # Catch any exceptions and display error messages
+                    st.error(f"Error calculating dollar value sales: {e}")
+
+
+            # Simulate Strategy Reallocation & Switching Costs
+            if st.sidebar.button("Simulate Strategy Reallocation & Switching Costs"):
+                try:
+                    if 'model' in st.session_state:
+                        reallocation_result = run_analysis(compute_reallocation_and_switching_costs)
+                        # Inferences for the efficiency, reallocation, switching cost and AMI sections run concurrently
+                        run_inferences(render_reallocation_and_switching_costs(reallocation_result))
+                    else:
+                        st.warning("Please run the regression analysis first to create a model.")
+                except Exception as e:
+                        st.error(f"Error simulating reallocation and switching costs: {e}")
+
+
+
+            # Example for Average Marginal Impact calculation
+            if st.sidebar.button("Calculate Average Marginal Impact"):
+                try:
+                    ami_result = run_analysis(compute_average_marginal_impact, fixed_effects=fixed_effects)
+                    run_inferences(render_average_marginal_impact(ami_result))
+                except Exception as e:
+                    st.error(f"Error calculating Average Marginal Impact: {e}")
+
+
+            # Cache statistics, to verify that repeated analyses are served from the cache
+            cache_stats = RESULT_CACHE.stats()
+            st.sidebar.caption(
+                f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1e6:,.1f} MB)"
+            )
+            model_stats = MODEL_REGISTRY.stats()
+            st.sidebar.caption(f"Model registry: {model_stats['misses']} fits, {model_stats['hits']} reused")
+
+    else:
+        st.info("Please provide your Airtable credentials to load and clean data.")
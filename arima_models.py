@@ -0,0 +1,293 @@
+# arima_models.py
+
+import itertools
+import json
+import os
+import re
+import signal
+import threading
+import warnings
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import pandas as pd
+from statsmodels.stats.diagnostic import acorr_ljungbox
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.stattools import kpss
+
+from snapshot_cache import SNAPSHOT_DIR
+
+# Candidate (p, q) and seasonal (P, D, Q) orders of the order search; d is chosen beforehand
+ORDER_GRID = {'p': (0, 1, 2), 'q': (0, 1, 2)}
+SEASONAL_GRID = {'P': (0, 1), 'D': (0,), 'Q': (0,)}
+
+# The series is differenced (up to MAX_DIFFERENCING times) while a KPSS test rejects
+# stationarity at this level
+MAX_DIFFERENCING = 1
+DIFFERENCING_ALPHA = 0.05
+
+# 'aic' or 'bic'
+INFORMATION_CRITERION = os.environ.get('ARIMA_CRITERION', 'aic')
+
+# Months of one-step-ahead residuals the diagnostics look at
+DIAGNOSTIC_WINDOW = 12
+
+# A stored model is refitted when its recent residual RMSE grows by more than this factor
+# over the RMSE it had when fitted, or when its residuals stop passing the Ljung-Box test
+DEGRADATION_TOLERANCE = 1.25
+LJUNG_BOX_ALPHA = 0.05
+
+
+@dataclass
+class SeriesModel:
+    order: tuple
+    seasonal_order: tuple  # (P, D, Q, period)
+    params: dict  # Parameter name -> fitted value
+    criterion: str  # 'aic' or 'bic'
+    score: float  # Value of the criterion when fitted
+    rmse: float  # RMSE of the one-step-ahead residuals over the diagnostic window when fitted
+    ljung_box_pvalue: float  # Ljung-Box p-value of the residuals when fitted
+    scale: float  # Divisor the sales were rescaled by
+    fitted_through: str  # Last month of the series the model was fitted on ('YYYY-MM')
+
+    def describe(self):
+        P, D, Q, period = self.seasonal_order
+        text = f"ARIMA{tuple(self.order)}"
+        if P or D or Q:
+            text += f"x{(P, D, Q)}[{period}]"
+        return text
+
+
+def model_store_path(base_id, table_name, grain, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Where the forecasting models of a table's series at a grain are stored, next to the snapshot.
+    """
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', f"{base_id}__{table_name}__{'_'.join(grain) or 'total'}")
+    return os.path.join(snapshot_dir, f"{slug}.arima.json")
+
+
+def save_models(models, path):
+    """
+    Store {series name: SeriesModel} as JSON.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Write to a temporary file first so an interrupted save never leaves a torn store
+    with open(path + '.tmp', 'w') as f:
+        json.dump({str(name): asdict(model) for name, model in models.items()}, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_models(path):
+    """
+    Load stored models ({series name: SeriesModel}), or {} if there are none (or they cannot be read).
+    """
+    if path is None or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            stored = json.load(f)
+        return {
+            name: SeriesModel(**dict(entry, order=tuple(entry['order']), seasonal_order=tuple(entry['seasonal_order'])))
+            for name, entry in stored.items()
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def differencing_order(values, max_d=MAX_DIFFERENCING, alpha=DIFFERENCING_ALPHA):
+    """
+    Order of differencing d of a series: the number of times it is differenced before a KPSS
+    test no longer rejects (level) stationarity, at most max_d. d is fixed before the order
+    search because the likelihood, and so the AIC or BIC, of models with different d is computed
+    on differently differenced series and cannot be compared.
+    """
+    values = np.asarray(values, dtype=float)
+    for d in range(max_d):
+        if len(values) < 8 or not np.std(values) > 0:
+            return d
+        with warnings.catch_warnings():
+            # KPSS p-values outside its table are clipped to the table's ends, with a warning
+            warnings.simplefilter('ignore')
+            pvalue = kpss(values, regression='c', nlags='auto')[1]
+        if pvalue >= alpha:
+            return d
+        values = np.diff(values)
+    return max_d
+
+
+def candidate_orders(n_obs, period, d, order_grid=ORDER_GRID, seasonal_grid=SEASONAL_GRID):
+    """
+    The (order, seasonal_order) pairs of the grids with differencing order d. Seasonal terms are
+    only tried on series with at least two full periods, and candidates with more parameters than
+    a fifth of the months are skipped.
+    """
+    seasonal = [(0, 0, 0)]
+    if n_obs >= 2 * period:
+        seasonal = list(itertools.product(seasonal_grid['P'], seasonal_grid['D'], seasonal_grid['Q']))
+    candidates = []
+    for p, q in itertools.product(order_grid['p'], order_grid['q']):
+        for P, D, Q in seasonal:
+            n_params = p + q + P + Q + 2
+            if n_params > n_obs / 5:
+                continue
+            candidates.append(((p, d, q), (P, D, Q, period if P or D or Q else 0)))
+    return candidates
+
+
+def neighbour_orders(order, seasonal_order, n_obs, period, d, order_grid=ORDER_GRID, seasonal_grid=SEASONAL_GRID):
+    """
+    The candidates (see candidate_orders) one step from an order: its p, q, P or Q one higher or
+    lower, with differencing order d (the order itself is included when its d is d).
+    """
+    p, _, q = order
+    P, _, Q, _ = seasonal_order
+    return [
+        (candidate, seasonal) for candidate, seasonal in candidate_orders(n_obs, period, d, order_grid, seasonal_grid)
+        if abs(candidate[0] - p) + abs(candidate[2] - q) + abs(seasonal[0] - P) + abs(seasonal[2] - Q) <= 1
+    ]
+
+
+def starting_orders(n_obs, period, d, order_grid=ORDER_GRID, seasonal_grid=SEASONAL_GRID):
+    """
+    The candidates a stepwise search starts from, as in Hyndman and Khandakar's auto ARIMA:
+    (2, d, 2) and (1, d, 0) with a seasonal AR term, (0, d, 0) and (0, d, 1), where the grids and
+    the series length allow them.
+    """
+    starts = {(2, 2, 1), (1, 0, 1), (0, 0, 0), (0, 1, 0)}
+    return [
+        (order, seasonal_order) for order, seasonal_order in candidate_orders(n_obs, period, d, order_grid, seasonal_grid)
+        if (order[0], order[2], seasonal_order[0]) in starts and not seasonal_order[2]
+    ]
+
+
+def _burn_in(order, seasonal_order):
+    """
+    Leading residuals that only reflect the differencing and are left out of the diagnostics.
+    """
+    return order[1] + seasonal_order[1] * seasonal_order[3]
+
+
+def diagnostics(result, order, seasonal_order, window=DIAGNOSTIC_WINDOW):
+    """
+    (RMSE of the last window one-step-ahead residuals, Ljung-Box p-value of all residuals after the
+    differencing burn-in) of a fitted or filtered ARIMA result.
+    """
+    resid = np.asarray(result.resid, dtype=float)[_burn_in(order, seasonal_order):]
+    rmse = float(np.sqrt(np.mean(resid[-window:] ** 2))) if len(resid) else np.nan
+    lags = min(window, len(resid) // 5)
+    if lags < 1 or not np.std(resid) > 0:
+        return rmse, np.nan
+    return rmse, float(acorr_ljungbox(resid, lags=[lags])['lb_pvalue'].iloc[0])
+
+
+def degraded(model, rmse, ljung_box_pvalue, tolerance=DEGRADATION_TOLERANCE, alpha=LJUNG_BOX_ALPHA):
+    """
+    Whether a stored model's diagnostics on the current series are worse than when it was fitted.
+    """
+    if not np.isfinite(rmse):
+        return True
+    if rmse > tolerance * model.rmse:
+        return True
+    return model.ljung_box_pvalue >= alpha and ljung_box_pvalue < alpha
+
+
+class _FitTimeout(BaseException):
+    # Not an Exception, so error handling inside statsmodels cannot swallow it
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise _FitTimeout()
+
+
+@contextmanager
+def time_limit(seconds):
+    """
+    Raise _FitTimeout after the given number of seconds, enforced with an alarm signal. Alarms
+    only work in a process's main thread (and where SIGALRM exists), which is why the fits run
+    in worker processes; elsewhere the limit cannot be enforced and a RuntimeWarning says so.
+    """
+    active = bool(seconds) and hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread()
+    if seconds and not active:
+        warnings.warn(f"The {seconds}s time limit cannot be enforced here (alarm signals need the main thread).",
+                      RuntimeWarning, stacklevel=3)
+    if active:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(np.ceil(seconds)))
+    try:
+        yield
+    finally:
+        if active:
+            signal.alarm(0)
+
+
+def _series(values, index):
+    return pd.Series(values, index=pd.DatetimeIndex(index, freq='MS'))
+
+
+def fit_candidate(values, index, order, seasonal_order, start_params=None, timeout=None):
+    """
+    Fit one candidate order (optionally warm-started from start_params). Runs in a worker process.
+    Returns (aic, bic, params, rmse, ljung_box_pvalue), or None when the fit fails or times out.
+    """
+    try:
+        with time_limit(timeout), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = ARIMA(_series(values, index), order=order, seasonal_order=seasonal_order)
+            if start_params is not None:
+                start_params = [start_params.get(name, 0.0) for name in model.param_names]
+            # Standard errors are not needed, so the covariance of the parameters is not computed
+            result = model.fit(start_params=start_params, cov_type='none')
+            rmse, pvalue = diagnostics(result, order, seasonal_order)
+            return result.aic, result.bic, dict(zip(model.param_names, map(float, result.params))), rmse, pvalue
+    except (_FitTimeout, Exception):
+        return None
+
+
+def filter_model(values, index, model, timeout=None):
+    """
+    Run a stored model over the current series with its stored parameters, without re-estimating
+    them. Returns (rmse, ljung_box_pvalue), or None when the parameters no longer apply.
+    """
+    try:
+        with time_limit(timeout), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            arima = ARIMA(_series(values, index), order=model.order, seasonal_order=model.seasonal_order)
+            if set(arima.param_names) != set(model.params):
+                return None
+            result = arima.filter([model.params[name] for name in arima.param_names])
+            return diagnostics(result, model.order, model.seasonal_order)
+    except (_FitTimeout, Exception):
+        return None
+
+
+def forecast(values, index, model, steps, timeout=None):
+    """
+    Forecast the next steps months of a series from a model's parameters. Runs in a worker
+    process. Raises TimeoutError when it takes longer than timeout seconds.
+    """
+    try:
+        with time_limit(timeout), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            arima = ARIMA(_series(values, index), order=model.order, seasonal_order=model.seasonal_order)
+            result = arima.filter([model.params[name] for name in arima.param_names])
+            return np.asarray(result.forecast(steps=steps), dtype=float)
+    except _FitTimeout:
+        raise TimeoutError(f"Forecasting took longer than {timeout}s.") from None
+
+
+def select_model(fits, criterion=INFORMATION_CRITERION):
+    """
+    The best of a series' candidate fits [((order, seasonal_order), fit_candidate output)] by the
+    information criterion, as (order, seasonal_order, fit), or None when every candidate failed.
+    The candidates must share their differencing orders, or their criteria are not comparable.
+    """
+    if len({(order[1], seasonal_order[1]) for (order, seasonal_order), _ in fits}) > 1:
+        raise ValueError("Candidates with different differencing orders cannot be compared by an information criterion.")
+    position = {'aic': 0, 'bic': 1}[criterion]
+    fitted = [(candidate, fit) for candidate, fit in fits if fit is not None and np.isfinite(fit[position])]
+    if not fitted:
+        return None
+    (order, seasonal_order), fit = min(fitted, key=lambda item: item[1][position])
+    return order, seasonal_order, fit
@@ -0,0 +1,156 @@
+# batched_ols.py
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+@dataclass
+class GroupedFit:
+    formula: str
+    by: tuple  # Columns the rows were grouped by
+    params: pd.DataFrame  # One row per segment, one column per coefficient ('const' first)
+    bse: pd.DataFrame
+    tvalues: pd.DataFrame
+    pvalues: pd.DataFrame
+    rsquared: pd.Series
+    nobs: pd.Series
+    df_resid: pd.Series
+    data: pd.DataFrame = None  # Rows used in the fit, sorted by segment (None when fitted from sums)
+    starts: np.ndarray = None  # Position of the first row of each segment in data (plus the end)
+    errors: dict = field(default_factory=dict)  # Segment key -> reason it could not be fitted
+    cov_params: np.ndarray = None  # Segment x coefficient x coefficient covariance (fixed-effects fits)
+
+    @property
+    def keys(self):
+        return self.params.index
+
+    def segment_data(self, position):
+        """
+        Rows of the segment at the given position in keys.
+        """
+        return self.data.iloc[self.starts[position]:self.starts[position + 1]]
+
+
+def _grouped_sums(codes, values, n_groups):
+    return np.bincount(codes, weights=values, minlength=n_groups)
+
+
+def grouped_cross_products(codes, X, y, n_groups):
+    """
+    Per-group X'X, X'y, y'y and row counts, from one pass of grouped sums over the rows.
+    """
+    p = X.shape[1]
+    xtx = np.empty((n_groups, p, p))
+    for i in range(p):
+        for j in range(i, p):
+            # X'X is symmetric, so only the upper triangle is summed
+            xtx[:, i, j] = xtx[:, j, i] = _grouped_sums(codes, X[:, i] * X[:, j], n_groups)
+    xty = np.column_stack([_grouped_sums(codes, X[:, i] * y, n_groups) for i in range(p)])
+    yty = _grouped_sums(codes, y * y, n_groups)
+    counts = np.bincount(codes, minlength=n_groups)
+    return xtx, xty, yty, counts
+
+
+def solve_normal_equations(xtx, xty):
+    """
+    Solve every group's normal equations at once. Returns (params, (X'X)^-1, rank).
+
+    The pseudo-inverse handles rank-deficient groups like statsmodels does, and the
+    coefficients are rescaled first so the system stays well conditioned.
+    """
+    scale = np.sqrt(np.abs(np.diagonal(xtx, axis1=1, axis2=2)).sum(axis=0))
+    scale[scale == 0] = 1.0
+    outer = np.outer(scale, scale)
+
+    xtx_inv = np.linalg.pinv(xtx / outer, hermitian=True)
+    params = np.einsum('gij,gj->gi', xtx_inv, xty / scale) / scale
+    rank = np.linalg.matrix_rank(xtx / outer, hermitian=True)
+    return params, xtx_inv / outer, rank
+
+
+def ols_statistics(params, xtx_inv, rank, rss, tss, counts):
+    """
+    Standard errors, t-statistics, p-values, R² and residual degrees of freedom per group.
+    """
+    df_resid = counts - rank
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = np.where(df_resid > 0, rss / np.where(df_resid > 0, df_resid, 1), np.nan)
+        bse = np.sqrt(sigma2[:, None] * np.diagonal(xtx_inv, axis1=1, axis2=2))
+        tvalues = params / bse
+        pvalues = 2 * stats.t.sf(np.abs(tvalues), df_resid[:, None])
+        rsquared = 1 - rss / tss
+    return bse, tvalues, pvalues, rsquared, df_resid
+
+
+def grouped_fit(formula, by, keys, names, params, xtx_inv, rank, rss, tss, counts, data=None, starts=None):
+    """
+    Assemble a GroupedFit from per-group estimates.
+    """
+    bse, tvalues, pvalues, rsquared, df_resid = ols_statistics(params, xtx_inv, rank, rss, tss, counts)
+    errors = {
+        keys[g]: f"Not enough observations ({counts[g]}) to fit {len(names)} coefficients."
+        for g in np.flatnonzero(df_resid <= 0)
+    }
+
+    def frame(values):
+        return pd.DataFrame(values, index=keys, columns=names)
+
+    return GroupedFit(
+        formula=formula,
+        by=tuple(by),
+        params=frame(params),
+        bse=frame(bse),
+        tvalues=frame(tvalues),
+        pvalues=frame(pvalues),
+        rsquared=pd.Series(rsquared, index=keys),
+        nobs=pd.Series(counts, index=keys),
+        df_resid=pd.Series(df_resid, index=keys),
+        data=data,
+        starts=starts,
+        errors=errors,
+    )
+
+
+def fit_grouped_ols(df, response, regressors, by, formula=None):
+    """
+    Fit response ~ const + regressors separately for every combination of the columns in by.
+
+    The data is grouped once; per-segment X'X and X'y come from grouped sums, all segments
+    are solved in one stacked (pseudo-)inverse and the standard errors, t-statistics,
+    p-values and R² are derived vectorized. Estimates match statsmodels OLS per segment.
+    """
+    by = list(by)
+    regressors = list(regressors)
+    data = df[by + [response] + regressors].copy()
+    for col in [response] + regressors:
+        data[col] = pd.to_numeric(data[col], errors='coerce')
+    data = data.dropna()
+
+    # Group once and sort the rows so every segment is a contiguous block
+    grouped = data.groupby(by, observed=True, sort=True)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().index
+    order = np.argsort(codes, kind='stable')
+    data, codes = data.iloc[order], codes[order]
+    n_groups = len(keys)
+
+    X = np.column_stack([np.ones(len(data))] + [data[col].to_numpy(dtype=float) for col in regressors])
+    y = data[response].to_numpy(dtype=float)
+
+    xtx, xty, _, counts = grouped_cross_products(codes, X, y, n_groups)
+    params, xtx_inv, rank = solve_normal_equations(xtx, xty)
+
+    # Residual and total sums of squares from one more pass over the rows
+    residuals = y - np.einsum('ni,ni->n', X, params[codes])
+    rss = _grouped_sums(codes, residuals ** 2, n_groups)
+    means = _grouped_sums(codes, y, n_groups) / np.maximum(counts, 1)
+    tss = _grouped_sums(codes, (y - means[codes]) ** 2, n_groups)
+
+    return grouped_fit(
+        formula or f"{response} ~ {' + '.join(regressors)}", by, keys, ['const'] + regressors,
+        params, xtx_inv, rank, rss, tss, counts,
+        data=data, starts=np.concatenate([[0], np.cumsum(counts)]),
+    )
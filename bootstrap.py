@@ -0,0 +1,144 @@
+# bootstrap.py
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from batched_ols import solve_normal_equations
+from incremental_ols import sufficient_stats
+from model_registry import parse_formula
+from process_pools import process_pool
+
+BOOTSTRAP_REPLICATES = 1000
+BOOTSTRAP_SEED = 0
+CONFIDENCE_LEVEL = 0.95
+
+# Replicates per task, and the most weight cells (replicates x clusters) a task holds at once
+REPLICATES_PER_TASK = 25
+MAX_WEIGHT_CELLS = 4_000_000
+
+
+@dataclass
+class BootstrapResult:
+    formula: str
+    cluster: str
+    n_clusters: int
+    estimates: pd.Series  # Coefficients on the full data
+    exog_means: pd.Series  # Regressor means on the full data
+    params: pd.DataFrame  # One row per replicate, one column per coefficient
+    replicate_means: pd.DataFrame  # One row per replicate, one column per regressor
+
+    def ami(self):
+        """
+        Average marginal impact (coefficient x mean regressor value) of each replicate.
+        """
+        return self.params[self.replicate_means.columns] * self.replicate_means
+
+    def intervals(self, confidence=CONFIDENCE_LEVEL):
+        """
+        Percentile confidence intervals and bootstrap standard errors of the coefficients and AMIs.
+        """
+        tail = (1 - confidence) / 2
+        regressors = list(self.exog_means.index)
+        rows = []
+        for kind, estimates, replicates in (
+            ('coefficient', self.estimates, self.params),
+            ('AMI', self.estimates[regressors] * self.exog_means, self.ami()),
+        ):
+            for term, estimate in estimates.items():
+                values = replicates[term].dropna()
+                rows.append({
+                    'kind': kind,
+                    'term': term,
+                    'estimate': estimate,
+                    'std err': values.std(),
+                    'lower': values.quantile(tail),
+                    'upper': values.quantile(1 - tail),
+                })
+        return pd.DataFrame(rows).set_index(['kind', 'term'])
+
+
+# Per-cluster statistics, set once in each worker process
+_cluster_stats = None
+
+
+def _set_cluster_stats(stats):
+    global _cluster_stats
+    _cluster_stats = stats
+
+
+def _replicate_chunk(seed, size):
+    """
+    Fit `size` replicates. Each resamples the clusters with replacement, which amounts to
+    weighting the per-cluster sums by how often each cluster was drawn.
+    """
+    stats = _cluster_stats
+    n_clusters, width = stats.shape
+    p = int(round((np.sqrt(4 * width - 3) - 1) / 2))  # width = p*p + p + 1
+    rng = np.random.default_rng(seed)
+    uniform = np.full(n_clusters, 1 / n_clusters)
+
+    params, means = [], []
+    step = max(1, MAX_WEIGHT_CELLS // n_clusters)
+    for start in range(0, size, step):
+        weights = rng.multinomial(n_clusters, uniform, size=min(step, size - start)).astype(float)
+        sums = weights @ stats
+        xtx = sums[:, :p * p].reshape(-1, p, p)
+        xty = sums[:, p * p:p * p + p]
+        params.append(solve_normal_equations(xtx, xty)[0])
+        means.append(xtx[:, 0, 1:] / xtx[:, :1, 0])
+    return np.vstack(params), np.vstack(means)
+
+
+def bootstrap_ols(df, formula, cluster='accid', n_replicates=BOOTSTRAP_REPLICATES, seed=BOOTSTRAP_SEED,
+                  max_workers=None):
+    """
+    Cluster bootstrap of an OLS model: whole clusters (accounts by default) are resampled with
+    replacement, so correlation between an account's rows is respected.
+
+    The data is reduced once to per-cluster X'X, X'y and row counts; each replicate is then a
+    weighted sum of those, solved in batches. Replicates are split into fixed tasks with seeds
+    spawned from `seed`, so results do not depend on the number of worker processes.
+    """
+    _, regressors = parse_formula(formula)
+    names = ['const'] + regressors
+
+    per_cluster = sufficient_stats(df, formula, by=(cluster,))
+    n_clusters = len(per_cluster.keys)
+    if n_clusters < 2:
+        raise ValueError(f"At least two '{cluster}' values are needed for a cluster bootstrap.")
+
+    p = len(names)
+    stats = np.column_stack([
+        per_cluster.xtx.reshape(n_clusters, p * p), per_cluster.xty, per_cluster.nobs.astype(float)
+    ])
+
+    # Full-data estimates
+    total_xtx = per_cluster.xtx.sum(axis=0)
+    estimates = solve_normal_equations(total_xtx[None], per_cluster.xty.sum(axis=0)[None])[0][0]
+    exog_means = total_xtx[0, 1:] / total_xtx[0, 0]
+
+    sizes = [min(REPLICATES_PER_TASK, n_replicates - start) for start in range(0, n_replicates, REPLICATES_PER_TASK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(sizes))
+    if max_workers > 1:
+        with process_pool(max_workers, initializer=_set_cluster_stats, initargs=(stats,)) as executor:
+            chunks = list(executor.map(_replicate_chunk, seeds, sizes))
+    else:
+        _set_cluster_stats(stats)
+        chunks = [_replicate_chunk(chunk_seed, size) for chunk_seed, size in zip(seeds, sizes)]
+
+    return BootstrapResult(
+        formula=formula,
+        cluster=cluster,
+        n_clusters=n_clusters,
+        estimates=pd.Series(estimates, index=names),
+        exog_means=pd.Series(exog_means, index=regressors),
+        params=pd.DataFrame(np.vstack([chunk[0] for chunk in chunks]), columns=names),
+        replicate_means=pd.DataFrame(np.vstack([chunk[1] for chunk in chunks]), columns=regressors),
+    )
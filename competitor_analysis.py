@@ -1,17 +1,67 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 import streamlit as st
-from inference import generate_inference  # Import the inference function
+from dataclasses import dataclass
+from inference import request_inference, run_inferences  # Import the inference functions
+from density import scatter_or_density
 
-# Function for time series analysis of sales and competitor brands over time
-def time_series_analysis(df):
+
+@dataclass
+class CompetitorTrendResult:
+    monthly_sales: pd.Series  # Average sales per month (PeriodIndex)
+    monthly_comp_brands: pd.Series  # Average number of competitor brands per month
+
+    def summary(self):
+        return {
+            "Average Monthly Sales": self.monthly_sales.mean(),
+            "Average Competitor Brands": self.monthly_comp_brands.mean(),
+        }
+
+
+@dataclass
+class StrategyImpactResult:
+    data: pd.DataFrame  # 'compbrand', 'sales' and strategy rows, for the scatter plots
+
+    def summary(self):
+        return {
+            "Average Strategy 1 Sales": self.data['strategy1'].mean(),
+            "Average Strategy 2 Sales": self.data['strategy2'].mean(),
+            "Average Strategy 3 Sales": self.data['strategy3'].mean(),
+            "Average Competitor Brands": self.data['compbrand'].mean(),
+        }
+
+
+@dataclass
+class CompetitorAnalysisResult:
+    trend: CompetitorTrendResult
+    strategy_impact: StrategyImpactResult
+
+    def summary(self):
+        return {
+            "Time Series": self.trend.summary(),
+            "Marketing Strategy Impact": self.strategy_impact.summary(),
+        }
+
+
+def compute_competitor_trends(df, cube=None):
     """
-    Time Series Analysis of Sales and Competitor Brands Over Time.
+    Compute average sales and average number of competitor brands per month.
+    With a rollup_cube.RollupCube of the same data, the averages are read from the cube.
     """
-    st.header("Time Series Analysis: Sales and Competitor Brands Over Time")
-    
+    if cube is not None:
+        cells = cube.cells[cube.cells['compbrand'].notna() & (cube.cells['sales_count'] > 0)]
+        period = cells['month'].dt.to_period('M')
+        totals = pd.DataFrame({
+            'sales': cells['sales_sum'],
+            'compbrand': cells['compbrand'] * cells['sales_count'],
+            'count': cells['sales_count'],
+        }).groupby(period).sum()
+        monthly_sales = totals['sales'] / totals['count']
+        monthly_comp_brands = totals['compbrand'] / totals['count']
+        return CompetitorTrendResult(monthly_sales.rename('sales'), monthly_comp_brands.rename('compbrand'))
+
     # Step 1: Ensure 'month' is in datetime format
+    df = df[['month', 'compbrand', 'sales']].copy()
     df['month'] = pd.to_datetime(df['month'], errors='coerce')
 
     # Step 2: Filter out rows where 'month', 'compbrand', or 'sales' are missing
@@ -25,6 +75,18 @@ def time_series_analysis(df):
     monthly_sales = df.groupby(df['month'].dt.to_period('M'))['sales'].mean()
     monthly_comp_brands = df.groupby(df['month'].dt.to_period('M'))['compbrand'].mean()
 
+    return CompetitorTrendResult(monthly_sales, monthly_comp_brands)
+
+
+def render_competitor_trends(result):
+    """
+    Time Series Analysis of Sales and Competitor Brands Over Time.
+    """
+    st.header("Time Series Analysis: Sales and Competitor Brands Over Time")
+
+    monthly_sales = result.monthly_sales
+    monthly_comp_brands = result.monthly_comp_brands
+
     # Step 5: Plot sales and competitor brands over time in a dual-axis plot
     fig, ax1 = plt.subplots(figsize=(12, 6))
 
@@ -45,18 +107,56 @@ def time_series_analysis(df):
     fig.tight_layout()
     st.pyplot(fig)
 
-    # Generate an inference based on the time series data
-    time_series_summary = {
-        "Average Monthly Sales": monthly_sales.mean(),
-        "Average Competitor Brands": monthly_comp_brands.mean(),
-    }
+    # Inference request for the time series summary
+    return [request_inference(result.summary(), "Time Series Analysis")]
+
+
+# Function for time series analysis of sales and competitor brands over time
+def time_series_analysis(df):
+    """
+    Time Series Analysis of Sales and Competitor Brands Over Time.
+    """
+    result = compute_competitor_trends(df)
+    run_inferences(render_competitor_trends(result))
+    return result.summary()
+
+
+def compute_strategy_impact(df):
+    """
+    Prepare the data for analysing the impact of marketing strategies on sales,
+    considering the number of competitor brands.
+    """
+    columns = ['compbrand', 'sales', 'strategy1', 'strategy2', 'strategy3']
+    df = df[columns].copy()
+
+    # Ensure 'compbrand', 'sales', 'strategy1', 'strategy2', 'strategy3' are numeric
+    for col in columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Drop rows with missing values
+    df = df.dropna(subset=columns)
+
+    return StrategyImpactResult(df)
+
+
+def render_strategy_impact(result):
+    """
+    Plot the impact of marketing strategies on sales, coloured by the number of competitor brands.
+    """
+    st.header("Impact of Marketing Strategies in the Presence of Competitor Brands")
+    df = result.data
 
-    # Updated generate_inference call with error handling
-    try:
-        inference_result = generate_inference(time_series_summary, "Time Series Analysis")
-        st.write(f"Inference: {inference_result}")
-    except Exception as e:
-        st.error(f"Error generating inference: {e}")
+    # Strategy vs Sales, drawn as a density image when there are many rows
+    for i, strategy in enumerate(['strategy1', 'strategy2', 'strategy3'], 1):
+        st.subheader(f"Strategy {i} Expenditure vs Sales Colored by Competitor Brands")
+        fig, ax = plt.subplots(figsize=(12, 8))
+        scatter_or_density(ax, df, strategy, 'sales', hue='compbrand', palette='coolwarm')
+        ax.set_title(f'Strategy {i} Expenditure vs Sales Colored by Competitor Brands')
+        st.pyplot(fig)
+        plt.close(fig)
+
+    # Inference request for marketing strategy impact
+    return [request_inference(result.summary(), "Marketing Strategy Impact Analysis")]
 
 
 # Function to analyze the impact of marketing strategies in the presence of competitors
@@ -64,58 +164,30 @@ def analyze_marketing_strategy_impact(df):
     """
     Analyze the impact of marketing strategies on sales, considering the number of competitor brands.
     """
-    st.header("Impact of Marketing Strategies in the Presence of Competitor Brands")
-    
-    # Ensure 'compbrand', 'sales', 'strategy1', 'strategy2', 'strategy3' are numeric
-    df['compbrand'] = pd.to_numeric(df['compbrand'], errors='coerce')
-    df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
-    df['strategy1'] = pd.to_numeric(df['strategy1'], errors='coerce')
-    df['strategy2'] = pd.to_numeric(df['strategy2'], errors='coerce')
-    df['strategy3'] = pd.to_numeric(df['strategy3'], errors='coerce')
+    result = compute_strategy_impact(df)
+    run_inferences(render_strategy_impact(result))
+    return result.summary()
+
+
+def compute_competitor_analysis(df, cube=None):
+    """
+    Compute the competitor analysis: time series of sales and competitor brands, and strategy impact.
+    """
+    return CompetitorAnalysisResult(compute_competitor_trends(df, cube), compute_strategy_impact(df))
+
+
+def render_competitor_analysis(result):
+    """
+    Display the competitor analysis.
+    """
+    return render_competitor_trends(result.trend) + render_strategy_impact(result.strategy_impact)
 
-    # Drop rows with missing values
-    df = df.dropna(subset=['compbrand', 'sales', 'strategy1', 'strategy2', 'strategy3'])
-
-    # Strategy 1 vs Sales
-    st.subheader("Strategy 1 Expenditure vs Sales Colored by Competitor Brands")
-    plt.figure(figsize=(12, 8))
-    sns.scatterplot(x='strategy1', y='sales', hue='compbrand', data=df, palette='coolwarm')
-    plt.title('Strategy 1 Expenditure vs Sales Colored by Competitor Brands')
-    st.pyplot(plt)
-
-    # Strategy 2 vs Sales
-    st.subheader("Strategy 2 Expenditure vs Sales Colored by Competitor Brands")
-    plt.figure(figsize=(12, 8))
-    sns.scatterplot(x='strategy2', y='sales', hue='compbrand', data=df, palette='coolwarm')
-    plt.title('Strategy 2 Expenditure vs Sales Colored by Competitor Brands')
-    st.pyplot(plt)
-
-    # Strategy 3 vs Sales
-    st.subheader("Strategy 3 Expenditure vs Sales Colored by Competitor Brands")
-    plt.figure(figsize=(12, 8))
-    sns.scatterplot(x='strategy3', y='sales', hue='compbrand', data=df, palette='coolwarm')
-    plt.title('Strategy 3 Expenditure vs Sales Colored by Competitor Brands')
-    st.pyplot(plt)
-
-    # Generate inference for marketing strategy impact
-    strategy_summary = {
-        "Average Strategy 1 Sales": df['strategy1'].mean(),
-        "Average Strategy 2 Sales": df['strategy2'].mean(),
-        "Average Strategy 3 Sales": df['strategy3'].mean(),
-        "Average Competitor Brands": df['compbrand'].mean(),
-    }
-
-    # This try-except block handles the inference generation safely
-    try:
-        inference_result = generate_inference(strategy_summary, "Marketing Strategy Impact Analysis")
-        st.write(f"Inference: {inference_result}")
-    except Exception as e:
-        st.error(f"Error generating inference: {e}")
 
 # Main function to run the competitor analysis
 def run_competitor_analysis(df):
     """
     Run the competitor analysis including time series analysis and impact of marketing strategies.
     """
-    time_series_analysis(df)
-    analyze_marketing_strategy_impact(df)
+    result = compute_competitor_analysis(df)
+    run_inferences(render_competitor_analysis(result))
+    return result.summary()
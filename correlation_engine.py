@@ -0,0 +1,256 @@
+# correlation_engine.py
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2_contingency
+
+# Largest dense contingency table (in bytes) ever allocated; larger ones are counted sparsely
+CONTINGENCY_MEMORY_LIMIT = int(os.environ.get('CONTINGENCY_MEMORY_LIMIT', str(64 * 1024 * 1024)))
+
+# Categorical columns with more distinct values than this share of the rows of an average
+# period (all rows when the data has no periods) are identifiers
+IDENTIFIER_RATIO = 0.5
+
+# Numeric columns with more distinct values than this are binned into quantiles for Cramér's V
+MAX_NUMERIC_LEVELS = 50
+NUMERIC_BINS = 20
+
+
+def integer_codes(column):
+    """
+    Integer codes (0..k-1) of the distinct values of a column, -1 where the value is missing,
+    and the number of distinct values k.
+    """
+    codes, uniques = pd.factorize(column, sort=False)
+    return codes.astype(np.int64), len(uniques)
+
+
+def association_codes(column, categorical, max_levels=MAX_NUMERIC_LEVELS, bins=NUMERIC_BINS):
+    """
+    Integer codes of a column for Cramér's V. A continuous numeric column (more than max_levels
+    distinct values) is cut into quantile bins instead of getting one level per distinct value.
+    """
+    codes, k = integer_codes(column)
+    if categorical or k <= max_levels:
+        return codes, k
+    return integer_codes(pd.qcut(column, bins, labels=False, duplicates='drop'))
+
+
+def identifier_columns(df, categorical, periods=None, ratio=IDENTIFIER_RATIO, max_levels=MAX_NUMERIC_LEVELS):
+    """
+    The categorical columns that look like identifiers: nearly every entity has its own value, so
+    any association with them is meaningless. In panel data, where periods gives the period (e.g.
+    the month) of each row, an entity has a row in every period, so the distinct values are
+    compared with the rows of an average period rather than with all rows.
+    """
+    n_periods = 1 if periods is None else max(periods.nunique(), 1)
+    identifiers = []
+    for col in categorical:
+        n_values = df[col].nunique()
+        if n_values > max_levels and n_values > ratio * df[col].count() / n_periods:
+            identifiers.append(col)
+    return identifiers
+
+
+def contingency_table(codes_x, k_x, codes_y, k_y):
+    """
+    Contingency table of two coded columns from a single bincount, over the rows where both are
+    present. Levels that do not occur in those rows are left out, like pd.crosstab does.
+    """
+    present = (codes_x >= 0) & (codes_y >= 0)
+    cells = codes_x[present] * k_y + codes_y[present]
+    table = np.bincount(cells, minlength=k_x * k_y).reshape(k_x, k_y)
+    return table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+
+
+def sparse_contingency_counts(codes_x, k_x, codes_y, k_y):
+    """
+    Contingency table of two coded columns in coordinate form: the row and column of every
+    non-empty cell and its count. Memory grows with the rows, not with k_x * k_y.
+    """
+    present = (codes_x >= 0) & (codes_y >= 0)
+    cells, counts = np.unique(codes_x[present] * k_y + codes_y[present], return_counts=True)
+    return cells // k_y, cells % k_y, counts
+
+
+def cramers_v(table):
+    """
+    Cramér's V of a contingency table, or NaN when it is undefined (fewer than two levels).
+    """
+    r, k = table.shape
+    if min(r, k) < 2:
+        return np.nan
+
+    n = table.sum()
+    if min(r, k) == 2 and max(r, k) == 2:
+        # chi2_contingency applies Yates' correction to 2x2 tables
+        chi2 = chi2_contingency(table)[0]
+    else:
+        # Chi-squared without forming the expected counts: n * (sum O² / (row * col) - 1)
+        row_totals, col_totals = table.sum(axis=1), table.sum(axis=0)
+        chi2 = n * ((table ** 2 / np.outer(row_totals, col_totals)).sum() - 1)
+    return np.sqrt(max(chi2, 0.0) / (n * (min(r, k) - 1)))
+
+
+def sparse_cramers_v(rows, cols, counts):
+    """
+    Cramér's V from coordinate contingency counts (see sparse_contingency_counts).
+    """
+    # Number the levels that occur 0..r-1 and 0..k-1
+    rows = np.unique(rows, return_inverse=True)[1]
+    cols = np.unique(cols, return_inverse=True)[1]
+    r, k = (rows.max() + 1, cols.max() + 1) if len(counts) else (0, 0)
+    if min(r, k) < 2 or (r == 2 and k == 2):
+        # Small enough to go through the dense table
+        table = np.zeros((r, k), dtype=np.int64)
+        table[rows, cols] = counts
+        return cramers_v(table)
+
+    n = counts.sum()
+    row_totals = np.bincount(rows, weights=counts)
+    col_totals = np.bincount(cols, weights=counts)
+    chi2 = n * ((counts ** 2 / (row_totals[rows] * col_totals[cols])).sum() - 1)
+    return np.sqrt(max(chi2, 0.0) / (n * (min(r, k) - 1)))
+
+
+def coded_cramers_v(coded_x, coded_y, memory_limit=CONTINGENCY_MEMORY_LIMIT):
+    """
+    Cramér's V of two (codes, k) columns, from a dense table when it fits in memory_limit bytes
+    and from sparse counts otherwise.
+    """
+    (codes_x, k_x), (codes_y, k_y) = coded_x, coded_y
+    if k_x * k_y * np.dtype(np.int64).itemsize <= memory_limit:
+        return cramers_v(contingency_table(codes_x, k_x, codes_y, k_y))
+    return sparse_cramers_v(*sparse_contingency_counts(codes_x, k_x, codes_y, k_y))
+
+
+def pearson_matrix(values):
+    """
+    Pearson correlations of all columns of values (rows x columns) at once, each pair over the
+    rows where both are present (as Series.corr does). NaN for constant columns.
+    """
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    if present.all():
+        centred = values - values.mean(axis=0)
+        products = centred.T @ centred
+        scale = np.sqrt(np.diagonal(products))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = products / np.outer(scale, scale)
+        corr[:, scale == 0] = corr[scale == 0, :] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+    # Centre on the column means first, so the sums below do not lose precision
+    centred = np.where(present, values - np.nanmean(values, axis=0), 0.0)
+    mask = present.astype(float)
+
+    n = mask.T @ mask
+    sums = centred.T @ mask  # sums[i, j]: sum of column i over the rows where j is present
+    squares = (centred ** 2).T @ mask
+    products = centred.T @ centred
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = n * products - sums * sums.T
+        variance = (n * squares - sums ** 2) * (n * squares - sums ** 2).T
+        corr = covariance / np.sqrt(variance)
+    corr[(n < 2) | ~(variance > 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def mixed_correlation_matrix(df, categorical, memory_limit=CONTINGENCY_MEMORY_LIMIT):
+    """
+    Association matrix of the columns of df: Pearson correlation for pairs of numeric columns and
+    Cramér's V whenever one of the columns is in categorical.
+
+    All numeric pairs come from one matrix product; the other pairs are evaluated once each
+    (upper triangle and diagonal) from contingency counts and mirrored. Continuous columns are
+    binned for Cramér's V and no contingency table larger than memory_limit bytes is allocated.
+    """
+    columns = list(df.columns)
+    matrix = np.full((len(columns), len(columns)), np.nan)
+
+    numeric = [i for i, col in enumerate(columns) if col not in categorical]
+    if numeric:
+        matrix[np.ix_(numeric, numeric)] = pearson_matrix(
+            df[[columns[i] for i in numeric]].to_numpy(dtype=float, na_value=np.nan)
+        )
+
+    coded = {}
+    for i, col_i in enumerate(columns):
+        for j in range(i, len(columns)):
+            col_j = columns[j]
+            if col_i not in categorical and col_j not in categorical:
+                continue
+            for col in (col_i, col_j):
+                if col not in coded:
+                    coded[col] = association_codes(df[col], col in categorical)
+            matrix[i, j] = matrix[j, i] = coded_cramers_v(coded[col_i], coded[col_j], memory_limit)
+
+    return pd.DataFrame(matrix, index=columns, columns=columns)
+
+
+def correlation_from_sums(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy):
+    """
+    Pearson correlation from counts, sums, sums of squares and cross-products (arrays of any
+    shape). NaN where there are fewer than two rows or either column is constant.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = n * sum_xy - sum_x * sum_y
+        variance = (n * sum_xx - sum_x ** 2) * (n * sum_yy - sum_y ** 2)
+        corr = covariance / np.sqrt(variance)
+    corr = np.where((n > 1) & (variance > 0), corr, np.nan)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def grouped_correlations(df, by, pairs):
+    """
+    Pearson correlation of every (x, y) column pair within every group of the by column(s), as
+    groupby(by).apply(lambda g: g[x].corr(g[y])) would give but without splitting the frame: the
+    counts, sums, sums of squares and cross-products of all groups come from one bincount each
+    over the rows. Each pair uses the rows where both columns are present. Returns one row per
+    group and one column per pair (a (x, y) MultiIndex).
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    pairs = [tuple(pair) for pair in pairs]
+    if len(by) == 1:
+        codes, keys = pd.factorize(df[by[0]], sort=True)
+        keys = pd.Index(keys, name=by[0])
+    else:
+        grouped = df.groupby(by, observed=True, sort=True)
+        # Rows with a missing key get no group number (NaN)
+        codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        keys = grouped.size().index
+    n_groups = len(keys)
+    grouped_rows = codes >= 0  # Rows with a missing key belong to no group
+    codes = codes[grouped_rows]
+
+    # Centre on the column means first, so the sums below do not lose precision
+    columns = list(dict.fromkeys(col for pair in pairs for col in pair))
+    values = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)[grouped_rows]
+    present = ~np.isnan(values)
+    centred = np.where(present, values - np.nanmean(values, axis=0), 0.0)
+    position = {col: i for i, col in enumerate(columns)}
+
+    def sums(weights):
+        return np.bincount(codes, weights=weights, minlength=n_groups)
+
+    # Columns without missing values share their count, sum and sum of squares across pairs
+    counts = np.bincount(codes, minlength=n_groups).astype(float)
+    complete = {
+        col: (sums(centred[:, i]), sums(centred[:, i] ** 2))
+        for col, i in position.items() if present[:, i].all()
+    }
+
+    corr = np.empty((n_groups, len(pairs)))
+    for k, (x, y) in enumerate(pairs):
+        cx, cy = centred[:, position[x]], centred[:, position[y]]
+        if x in complete and y in complete:
+            n, (sum_x, sum_xx), (sum_y, sum_yy) = counts, complete[x], complete[y]
+        else:
+            both = present[:, position[x]] & present[:, position[y]]
+            cx, cy = cx * both, cy * both
+            n, sum_x, sum_y, sum_xx, sum_yy = sums(both.astype(float)), sums(cx), sums(cy), sums(cx * cx), sums(cy * cy)
+        corr[:, k] = correlation_from_sums(n, sum_x, sum_y, sum_xx, sum_yy, sums(cx * cy))
+    return pd.DataFrame(corr, index=keys, columns=pd.MultiIndex.from_tuples(pairs, names=['x', 'y']))
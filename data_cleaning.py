@@ -1,72 +1,180 @@
 import pandas as pd
 import numpy as np
 import streamlit as st
+from collections import namedtuple
 
-def clean_data(df):
+# Declarative description of how each column is cleaned.
+#   dtype:   'datetime', 'category', 'int', 'float' or 'number' (int if integral, else float)
+#   errors:  'raise' to fail on unparseable values, 'coerce' to turn them into missing values
+#   missing: 'keep', 'drop' (drop the row), 'fill' (use fill_value) or 'raise'
+ColumnSpec = namedtuple('ColumnSpec', ['dtype', 'errors', 'missing', 'fill_value'])
+ColumnSpec.__new__.__defaults__ = ('raise', 'keep', None)
+
+CLEANING_SCHEMA = {
+    'month': ColumnSpec('datetime', errors='coerce', missing='fill', fill_value=pd.Timestamp('1970-01-01')),
+    'accid': ColumnSpec('category'),
+    'acctype': ColumnSpec('category'),
+    'accsize': ColumnSpec('int', missing='raise'),
+    'acctargets': ColumnSpec('int', missing='raise'),
+    'district': ColumnSpec('int', missing='raise'),
+    'sales': ColumnSpec('int', missing='raise'),
+    'qty': ColumnSpec('number', errors='coerce', missing='drop'),
+    'strategy1': ColumnSpec('float'),
+    'strategy2': ColumnSpec('float'),
+    'strategy3': ColumnSpec('float'),
+    'salesvisit1': ColumnSpec('float'),
+    'salesvisit2': ColumnSpec('float'),
+    'salesvisit3': ColumnSpec('float'),
+    'salesvisit4': ColumnSpec('float'),
+    'salesvisit5': ColumnSpec('float'),
+    'compbrand': ColumnSpec('int', missing='raise'),
+}
+
+INT32 = np.iinfo(np.int32)
+
+
+def _downcast_integer(values):
+    """
+    Store integers as int32 when every value fits, otherwise as int64.
+    """
+    values = values.astype(np.int64)
+    if len(values) and INT32.min <= values.min() and values.max() <= INT32.max:
+        return values.astype(np.int32)
+    return values
+
+
+def _downcast_float(values):
+    """
+    Store floats as float32 only when the round trip is exact.
+    """
+    values = values.astype(np.float64)
+    narrowed = values.astype(np.float32)
+    if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+        return narrowed
+    return values
+
+
+def _to_category(column):
+    """
+    Convert to a categorical with string categories, converting each distinct value only once.
+    """
+    categorical = column.astype('category')
+    categories = categorical.cat.categories
+    if categories.dtype != object or not all(isinstance(value, str) for value in categories):
+        as_text = categories.astype(str)
+        if as_text.is_unique:
+            categorical = categorical.cat.rename_categories(as_text)
+    return categorical
+
+
+def _coerce_column(column, spec):
+    """
+    Convert one raw column according to its spec. Returns (values, missing mask).
+    """
+    if spec.dtype == 'datetime':
+        values = pd.to_datetime(column, errors=spec.errors)
+        return values, values.isna().to_numpy()
+
+    if spec.dtype == 'category':
+        values = _to_category(column)
+        return values, values.isna().to_numpy()
+
+    values = pd.to_numeric(column, errors=spec.errors).to_numpy(dtype=np.float64, na_value=np.nan)
+    return values, np.isnan(values)
+
+
+def _finalize_numeric(values, spec):
+    """
+    Pick the most compact lossless dtype for an already filtered numeric column. Integer columns
+    that kept missing values become nullable (Int32/Int64), so the missing values stay missing.
+    """
+    if spec.dtype == 'int':
+        missing = np.isnan(values)
+        if missing.any():
+            return pd.arrays.IntegerArray(_downcast_integer(np.trunc(np.where(missing, 0, values))), missing)
+        return _downcast_integer(np.trunc(values))
+    if spec.dtype == 'number' and not np.isnan(values).any() and np.array_equal(values, np.trunc(values)):
+        return _downcast_integer(values)
+    return _downcast_float(values)
+
+
+def clean_data(df, schema=CLEANING_SCHEMA):
     """
     Clean the dataset by converting data types, handling missing or invalid values,
     and ensuring compatibility with Arrow serialization.
+
+    Every column listed in the schema is converted exactly once and stored in the most
+    compact lossless dtype; the cleaned frame is assembled in a single step.
+    Memory usage before and after cleaning is recorded in df.attrs['memory_usage'].
     """
+    memory_before = int(df.memory_usage(deep=True).sum())
+
     # Ensure column names are standardized
-    df.columns = df.columns.str.strip().str.lower()
-    
-    # Keep track of the original column order
-    original_column_order = df.columns.tolist()
-
-    # Drop the 'Unnamed: 0' column if it exists
-    if 'unnamed: 0' in df.columns:
-        df.drop(columns=['unnamed: 0'], inplace=True)
-    
-    # Convert 'month' column to datetime
-    if 'month' in df.columns:
-        df['month'] = pd.to_datetime(df['month'], errors='coerce')
-        df['month'].fillna(pd.Timestamp('1970-01-01'), inplace=True)
-    else:
+    columns = df.columns.str.strip().str.lower()
+
+    # Drop the 'Unnamed: 0' column if it exists, keeping the original column order
+    keep = [position for position, name in enumerate(columns) if name != 'unnamed: 0']
+    names = [columns[position] for position in keep]
+
+    if 'month' not in names:
         raise KeyError("The 'month' column is missing from the data.")
-    
-    # Convert columns to appropriate data types
-    if 'accid' in df.columns:
-        df['accid'] = df['accid'].astype(str)
-    if 'acctype' in df.columns:
-        df['acctype'] = df['acctype'].astype('category')
-    if 'accsize' in df.columns:
-        df['accsize'] = df['accsize'].astype(int)
-    if 'acctargets' in df.columns:
-        df['acctargets'] = df['acctargets'].astype(int)
-    if 'district' in df.columns:
-        df['district'] = df['district'].astype(int)
-    if 'sales' in df.columns:
-        df['sales'] = df['sales'].astype(int)
-    if 'qty' in df.columns:
-        df['qty'] = pd.to_numeric(df['qty'], errors='coerce')
-        df = df.dropna(subset=['qty'])  # Drop rows where 'qty' is NaN
-    if 'strategy1' in df.columns:
-        df['strategy1'] = df['strategy1'].astype(float)
-    if 'strategy2' in df.columns:
-        df['strategy2'] = df['strategy2'].astype(float)
-    if 'strategy3' in df.columns:
-        df['strategy3'] = df['strategy3'].astype(float)
-    if 'salesvisit1' in df.columns:
-        df['salesvisit1'] = df['salesvisit1'].astype(float)
-    if 'salesvisit2' in df.columns:
-        df['salesvisit2'] = df['salesvisit2'].astype(float)
-    if 'salesvisit3' in df.columns:
-        df['salesvisit3'] = df['salesvisit3'].astype(float)
-    if 'salesvisit4' in df.columns:
-        df['salesvisit4'] = df['salesvisit4'].astype(float)
-    if 'salesvisit5' in df.columns:
-        df['salesvisit5'] = df['salesvisit5'].astype(float)
-    if 'compbrand' in df.columns:
-        df['compbrand'] = df['compbrand'].astype(int)
-
-    # Restore the original column order
-    df = df[original_column_order]
-
-    # Display data types and first few rows
+
+    converted = {}
+    keep_rows = np.ones(len(df), dtype=bool)
+
+    for position, name in zip(keep, names):
+        column = df.iloc[:, position]
+        spec = schema.get(name)
+        if spec is None:
+            converted[name] = column.to_numpy()
+            continue
+
+        values, missing = _coerce_column(column, spec)
+        if missing.any():
+            if spec.missing == 'drop':
+                keep_rows &= ~missing
+            elif spec.missing == 'fill':
+                values = values.fillna(spec.fill_value) if isinstance(values, pd.Series) \
+                    else np.where(missing, spec.fill_value, values)
+            elif spec.missing == 'raise':
+                raise ValueError(f"Column '{name}' contains missing values.")
+        converted[name] = values
+
+    # Apply the row filter once and build the cleaned frame in one go
+    row_positions = np.flatnonzero(keep_rows)
+    filtered = len(row_positions) < len(df)
+    data = {}
+    for name, values in converted.items():
+        spec = schema.get(name)
+        if isinstance(values, pd.Series):
+            values = values.to_numpy() if spec is None or spec.dtype != 'category' else values.array
+        if filtered:
+            values = values.take(row_positions)
+        if spec is not None and spec.dtype in ('int', 'float', 'number'):
+            values = _finalize_numeric(values, spec)
+        data[name] = values
+
+    df = pd.DataFrame(data, index=df.index[row_positions] if filtered else df.index)
+
+    memory_after = int(df.memory_usage(deep=True).sum())
+    df.attrs['memory_usage'] = {'before': memory_before, 'after': memory_after}
+
+    return df
+
+
+def render_cleaning_report(df):
+    """
+    Display the data types, memory usage and first few rows of a cleaned DataFrame.
+    """
     st.write("Data Types of Cleaned DataFrame:")
     st.write(df.dtypes)
 
+    memory_usage = df.attrs.get('memory_usage')
+    if memory_usage:
+        st.write(
+            f"Memory usage: {memory_usage['before'] / 1e6:,.1f} MB before cleaning, "
+            f"{memory_usage['after'] / 1e6:,.1f} MB after cleaning"
+        )
+
     st.write("First few rows of the DataFrame:")
     st.write(df.head())
-
-    return df
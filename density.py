@@ -0,0 +1,147 @@
+# density.py
+
+import altair as alt
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib import colors
+
+# Above this many points, plots show binned density instead of one mark per point
+DENSITY_THRESHOLD = 5000
+
+# Bins per axis of the density grid (at most DENSITY_BINS ** 2 tiles are drawn)
+DENSITY_BINS = 60
+
+
+def _bin_codes(values, bins):
+    """
+    Index (0..bins-1) of the equal-width bin of each value over the range of values, and the edges.
+    """
+    low, high = values.min(), values.max()
+    if high <= low:
+        low, high = low - 0.5, high + 0.5
+    edges = np.linspace(low, high, bins + 1)
+    codes = ((values - low) * (bins / (high - low))).astype(np.int64)
+    return np.minimum(codes, bins - 1), edges
+
+
+def density_grid(x, y, bins=DENSITY_BINS, weights=None):
+    """
+    Point counts on a bins x bins grid over the range of x and y, computed with one bincount.
+    With weights, also the sum of the weights in each cell. Rows with a missing value are ignored.
+    Returns (counts, x_edges, y_edges), or (counts, sums, x_edges, y_edges) with weights.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    present = ~(np.isnan(x) | np.isnan(y))
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        present &= ~np.isnan(weights)
+    if not present.any():
+        counts = np.zeros((bins, bins))
+        edges = np.linspace(0.0, 1.0, bins + 1)
+        return (counts, counts.copy(), edges, edges) if weights is not None else (counts, edges, edges)
+
+    x_codes, x_edges = _bin_codes(x[present], bins)
+    y_codes, y_edges = _bin_codes(y[present], bins)
+    cells = x_codes * bins + y_codes
+    counts = np.bincount(cells, minlength=bins * bins).reshape(bins, bins).astype(float)
+    if weights is None:
+        return counts, x_edges, y_edges
+    sums = np.bincount(cells, weights=weights[present], minlength=bins * bins).reshape(bins, bins)
+    return counts, sums, x_edges, y_edges
+
+
+def density_tiles(data, x, y, bins=DENSITY_BINS):
+    """
+    The non-empty tiles of the density grid of data[x] against data[y], one row per tile with
+    its bounds and count.
+    """
+    counts, x_edges, y_edges = density_grid(data[x], data[y], bins)
+    i, j = np.nonzero(counts)
+    return pd.DataFrame({
+        f'{x}_start': x_edges[i], f'{x}_end': x_edges[i + 1],
+        f'{y}_start': y_edges[j], f'{y}_end': y_edges[j + 1],
+        'count': counts[i, j].astype(int),
+    })
+
+
+def fitted_line(data, x, y, slope):
+    """
+    End points of the line with the fitted slope of x through the means of x and y. For an OLS fit
+    with a constant this is the partial effect of x with the other regressors at their means.
+    """
+    x_values = data[x].dropna()
+    if x_values.empty:
+        return pd.DataFrame({x: [], y: []})
+    x_mean, y_mean = x_values.mean(), data[y].mean()
+    ends = np.array([x_values.min(), x_values.max()])
+    return pd.DataFrame({x: ends, y: y_mean + slope * (ends - x_mean)})
+
+
+def scatter_chart(data, x, y, slope, title, threshold=DENSITY_THRESHOLD, bins=DENSITY_BINS):
+    """
+    Altair chart of y against x with the fitted line. Up to threshold points are drawn as points;
+    beyond that the points are binned server-side into density tiles, so the data sent to the
+    browser is bounded by the number of tiles whatever the number of rows.
+    """
+    line = alt.Chart(fitted_line(data, x, y, slope)).mark_line(color='black').encode(x=f'{x}:Q', y=f'{y}:Q')
+
+    if len(data) <= threshold:
+        points = alt.Chart(data[[x, y]]).mark_point().encode(x=x, y=y, tooltip=[x, y])
+    else:
+        points = alt.Chart(density_tiles(data, x, y, bins)).mark_rect().encode(
+            x=alt.X(f'{x}_start:Q', bin='binned', title=x),
+            x2=f'{x}_end:Q',
+            y=alt.Y(f'{y}_start:Q', bin='binned', title=y),
+            y2=f'{y}_end:Q',
+            color=alt.Color('count:Q', scale=alt.Scale(type='log'), title='Rows'),
+            tooltip=['count:Q'],
+        )
+    return (points + line).properties(title=title)
+
+
+def density_image(ax, data, x, y, hue=None, bins=DENSITY_BINS, cmap='coolwarm'):
+    """
+    Draw y against x on a matplotlib axis as a single image of the density grid.
+
+    Without hue, cells are coloured by the (log) number of rows. With hue, each cell is coloured
+    by the mean hue value of its rows and its opacity shows how many rows it holds.
+    """
+    if hue is None:
+        counts, x_edges, y_edges = density_grid(data[x], data[y], bins)
+    else:
+        counts, hue_sums, x_edges, y_edges = density_grid(data[x], data[y], bins, weights=data[hue])
+    extent = [x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]]
+    filled = counts > 0
+
+    if hue is None:
+        image = np.ma.masked_where(~filled, counts)
+        artist = ax.imshow(image.T, origin='lower', extent=extent, aspect='auto', interpolation='nearest',
+                           cmap='viridis', norm=colors.LogNorm(vmin=1, vmax=max(counts.max(), 1)))
+        ax.figure.colorbar(artist, ax=ax, label='Rows')
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(filled, hue_sums / counts, np.nan)
+        norm = colors.Normalize(vmin=np.nanmin(data[hue]), vmax=np.nanmax(data[hue]))
+        mapper = plt.cm.ScalarMappable(norm=norm, cmap=cmap)
+        rgba = mapper.to_rgba(np.nan_to_num(means))
+        # Opacity grows with the log of the row count; empty cells are transparent
+        rgba[..., 3] = np.where(filled, 0.25 + 0.75 * np.log1p(counts) / np.log1p(max(counts.max(), 1)), 0.0)
+        ax.imshow(rgba.transpose(1, 0, 2), origin='lower', extent=extent, aspect='auto', interpolation='nearest')
+        ax.figure.colorbar(mapper, ax=ax, label=f'Mean {hue}')
+
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+
+
+def scatter_or_density(ax, data, x, y, hue=None, palette='coolwarm', threshold=DENSITY_THRESHOLD):
+    """
+    A seaborn scatter plot of up to threshold rows, and a density image (see density_image) beyond,
+    so drawing time stays roughly flat as the number of rows grows.
+    """
+    if len(data) <= threshold:
+        sns.scatterplot(x=x, y=y, hue=hue, data=data, palette=palette, ax=ax)
+    else:
+        density_image(ax, data, x, y, hue=hue, cmap=palette)
@@ -1,121 +1,100 @@
 import streamlit as st
 import pandas as pd
-import statsmodels.api as sm
-from inference import generate_inference  # Import the inference function
+from dataclasses import dataclass
+from inference import request_inference, run_inferences  # Import the inference functions
+from regression import STRATEGY_COLUMNS, fit_overall_regression, prepare_regression_data
 
-def calculate_sales_from_strategy(df):
+# Spending assumed for each strategy when no spending columns exist (share of the strategy value)
+DEFAULT_SPENDING_SHARES = {'strategy1': 0.10, 'strategy2': 0.12, 'strategy3': 0.08}
+
+
+@dataclass
+class DollarSalesResult:
+    coefficients: dict  # Strategy -> regression coefficient
+    total_sales: dict  # Strategy -> dollar value of sales attributed to it
+    net_sales: dict  # Strategy -> sales after subtracting spending
+    data: pd.DataFrame  # Rows with per-strategy sales and net sales
+
+    def summary(self):
+        # Format the sales summary as strings to avoid garbling
+        summary = {}
+        for i, strategy in enumerate(STRATEGY_COLUMNS, 1):
+            summary[f"Total Sales Strategy {i}"] = f"SGD {self.total_sales[strategy]:,.2f}"
+        for i, strategy in enumerate(STRATEGY_COLUMNS, 1):
+            summary[f"Net Sales Strategy {i}"] = f"SGD {self.net_sales[strategy]:,.2f}"
+        return summary
+
+
+def compute_sales_from_strategy(df):
     """
     Calculate total and net sales from each strategy using dynamically calculated coefficients.
     """
-    st.header("Dollar Value of Sales from Each Strategy (in SGD)")
-
-    # Ensure columns are in lowercase
-    df.columns = df.columns.str.strip().str.lower()
-
     # Check if required columns are present
-    required_columns = ['strategy1', 'strategy2', 'strategy3', 'sales']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    
+    columns = df.columns.str.strip().str.lower()
+    required_columns = STRATEGY_COLUMNS + ['sales']
+    missing_columns = [col for col in required_columns if col not in columns]
+
     if missing_columns:
-        st.error(f"Missing columns for analysis: {', '.join(missing_columns)}")
-        return
+        raise ValueError(f"Missing columns for analysis: {', '.join(missing_columns)}")
 
-    # Ensure required columns are numeric
-    df['strategy1'] = pd.to_numeric(df['strategy1'], errors='coerce')
-    df['strategy2'] = pd.to_numeric(df['strategy2'], errors='coerce')
-    df['strategy3'] = pd.to_numeric(df['strategy3'], errors='coerce')
-    df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
+    # The overall strategy regression, fitted once per dataset
+    model = fit_overall_regression(df)
 
-    # Drop rows with missing values in these columns
-    df = df.dropna(subset=['sales', 'strategy1', 'strategy2', 'strategy3'])
+    # Keep every column so the updated dataframe can be displayed in full
+    df = prepare_regression_data(df, extra_columns=columns)
 
     # Add dummy spending data if spending columns do not exist
-    if 'spending_strategy1' not in df.columns:
-        df['spending_strategy1'] = 0.10 * df['strategy1']  # 10% of strategy value
-    if 'spending_strategy2' not in df.columns:
-        df['spending_strategy2'] = 0.12 * df['strategy2']  # 12% of strategy value
-    if 'spending_strategy3' not in df.columns:
-        df['spending_strategy3'] = 0.08 * df['strategy3']  # 8% of strategy value
-
-    # Define independent variables (strategies) and dependent variable (sales)
-    X = df[['strategy1', 'strategy2', 'strategy3']]
-    X = sm.add_constant(X)  # Adds a constant term for the regression
-    y = df['sales']
-
-    # Fit the regression model
-    model = sm.OLS(y, X).fit()
-
-    # Extract the coefficients from the model parameters dynamically
-    coeff_strategy1 = model.params['strategy1']
-    coeff_strategy2 = model.params['strategy2']
-    coeff_strategy3 = model.params['strategy3']
-
-    # Calculate the dollar value of sales for each strategy
-    df['sales_from_strategy1'] = coeff_strategy1 * df['strategy1']
-    df['sales_from_strategy2'] = coeff_strategy2 * df['strategy2']
-    df['sales_from_strategy3'] = coeff_strategy3 * df['strategy3']
-
-    # Calculate net sales after subtracting spending
-    df['net_sales_from_strategy1'] = df['sales_from_strategy1'] - df['spending_strategy1']
-    df['net_sales_from_strategy2'] = df['sales_from_strategy2'] - df['spending_strategy2']
-    df['net_sales_from_strategy3'] = df['sales_from_strategy3'] - df['spending_strategy3']
-
-    # Summing up the dollar value of sales and net sales for each strategy
-    total_sales_strategy1 = df['sales_from_strategy1'].sum()
-    total_sales_strategy2 = df['sales_from_strategy2'].sum()
-    total_sales_strategy3 = df['sales_from_strategy3'].sum()
-
-    net_sales_strategy1 = df['net_sales_from_strategy1'].sum()
-    net_sales_strategy2 = df['net_sales_from_strategy2'].sum()
-    net_sales_strategy3 = df['net_sales_from_strategy3'].sum()
+    for strategy, share in DEFAULT_SPENDING_SHARES.items():
+        if f'spending_{strategy}' not in df.columns:
+            df[f'spending_{strategy}'] = share * df[strategy]
+
+    coefficients, total_sales, net_sales = {}, {}, {}
+    for strategy in STRATEGY_COLUMNS:
+        # Extract the coefficients from the model parameters dynamically
+        coefficients[strategy] = model.params[strategy]
+
+        # Calculate the dollar value of sales and net sales after subtracting spending
+        df[f'sales_from_{strategy}'] = coefficients[strategy] * df[strategy]
+        df[f'net_sales_from_{strategy}'] = df[f'sales_from_{strategy}'] - df[f'spending_{strategy}']
+
+        # Summing up the dollar value of sales and net sales for each strategy
+        total_sales[strategy] = df[f'sales_from_{strategy}'].sum()
+        net_sales[strategy] = df[f'net_sales_from_{strategy}'].sum()
+
+    return DollarSalesResult(coefficients, total_sales, net_sales, df)
+
+
+def render_sales_from_strategy(result):
+    """
+    Display the dollar value of sales from each strategy.
+    """
+    st.header("Dollar Value of Sales from Each Strategy (in SGD)")
 
     # Display the results in Streamlit
     st.subheader("Total Sales from Each Strategy (SGD)")
-    st.write(f"Total Sales from Strategy 1: SGD {total_sales_strategy1:,.2f}")
-    st.write(f"Total Sales from Strategy 2: SGD {total_sales_strategy2:,.2f}")
-    st.write(f"Total Sales from Strategy 3: SGD {total_sales_strategy3:,.2f}")
+    for i, strategy in enumerate(STRATEGY_COLUMNS, 1):
+        st.write(f"Total Sales from Strategy {i}: SGD {result.total_sales[strategy]:,.2f}")
 
     st.subheader("Net Sales from Each Strategy (After Spending, in SGD)")
-    st.write(f"Net Sales from Strategy 1: SGD {net_sales_strategy1:,.2f}")
-    st.write(f"Net Sales from Strategy 2: SGD {net_sales_strategy2:,.2f}")
-    st.write(f"Net Sales from Strategy 3: SGD {net_sales_strategy3:,.2f}")
+    for i, strategy in enumerate(STRATEGY_COLUMNS, 1):
+        st.write(f"Net Sales from Strategy {i}: SGD {result.net_sales[strategy]:,.2f}")
 
     # Optionally, display the updated dataframe
     st.write("Updated Dataframe with Sales and Net Sales from Each Strategy:")
-    st.dataframe(df)
-
-    # Format the sales summary as strings to avoid garbling
-    sales_summary = {
-        "Total Sales Strategy 1": f"SGD {total_sales_strategy1:,.2f}",
-        "Total Sales Strategy 2": f"SGD {total_sales_strategy2:,.2f}",
-        "Total Sales Strategy 3": f"SGD {total_sales_strategy3:,.2f}",
-        "Net Sales Strategy 1": f"SGD {net_sales_strategy1:,.2f}",
-        "Net Sales Strategy 2": f"SGD {net_sales_strategy2:,.2f}",
-        "Net Sales Strategy 3": f"SGD {net_sales_strategy3:,.2f}"
-    }
-
-    # Better prompt to guide the AI with actionable recommendations
-    prompt = f"""
-    The business is analyzing three strategies with the following sales performance in SGD:
-
-    Total Sales:
-    - Strategy 1: {sales_summary["Total Sales Strategy 1"]}
-    - Strategy 2: {sales_summary["Total Sales Strategy 2"]}
-    - Strategy 3: {sales_summary["Total Sales Strategy 3"]}
-
-    Net Sales after spending:
-    - Strategy 1: {sales_summary["Net Sales Strategy 1"]}
-    - Strategy 2: {sales_summary["Net Sales Strategy 2"]}
-    - Strategy 3: {sales_summary["Net Sales Strategy 3"]}
-
-    Please provide:
-    1. The best performing strategy in terms of sales and net profit.
-    2. Specific recommendations to improve the performance of underperforming strategies.
-    3. Potential risks associated with these strategies and suggestions to mitigate them.
-    4. Any other actionable insights to optimize overall sales performance.
-    """
+    st.dataframe(result.data)
 
+    # Request an inference for the formatted sales summary
+    return [request_inference(result.summary(), "Dollar Value Sales Analysis")]
 
-    # Call the generate_inference function with the formatted sales summary
-    inference_result = generate_inference(sales_summary, "Dollar Value Sales Analysis")
-    st.write(f"Inference: {inference_result}")
+
+def calculate_sales_from_strategy(df):
+    """
+    Calculate total and net sales from each strategy using dynamically calculated coefficients.
+    """
+    try:
+        result = compute_sales_from_strategy(df)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    run_inferences(render_sales_from_strategy(result))
+    return result.summary()
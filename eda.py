@@ -3,9 +3,50 @@ import numpy as np
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
+from dataclasses import dataclass, field
 from scipy import stats
 from scipy.stats import chi2_contingency
-from inference import generate_inference  # Import the inference function
+from inference import request_inference, run_inferences  # Import the inference functions
+from correlation_engine import identifier_columns, mixed_correlation_matrix
+from event_study import entry_months
+
+# List of all columns we want to include in the correlation matrix
+CORRELATION_COLUMNS = [
+    'accid', 'acctype', 'accsize', 'acctargets', 'district', 'sales', 'qty',
+    'strategy1', 'strategy2', 'strategy3', 'salesvisit1', 'salesvisit2',
+    'salesvisit3', 'salesvisit4', 'salesvisit5', 'compbrand'
+]
+
+# Key columns that are always left out of the correlation matrix, whatever their type
+IDENTIFIER_COLUMNS = ['accid']
+
+
+@dataclass
+class CorrelationResult:
+    matrix: pd.DataFrame
+    excluded: list = field(default_factory=list)  # Identifier-like columns left out of the matrix
+
+    def summary(self):
+        return self.matrix.to_dict()
+
+
+@dataclass
+class AccountTypeSalesResult:
+    data: pd.DataFrame  # 'acctype' and clipped 'sales', one row per record
+    sales_by_acctype: pd.DataFrame  # describe() of sales per account type
+
+    def summary(self):
+        return self.sales_by_acctype.to_dict()
+
+
+@dataclass
+class SalesTrendResult:
+    monthly_sales: pd.DataFrame  # 'month' and total 'sales', sorted by month
+    competitor_entry_dates: list = field(default_factory=list)  # Months with the most competitor entries ('YYYY-MM')
+
+    def summary(self):
+        return self.monthly_sales.to_dict()
+
 
 # Function to calculate Cramér's V
 def calculate_cramers_v(x, y):
@@ -38,28 +79,17 @@ def clean_categorical_columns(df, categorical_columns):
             df[col] = df[col].astype('category').cat.codes  # Label encoding
     return df
 
-def plot_correlation_matrix(df):
+
+def compute_correlation_matrix(df):
     """
-    Plot a correlation matrix for all variables in the dataset, including categorical ones.
+    Compute a correlation matrix for all key variables in the dataset, including categorical ones.
+    Pearson correlation is used for numeric pairs and Cramér's V whenever a categorical column is involved.
     """
-    st.write("Column Headers in Cleaned DataFrame:")
-    st.write(df.columns)
-    st.write("First few rows of the DataFrame:")
-    st.write(df.head())
-
-    # List of all columns we want to include
-    all_columns = [
-        'accid', 'acctype', 'accsize', 'acctargets', 'district', 'sales', 'qty',
-        'strategy1', 'strategy2', 'strategy3', 'salesvisit1', 'salesvisit2',
-        'salesvisit3', 'salesvisit4', 'salesvisit5', 'compbrand'
-    ]
-
     # Filter to only the columns that exist in the DataFrame
-    available_columns = [col for col in all_columns if col in df.columns]
+    available_columns = [col for col in CORRELATION_COLUMNS if col in df.columns]
 
     if not available_columns:
-        st.warning("No columns available for correlation matrix.")
-        return
+        return CorrelationResult(pd.DataFrame(dtype=float))
 
     # Create a copy of the DataFrame with only the available columns
     df_corr = df[available_columns].copy()
@@ -68,6 +98,16 @@ def plot_correlation_matrix(df):
     def to_numeric_or_categorical(column):
         if pd.api.types.is_numeric_dtype(column):
             return column
+        elif isinstance(column.dtype, pd.CategoricalDtype):
+            # Convert each distinct value once rather than every row
+            try:
+                categories = pd.to_numeric(column.cat.categories)
+            except ValueError:
+                return column
+            codes = column.cat.codes.to_numpy()
+            if (codes < 0).any():
+                return pd.Series(np.where(codes >= 0, categories.to_numpy(dtype=float)[codes], np.nan), index=column.index)
+            return pd.Series(categories.to_numpy()[codes], index=column.index)
         else:
             try:
                 return pd.to_numeric(column)
@@ -78,24 +118,33 @@ def plot_correlation_matrix(df):
     for col in df_corr.columns:
         df_corr[col] = to_numeric_or_categorical(df_corr[col])
 
-    # Create a correlation matrix
-    corr_matrix = pd.DataFrame(index=df_corr.columns, columns=df_corr.columns)
-
-    for col1 in df_corr.columns:
-        for col2 in df_corr.columns:
-            if df_corr[col1].dtype.name == 'category' or df_corr[col2].dtype.name == 'category':
-                # Use Cramer's V for categorical variables
-                try:
-                    cramers_v = calculate_cramers_v(df_corr[col1], df_corr[col2])
-                    corr_matrix.loc[col1, col2] = cramers_v
-                except ValueError:
-                    corr_matrix.loc[col1, col2] = np.nan
-            else:
-                # Use Pearson correlation for numeric variables
-                corr_matrix.loc[col1, col2] = df_corr[col1].corr(df_corr[col2])
-
-    # Convert correlation matrix to float
-    corr_matrix = corr_matrix.astype(float)
+    # Pearson for numeric pairs and Cramér's V for pairs involving a categorical column, each pair once
+    categorical = [col for col in df_corr.columns if df_corr[col].dtype.name == 'category']
+
+    # Identifier-like columns (e.g. account IDs) would need huge tables and say nothing. Rows are
+    # account-months, so cardinality is measured against the rows of an average month
+    periods = df['month'] if 'month' in df.columns else None
+    excluded = [col for col in IDENTIFIER_COLUMNS if col in df_corr.columns]
+    excluded += [col for col in identifier_columns(df_corr, categorical, periods) if col not in excluded]
+    df_corr = df_corr.drop(columns=excluded)
+    categorical = [col for col in categorical if col not in excluded]
+
+    return CorrelationResult(mixed_correlation_matrix(df_corr, categorical), excluded)
+
+
+def render_correlation_matrix(result):
+    """
+    Plot and display a computed correlation matrix.
+    """
+    corr_matrix = result.matrix
+    if corr_matrix.empty:
+        st.warning("No columns available for correlation matrix.")
+        return []
+
+    st.write("Columns in the Correlation Matrix:")
+    st.write(list(corr_matrix.columns))
+    if result.excluded:
+        st.info(f"Left out as identifier-like (nearly one value per account): {', '.join(result.excluded)}")
 
     # Plot correlation matrix
     plt.figure(figsize=(20, 16))
@@ -109,28 +158,43 @@ def plot_correlation_matrix(df):
     st.write(corr_matrix)
 
     # Generate Inference
-    inference_result = generate_inference(corr_matrix.to_dict(), "Correlation Matrix Analysis")  # Pass analysis type
-    st.write(f"Inference: {inference_result}")
+    return [request_inference(result.matrix, "Correlation Matrix Analysis")]  # Pass analysis type
 
 
-def plot_sales_by_account_type(df):
+def plot_correlation_matrix(df):
     """
-    Plot the distribution of sales by account type.
+    Plot a correlation matrix for all variables in the dataset, including categorical ones.
     """
-    df = df.copy()
-    df.columns = df.columns.str.strip().str.lower()
+    result = compute_correlation_matrix(df)
+    run_inferences(render_correlation_matrix(result))
+    return result.matrix
 
-    if 'acctype' not in df.columns or 'sales' not in df.columns:
-        st.warning("Columns 'acctype' and 'sales' are required for this plot.")
-        return
 
+def compute_sales_by_account_type(df):
+    """
+    Compute the distribution of sales by account type, clipped to the 1st-99th percentile.
+    """
+    columns = df.columns.str.strip().str.lower()
+    if 'acctype' not in columns or 'sales' not in columns:
+        raise ValueError("Columns 'acctype' and 'sales' are required for this plot.")
+
+    df = df.set_axis(columns, axis=1)[['acctype', 'sales']].copy()
     df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
     df = df.dropna(subset=['acctype', 'sales'])
 
     df['sales'] = df['sales'].clip(lower=df['sales'].quantile(0.01), upper=df['sales'].quantile(0.99))
 
+    # Summary statistics of sales
+    sales_by_acctype = df.groupby('acctype', observed=True)['sales'].describe()
+    return AccountTypeSalesResult(df, sales_by_acctype)
+
+
+def render_sales_by_account_type(result):
+    """
+    Plot the distribution of sales by account type.
+    """
     plt.figure(figsize=(8, 6))
-    sns.boxplot(x='acctype', y='sales', data=df)
+    sns.boxplot(x='acctype', y='sales', data=result.data)
     plt.yscale('log')
     plt.title("Sales Distribution by Account Type (Log Scale)")
     plt.xticks(rotation=45)
@@ -138,22 +202,55 @@ def plot_sales_by_account_type(df):
     st.pyplot(plt)
 
     # Generate Inference
-    sales_summary = df.groupby('acctype')['sales'].describe().to_dict()  # Summary statistics of sales
-    inference_result = generate_inference(sales_summary, "Sales by Account Type Analysis")  # Add analysis type
-    st.write(f"Inference: {inference_result}")
+    return [request_inference(result.sales_by_acctype, "Sales by Account Type Analysis")]  # Add analysis type
 
 
-def plot_sales_trend(df):
+def plot_sales_by_account_type(df):
     """
-    Plot the monthly sales trend over time with competitor entries.
+    Plot the distribution of sales by account type.
     """
-    df = df.copy()
-    df.columns = df.columns.str.strip().str.lower()
-
-    if 'month' not in df.columns or 'sales' not in df.columns:
-        st.warning("Columns 'month' and 'sales' are required for this plot.")
+    try:
+        result = compute_sales_by_account_type(df)
+    except ValueError as e:
+        st.warning(str(e))
         return
+    run_inferences(render_sales_by_account_type(result))
+    return result.summary()
+
+
+def _entries_within(entry_dates, months):
+    """
+    The competitor entry months ('YYYY-MM') that fall within the range of the trend's months.
+    """
+    if months.empty:
+        return []
+    first, last = months.min().to_period('M'), months.max().to_period('M')
+    return [date for date in entry_dates if first <= pd.Period(date, 'M') <= last]
+
 
+def compute_sales_trend(df, cube=None, entry_dates=None):
+    """
+    Compute the monthly sales trend over time.
+    With a rollup_cube.RollupCube of the same data, the totals are read from the cube.
+    entry_dates are the competitor entry months to mark (see event_study.entry_months); they
+    are detected from the rows of df when not given, which is what the cube saves, so callers
+    with a cube should pass them in (e.g. computed once per dataset).
+    """
+    columns = df.columns.str.strip().str.lower()
+    if 'month' not in columns or 'sales' not in columns:
+        raise ValueError("Columns 'month' and 'sales' are required for this plot.")
+
+    # Months in which competitors entered the most accounts
+    if entry_dates is None:
+        entry_dates = entry_months(df)
+
+    if cube is not None:
+        totals = cube.rollup(['month'])
+        totals = totals[totals['sales_count'] > 0]
+        df_grouped = totals['sales_sum'].rename('sales').reset_index()
+        return SalesTrendResult(df_grouped, _entries_within(entry_dates, df_grouped['month']))
+
+    df = df.set_axis(columns, axis=1)[['month', 'sales']].copy()
     df['month'] = pd.to_datetime(df['month'], errors='coerce')
     df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
 
@@ -163,7 +260,14 @@ def plot_sales_trend(df):
 
     df_grouped = df_grouped.sort_values('month')
 
-    competitor_entry_dates = ['2014-06', '2015-01']
+    return SalesTrendResult(df_grouped, _entries_within(entry_dates, df_grouped['month']))
+
+
+def render_sales_trend(result):
+    """
+    Plot the monthly sales trend over time with competitor entries.
+    """
+    df_grouped = result.monthly_sales
 
     plt.figure(figsize=(10, 6))
     plt.plot(df_grouped['month'], df_grouped['sales'], marker='o', linestyle='-', label='Total Sales in SGD')
@@ -172,7 +276,7 @@ def plot_sales_trend(df):
     plt.ylabel("Total Sales in SGD")
     plt.xticks(rotation=45)
 
-    for date in competitor_entry_dates:
+    for date in result.competitor_entry_dates:
         plt.axvline(pd.to_datetime(date), color='red', linestyle='--', label=f'Competitor Entry {date}')
 
     plt.legend()
@@ -181,6 +285,17 @@ def plot_sales_trend(df):
     st.pyplot(plt)
 
     # Generate Inference
-    sales_trend_summary = df_grouped.to_dict()  # Pass the sales trend data summary
-    inference_result = generate_inference(sales_trend_summary, "Sales Trend Analysis")  # Add analysis type
-    st.write(f"Inference: {inference_result}")
+    return [request_inference(result.monthly_sales, "Sales Trend Analysis")]  # Add analysis type
+
+
+def plot_sales_trend(df):
+    """
+    Plot the monthly sales trend over time with competitor entries.
+    """
+    try:
+        result = compute_sales_trend(df)
+    except ValueError as e:
+        st.warning(str(e))
+        return
+    run_inferences(render_sales_trend(result))
+    return result.summary()
@@ -0,0 +1,264 @@
+# event_study.py
+
+from dataclasses import dataclass
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import streamlit as st
+from scipy import stats
+
+from fixed_effects import fit_fixed_effects
+from inference import request_inference, run_inferences
+
+# Months relative to a competitor entry that get their own effect; months before the first and
+# after the last are binned into the end points
+EVENT_WINDOW = (-6, 12)
+
+# The month before entry is the baseline all effects are measured against
+REFERENCE_PERIOD = -1
+
+# Confidence level of the effect intervals
+CONFIDENCE_LEVEL = 0.95
+
+# Number of months with the most entries marked on the sales trend
+ENTRY_MARKERS = 2
+
+
+@dataclass
+class EventStudyResult:
+    events: pd.DataFrame  # One row per account with an entry: 'accid', 'month', 'compbrand' before and after
+    profile: pd.DataFrame  # Per relative month: entered accounts observed and their mean sales
+    effects: pd.DataFrame  # Per relative month: estimate, std err, lower, upper (0 at the reference)
+    averages: pd.DataFrame  # 'pre' and 'post' average effects: estimate, std err, lower, upper
+    n_accounts: int  # Accounts in the regression
+    nobs: int
+    n_always_exposed: int = 0  # Accounts left out because competitors were present from their first month
+
+    def entry_months(self):
+        """
+        Number of accounts with a competitor entry in each month.
+        """
+        return self.events.groupby('month').size().rename('entries')
+
+    def summary(self):
+        summary = {
+            "Accounts": self.n_accounts,
+            "Accounts With Competitor Entry": len(self.events),
+            "Accounts Exposed From Their First Month (Excluded)": self.n_always_exposed,
+        }
+        for period in self.averages.index:
+            row = self.averages.loc[period]
+            summary[f"Average {period.capitalize()}-Entry Effect on Sales"] = row['estimate']
+            summary[f"Average {period.capitalize()}-Entry Effect {CONFIDENCE_LEVEL:.0%} CI"] = (row['lower'], row['upper'])
+        return summary
+
+
+def account_months(df):
+    """
+    One row per account and month, sorted by account and month, with total sales and the
+    (largest) number of competitor brands. Months are numbered consecutively (year * 12 + month).
+    Returns (account codes, month numbers, compbrand, sales, account ids).
+    """
+    columns = df.columns.str.strip().str.lower()
+    missing = [col for col in ('accid', 'month', 'compbrand', 'sales') if col not in columns]
+    if missing:
+        raise ValueError(f"Missing columns for the event study: {', '.join(missing)}")
+    data = df.set_axis(columns, axis=1)[['accid', 'month', 'compbrand', 'sales']].copy()
+    month = pd.to_datetime(data['month'], errors='coerce')
+    data['month'] = month.dt.year * 12 + month.dt.month - 1
+    data['compbrand'] = pd.to_numeric(data['compbrand'], errors='coerce')
+    data['sales'] = pd.to_numeric(data['sales'], errors='coerce')
+    data = data.dropna(subset=['accid', 'month'])
+    if data.empty:
+        raise ValueError("No data available after processing. Please check your account and date columns.")
+
+    panel = data.groupby(['accid', 'month'], observed=True, sort=True).agg(
+        compbrand=('compbrand', 'max'), sales=('sales', 'sum'),
+    )
+    accounts = panel.index.get_level_values('accid')
+    codes, ids = pd.factorize(accounts, sort=False)
+    return (codes.astype(np.int64), panel.index.get_level_values('month').to_numpy(dtype=np.int64),
+            panel['compbrand'].to_numpy(dtype=float), panel['sales'].to_numpy(dtype=float), ids)
+
+
+def detect_entries(account, month, compbrand, n_accounts):
+    """
+    Month of each account's first competitor entry: the first month in which its number of
+    competitor brands rose over its previous month on record. Accounts that already have
+    competitors in their first month on record were exposed before the data starts, so they
+    have no entry month and are flagged instead. Rows must be sorted by account and month.
+    Returns (entry month per account, -1 where there is none; row of each entry; whether each
+    account was exposed from its first month).
+    """
+    starts = np.ones(len(account), dtype=bool)
+    starts[1:] = account[1:] != account[:-1]
+    always_exposed = np.zeros(n_accounts, dtype=bool)
+    always_exposed[account[starts]] = compbrand[starts] > 0
+
+    rises = ~starts & (compbrand > np.roll(compbrand, 1)) & ~always_exposed[account]
+    rows = np.flatnonzero(rises)
+
+    # Rows are sorted by account, so the first rise of each account comes first
+    entered, first = np.unique(account[rows], return_index=True)
+    entry_rows = rows[first]
+    entry_month = np.full(n_accounts, -1, dtype=np.int64)
+    entry_month[entered] = month[entry_rows]
+    return entry_month, entry_rows, always_exposed
+
+
+def _month_timestamps(numbers):
+    numbers = np.asarray(numbers, dtype=np.int64)
+    return pd.to_datetime(pd.DataFrame({'year': numbers // 12, 'month': numbers % 12 + 1, 'day': 1}))
+
+
+def compute_event_study(df, window=EVENT_WINDOW, confidence=CONFIDENCE_LEVEL):
+    """
+    Event study of competitor entry on sales.
+
+    Entries are detected per account from rises in 'compbrand' (see detect_entries), and every
+    account-month is aligned to its months relative to the account's entry in one pass over the
+    rows sorted by account and month. The effect of each relative month (against the month before
+    entry) comes from a regression of sales on relative-month indicators with account and month
+    fixed effects, accounts without an entry serving as controls, and standard errors clustered
+    by account. Pre- and post-entry averages are taken over the relative months inside the window.
+    Accounts exposed to competitors from their first month are left out: they are treated for
+    the whole sample and would otherwise pass for never-treated controls.
+
+    Entries are staggered, so this two-way fixed-effects design also compares later entrants with
+    accounts that entered earlier. When the effect of an entry differs between entry cohorts or
+    keeps changing with time since entry, the relative-month estimates can mix in effects of other
+    months and should be read with that caveat.
+    """
+    account, month, compbrand, sales, ids = account_months(df)
+    entry_month, entry_rows, always_exposed = detect_entries(account, month, compbrand, len(ids))
+    entered = np.flatnonzero(entry_month >= 0)
+
+    events = pd.DataFrame({
+        'accid': ids[entered],
+        'month': _month_timestamps(entry_month[entered]).to_numpy(),
+        'compbrand before': compbrand[entry_rows - 1],
+        'compbrand after': compbrand[entry_rows],
+    })
+    if events.empty:
+        raise ValueError("No competitor entries (rises in 'compbrand') were found in the data.")
+
+    # Leave out the accounts exposed from their first month
+    kept = ~always_exposed[account]
+    account, month, sales = account[kept], month[kept], sales[kept]
+
+    # Months relative to entry for the rows of accounts with an entry, binned at the window ends
+    treated = entry_month[account] >= 0
+    relative = np.where(treated, month - entry_month[account], 0)
+    first, last = window
+    binned = np.clip(relative, first, last)
+
+    # Raw sales profile of entered accounts around their entry
+    inside = treated & (relative >= first) & (relative <= last) & ~np.isnan(sales)
+    positions = relative[inside] - first
+    counts = np.bincount(positions, minlength=last - first + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_sales = np.bincount(positions, weights=sales[inside], minlength=last - first + 1) / counts
+    periods = np.arange(first, last + 1)
+    profile = pd.DataFrame({'accounts': counts, 'mean sales': mean_sales}, index=pd.Index(periods, name='relative month'))
+
+    # Regression on relative-month indicators with account and month fixed effects
+    estimated = [period for period in periods if period != REFERENCE_PERIOD]
+    names = [f'event_{period}' for period in estimated]
+    frame = pd.DataFrame({'accid': account, 'month': month, 'sales': sales})
+    for period, name in zip(estimated, names):
+        frame[name] = (treated & (binned == period)).astype(np.uint8)
+    fit = fit_fixed_effects(frame, 'sales', names, absorb=('accid', 'month'), cluster='accid')
+    if fit.errors:
+        raise ValueError(next(iter(fit.errors.values())))
+
+    critical = stats.t.ppf(1 - (1 - confidence) / 2, fit.df_resid.iloc[0])
+    params = fit.params.iloc[0].to_numpy()
+    cov = fit.cov_params[0]
+    bse = np.sqrt(np.diagonal(cov))
+    effects = pd.DataFrame({
+        'estimate': params, 'std err': bse, 'lower': params - critical * bse, 'upper': params + critical * bse,
+    }, index=pd.Index(estimated, name='relative month'))
+    effects.loc[REFERENCE_PERIOD] = 0.0
+    effects = effects.sort_index()
+
+    # Averages over the relative months strictly inside the window (the end points are binned)
+    rows = []
+    for label, selected in (('pre', lambda period: first < period < REFERENCE_PERIOD),
+                            ('post', lambda period: 0 <= period < last)):
+        weights = np.array([1.0 if selected(period) else 0.0 for period in estimated])
+        if not weights.any():
+            continue
+        weights /= weights.sum()
+        estimate = weights @ params
+        error = np.sqrt(weights @ cov @ weights)
+        rows.append({'period': label, 'estimate': estimate, 'std err': error,
+                     'lower': estimate - critical * error, 'upper': estimate + critical * error})
+    averages = pd.DataFrame(rows).set_index('period')
+
+    return EventStudyResult(events, profile, effects, averages, int((~always_exposed).sum()), int(fit.nobs.iloc[0]),
+                            int(always_exposed.sum()))
+
+
+def entry_months(df, top=ENTRY_MARKERS):
+    """
+    The months (as 'YYYY-MM') with the most competitor entries across accounts, in date order.
+    Empty when the data has no account or competitor brand information.
+    """
+    try:
+        account, month, compbrand, _, ids = account_months(df)
+    except ValueError:
+        return []
+    entry_month, _, _ = detect_entries(account, month, compbrand, len(ids))
+    months, counts = np.unique(entry_month[entry_month >= 0], return_counts=True)
+    busiest = np.sort(months[np.argsort(-counts, kind='stable')[:top]])
+    return [timestamp.strftime('%Y-%m') for timestamp in _month_timestamps(busiest)]
+
+
+def render_event_study(result):
+    """
+    Plot the effect of competitor entry on sales by month relative to entry, with confidence bands.
+    """
+    st.header("Competitor Entry Event Study")
+    st.write(f"{len(result.events):,} of {result.n_accounts:,} accounts saw a competitor enter "
+             f"({result.nobs:,} account-months in the regression).")
+    if result.n_always_exposed:
+        st.write(f"{result.n_always_exposed:,} accounts already had competitors in their first month on record "
+                 f"and are left out, as their entry is not observed.")
+    st.caption("Entries are staggered over time, so later entrants are partly compared with accounts that entered "
+               "earlier. If the effect of an entry differs between entry dates or keeps changing over time, "
+               "these two-way fixed-effects estimates can be biased.")
+
+    effects = result.effects
+    first, last = effects.index.min(), effects.index.max()
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.fill_between(effects.index, effects['lower'], effects['upper'], color='b', alpha=0.2,
+                    label=f'{CONFIDENCE_LEVEL:.0%} confidence band')
+    ax.plot(effects.index, effects['estimate'], color='b', marker='o', label='Effect on sales')
+    ax.axhline(0, color='black', linewidth=1)
+    ax.axvline(-0.5, color='red', linestyle='--', label='Competitor entry')
+    ax.set_xlabel(f'Months relative to entry (end points include months before {first} / after {last})')
+    ax.set_ylabel('Effect on sales (SGD)')
+    ax.set_title('Sales Around Competitor Entry, Relative to the Month Before Entry')
+    ax.legend(loc='best')
+    ax.grid(True)
+    fig.tight_layout()
+    st.pyplot(fig)
+    plt.close(fig)
+
+    st.subheader(f"Average Effects ({CONFIDENCE_LEVEL:.0%} Confidence Intervals)")
+    st.dataframe(result.averages)
+
+    st.subheader("Entries per Month")
+    st.bar_chart(result.entry_months())
+
+    return [request_inference(result.summary(), "Competitor Entry Event Study")]
+
+
+def analyze_competitor_entry(df):
+    """
+    Run the competitor entry event study.
+    """
+    result = compute_event_study(df)
+    run_inferences(render_event_study(result))
+    return result.summary()
@@ -0,0 +1,100 @@
+# filter_index.py
+
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from account_clustering import CLUSTER_COLUMN
+
+# Columns the sidebar filters work on (the behavioural cluster once accounts have been clustered)
+FILTER_COLUMNS = ['district', 'acctype', 'month', 'compbrand', CLUSTER_COLUMN]
+
+
+@dataclass
+class FilterIndex:
+    n_rows: int
+    bitmaps: dict  # Column -> {value: packed bitmap of the rows holding that value (np.packbits)}
+
+    def values(self, column):
+        """
+        The distinct values of a filter column, sorted.
+        """
+        return sorted(self.bitmaps.get(column, {}))
+
+    def mask(self, filters):
+        """
+        Boolean row mask of a filter selection: {column: allowed values}. Within a column the
+        value bitmaps are OR'ed, across columns AND'ed; the frame itself is not scanned.
+        Returns None when nothing is filtered.
+        """
+        selection = None
+        for column, allowed in filters.items():
+            bitmaps = self.bitmaps[column]
+            packed = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            for value in allowed:
+                if value in bitmaps:
+                    packed |= bitmaps[value]
+            selection = packed if selection is None else selection & packed
+        if selection is None:
+            return None
+        return np.unpackbits(selection, count=self.n_rows).astype(bool)
+
+    def select(self, df, filters):
+        """
+        The rows of df (the frame the index was built from) that pass the filters.
+        """
+        mask = self.mask(filters)
+        return df if mask is None else df.iloc[np.flatnonzero(mask)]
+
+
+def build_filter_index(df, columns=FILTER_COLUMNS):
+    """
+    Packed bitmaps of the rows holding each value of the filter columns present in df.
+    Built once after cleaning, from one grouping per column.
+    """
+    data = df.set_axis(df.columns.str.strip().str.lower(), axis=1)
+    bitmaps = {}
+    for column in columns:
+        if column not in data.columns:
+            continue
+        bitmaps[column] = {}
+        for value, rows in data.groupby(column, observed=True).indices.items():
+            bits = np.zeros(len(data), dtype=bool)
+            bits[rows] = True
+            bitmaps[column][value] = np.packbits(bits)
+    return FilterIndex(len(data), bitmaps)
+
+
+def normalize_filters(filters):
+    """
+    Drop empty selections and fix the order of columns and values, so equal selections compare
+    (and fingerprint) equal.
+    """
+    return {
+        column: tuple(sorted(filters[column]))
+        for column in sorted(filters)
+        if filters[column] is not None and len(filters[column])
+    }
+
+
+def filtered_fingerprint(fingerprint, filters):
+    """
+    Fingerprint of the filtered view of a dataset, derived from the dataset's fingerprint and the
+    filter selection so the filtered rows never have to be hashed.
+    """
+    if not filters:
+        return fingerprint
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(fingerprint.encode())
+    digest.update(repr(sorted((column, [str(value) for value in values]) for column, values in filters.items())).encode())
+    return digest.hexdigest()
+
+
+def month_range(months, start, end):
+    """
+    The months of an index that fall within [start, end].
+    """
+    months = pd.DatetimeIndex(months)
+    return list(months[(months >= start) & (months <= end)])
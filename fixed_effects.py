@@ -0,0 +1,138 @@
+# fixed_effects.py
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from batched_ols import GroupedFit, grouped_cross_products, solve_normal_equations
+
+# Fixed effects that can be absorbed: label -> columns
+FIXED_EFFECTS = {
+    'None': (),
+    'Account': ('accid',),
+    'Account and month': ('accid', 'month'),
+}
+
+# Standard errors are clustered by account
+CLUSTER_COLUMN = 'accid'
+
+# Alternating projections stop when no value moves by more than this (relative to its scale)
+DEMEAN_TOLERANCE = 1e-10
+DEMEAN_MAX_ITERATIONS = 1000
+
+
+def _group_codes(data, columns):
+    """
+    Integer code (0..n-1) of each row's combination of values in columns, and the group sizes.
+    """
+    codes = data.groupby(list(columns), observed=True, sort=False).ngroup().to_numpy()
+    return codes, np.bincount(codes)
+
+
+def demean(values, effects, tolerance=DEMEAN_TOLERANCE, max_iterations=DEMEAN_MAX_ITERATIONS):
+    """
+    Subtract the fixed effects from every column of values (rows x columns).
+
+    effects is a list of (codes, counts), one per effect. A single effect is removed exactly by
+    subtracting group means; several are removed by alternating projections, sweeping over the
+    effects until the values stop changing. Each sweep is a few grouped sums over the rows.
+    """
+    values = np.array(values, dtype=float)
+    scale = np.maximum(np.abs(values).max(axis=0), 1.0)
+
+    for _ in range(max_iterations if len(effects) > 1 else 1):
+        change = 0.0
+        for codes, counts in effects:
+            means = np.column_stack([
+                np.bincount(codes, weights=values[:, i], minlength=len(counts)) for i in range(values.shape[1])
+            ]) / counts[:, None]
+            values -= means[codes]
+            change = max(change, (np.abs(means).max(axis=0) / scale).max())
+        if change < tolerance:
+            break
+    return values
+
+
+def fit_fixed_effects(df, response, regressors, absorb, cluster=CLUSTER_COLUMN, by=(), formula=None):
+    """
+    Fit response ~ regressors with the fixed effects in absorb (e.g. account and month), separately
+    for every combination of the columns in by, or once on all rows when by is empty.
+
+    The effects are removed by demeaning within groups (see demean), so no dummy columns are built:
+    time and memory grow with the number of rows, not the number of accounts. Standard errors are
+    clustered by the cluster column with the G/(G-1) * (N-1)/(N-K) small-sample correction, where
+    K counts the regressors but not the absorbed effects (which are nested in the clusters for
+    account effects), and t-tests use G-1 degrees of freedom, G being the number of clusters.
+    Returns a batched_ols.GroupedFit without a constant, whose rsquared is the within R².
+    """
+    regressors, absorb, by = list(regressors), list(absorb), list(by)
+    if not absorb:
+        raise ValueError("At least one fixed effect must be absorbed.")
+
+    data = df[list(dict.fromkeys(by + absorb + [cluster] + [response] + regressors))].copy()
+    for col in [response] + regressors:
+        data[col] = pd.to_numeric(data[col], errors='coerce')
+    data = data.dropna()
+    if data.empty:
+        raise ValueError("No complete rows to fit the fixed-effects regression.")
+
+    # Segments, and the groups of every effect and of the clusters within each segment
+    if by:
+        grouped = data.groupby(by, observed=True, sort=True)
+        segment_codes = grouped.ngroup().to_numpy()
+        keys = grouped.size().index
+    else:
+        segment_codes = np.zeros(len(data), dtype=np.int64)
+        keys = pd.Index(['All'])
+    n_segments = len(keys)
+    effects = [_group_codes(data, by + [effect]) for effect in absorb]
+    cluster_codes, _ = _group_codes(data, by + [cluster])
+
+    within = demean(data[[response] + regressors].to_numpy(dtype=float), effects)
+    y, X = within[:, 0], within[:, 1:]
+
+    xtx, xty, yty, counts = grouped_cross_products(segment_codes, X, y, n_segments)
+    params, xtx_inv, rank = solve_normal_equations(xtx, xty)
+    residuals = y - np.einsum('ni,ni->n', X, params[segment_codes])
+    rss = np.bincount(segment_codes, weights=residuals ** 2, minlength=n_segments)
+
+    # Cluster-robust covariance: X'X^-1 (sum over clusters of score outer products) X'X^-1
+    scores = np.column_stack([
+        np.bincount(cluster_codes, weights=X[:, i] * residuals) for i in range(len(regressors))
+    ])
+    cluster_segment = np.zeros(len(scores), dtype=np.int64)
+    cluster_segment[cluster_codes] = segment_codes
+    meat = np.zeros(xtx.shape)
+    np.add.at(meat, cluster_segment, np.einsum('ci,cj->cij', scores, scores))
+    n_clusters = np.bincount(cluster_segment, minlength=n_segments)
+
+    fitted = (n_clusters > 1) & (counts > rank)
+    df_resid = n_clusters - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correction = np.where(fitted, n_clusters / df_resid * (counts - 1) / (counts - rank), np.nan)
+        cov = np.einsum('gij,gjk,gkl->gil', xtx_inv, meat, xtx_inv) * correction[:, None, None]
+        bse = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        tvalues = params / bse
+        pvalues = 2 * stats.t.sf(np.abs(tvalues), np.where(fitted, df_resid, np.nan)[:, None])
+        rsquared = 1 - rss / yty
+
+    def frame(values):
+        return pd.DataFrame(values, index=keys, columns=regressors)
+
+    return GroupedFit(
+        formula=formula or f"{response} ~ {' + '.join(regressors)}",
+        by=tuple(by),
+        params=frame(params),
+        bse=frame(bse),
+        tvalues=frame(tvalues),
+        pvalues=frame(pvalues),
+        rsquared=pd.Series(rsquared, index=keys),
+        nobs=pd.Series(counts, index=keys),
+        df_resid=pd.Series(df_resid, index=keys),
+        errors={
+            keys[g]: f"Not enough '{cluster}' clusters ({n_clusters[g]}) or observations ({counts[g]}) "
+                     f"for clustered standard errors."
+            for g in np.flatnonzero(~fitted)
+        },
+        cov_params=cov,
+    )
@@ -2,7 +2,40 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
 import numpy as np
-from inference import generate_inference  # Import the inference function
+from dataclasses import dataclass
+from inference import request_inference, run_inferences  # Import the inference functions
+
+@dataclass
+class BudgetForecastResult:
+    strategies: list
+    expected_sales_with_strategy3: list
+    expected_sales_without_strategy3: list
+    expenditure_with_strategy3: list
+    expenditure_without_strategy3: list
+
+    def summary(self):
+        return {
+            "Expected Sales with Strategy 3": f"SGD {sum(self.expected_sales_with_strategy3):,.2f}",
+            "Expected Sales without Strategy 3": f"SGD {sum(self.expected_sales_without_strategy3):,.2f}",
+            "Total Expenditure with Strategy 3": f"SGD {sum(self.expenditure_with_strategy3):,.2f}",
+            "Total Expenditure without Strategy 3": f"SGD {sum(self.expenditure_without_strategy3):,.2f}"
+        }
+
+
+@dataclass
+class WeightedBudgetResult:
+    strategies: list
+    recommended_budgets: list
+    expected_sales: list
+
+    def summary(self):
+        summary = {}
+        for i, budget in enumerate(self.recommended_budgets, 1):
+            summary[f"Recommended Budget Strategy {i}"] = f"SGD {budget:,.2f}"
+        for i, sales in enumerate(self.expected_sales, 1):
+            summary[f"Expected Sales Strategy {i}"] = f"SGD {sales:,.2f}"
+        return summary
+
 
 # Helper function to calculate expected sales and efficiency
 def calculate_expected_sales_and_budget(total_sales, spending, future_budget):
@@ -13,10 +46,9 @@ def calculate_expected_sales_and_budget(total_sales, spending, future_budget):
     expected_sales = efficiency * future_budget
     return expected_sales, efficiency
 
-def future_budget_forecasting():
+def compute_future_budget_forecast():
     """
-    Simulate two future budget allocation scenarios, compare expected sales and expenditures,
-    and generate visualizations to compare both scenarios using line graphs in SGD.
+    Simulate two future budget allocation scenarios and compare expected sales and expenditures (in SGD).
     """
 
     # Example spending and sales based on previous analysis (in SGD)
@@ -41,8 +73,6 @@ def future_budget_forecasting():
     expected_sales_strategy3_with_3, efficiency_strategy3 = calculate_expected_sales_and_budget(
         total_sales_strategy3, spending_strategy3, future_budget_strategy3)
 
-    total_expenditure_with_strategy3 = future_budget_strategy1 + future_budget_strategy2 + future_budget_strategy3
-
     # Scenario 2: Strategy 3 excluded, with its budget reallocated to Strategies 1 and 2
     reallocated_budget_strategy1 = future_budget_strategy1 + future_budget_strategy3 / 2
     reallocated_budget_strategy2 = future_budget_strategy2 + future_budget_strategy3 / 2
@@ -50,8 +80,6 @@ def future_budget_forecasting():
     expected_sales_strategy1_without_3 = efficiency_strategy1 * reallocated_budget_strategy1
     expected_sales_strategy2_without_3 = efficiency_strategy2 * reallocated_budget_strategy2
 
-    total_expenditure_without_strategy3 = reallocated_budget_strategy1 + reallocated_budget_strategy2
-
     # Create data for line graphs
     strategies = ['Strategy 1', 'Strategy 2', 'Strategy 3']
 
@@ -65,6 +93,31 @@ def future_budget_forecasting():
                                         expected_sales_strategy2_without_3,
                                         0]  # No Strategy 3
 
+    # Expenditure for Scenario 1 (with Strategy 3)
+    expenditure_with_strategy3 = [future_budget_strategy1, future_budget_strategy2, future_budget_strategy3]
+
+    # Expenditure for Scenario 2 (without Strategy 3)
+    expenditure_without_strategy3 = [reallocated_budget_strategy1, reallocated_budget_strategy2, 0]
+
+    return BudgetForecastResult(
+        strategies=strategies,
+        expected_sales_with_strategy3=expected_sales_with_strategy3,
+        expected_sales_without_strategy3=expected_sales_without_strategy3,
+        expenditure_with_strategy3=expenditure_with_strategy3,
+        expenditure_without_strategy3=expenditure_without_strategy3,
+    )
+
+
+def render_future_budget_forecast(result):
+    """
+    Generate visualizations to compare both budget scenarios using line graphs in SGD.
+    """
+    strategies = result.strategies
+    expected_sales_with_strategy3 = result.expected_sales_with_strategy3
+    expected_sales_without_strategy3 = result.expected_sales_without_strategy3
+    expenditure_with_strategy3 = result.expenditure_with_strategy3
+    expenditure_without_strategy3 = result.expenditure_without_strategy3
+
     # Line graph: Expected Sales per Strategy
     plt.figure(figsize=(12, 6))
     plt.plot(strategies, expected_sales_with_strategy3, marker='o', label='With Strategy 3', color='blue')
@@ -75,12 +128,6 @@ def future_budget_forecasting():
     plt.grid(True)
     st.pyplot(plt)
 
-    # Expenditure for Scenario 1 (with Strategy 3)
-    expenditure_with_strategy3 = [future_budget_strategy1, future_budget_strategy2, future_budget_strategy3]
-
-    # Expenditure for Scenario 2 (without Strategy 3)
-    expenditure_without_strategy3 = [reallocated_budget_strategy1, reallocated_budget_strategy2, 0]
-
     # Line graph: Expenditures per Strategy
     plt.figure(figsize=(12, 6))
     plt.plot(strategies, expenditure_with_strategy3, marker='o', label='With Strategy 3', color='blue')
@@ -111,26 +158,28 @@ def future_budget_forecasting():
 
     # Displaying total sales and expenditures
     st.write(f"**Total Expected Sales with Strategy 3: SGD {sum(expected_sales_with_strategy3):,.2f}**")
-    st.write(f"**Total Expenditure with Strategy 3: SGD {total_expenditure_with_strategy3:,.2f}**")
+    st.write(f"**Total Expenditure with Strategy 3: SGD {sum(expenditure_with_strategy3):,.2f}**")
     st.write(f"**Total Expected Sales without Strategy 3: SGD {sum(expected_sales_without_strategy3):,.2f}**")
-    st.write(f"**Total Expenditure without Strategy 3: SGD {total_expenditure_without_strategy3:,.2f}**")
-
-    # Generate inference using the sales and expenditure data
-    forecast_summary = {
-        "Expected Sales with Strategy 3": f"SGD {sum(expected_sales_with_strategy3):,.2f}",
-        "Expected Sales without Strategy 3": f"SGD {sum(expected_sales_without_strategy3):,.2f}",
-        "Total Expenditure with Strategy 3": f"SGD {total_expenditure_with_strategy3:,.2f}",
-        "Total Expenditure without Strategy 3": f"SGD {total_expenditure_without_strategy3:,.2f}"
-    }
+    st.write(f"**Total Expenditure without Strategy 3: SGD {sum(expenditure_without_strategy3):,.2f}**")
 
-    try:
-        inference_result = generate_inference(forecast_summary, "Future Budget Forecasting")
-        st.write(f"Inference: {inference_result}")
-    except Exception as e:
-        st.error(f"Error generating inference: {e}")
+    # Request an inference for the sales and expenditure data
+    return [request_inference(result.summary(), "Future Budget Forecasting")]
 
 
-def plot_weighted_budget_allocation():
+def future_budget_forecasting():
+    """
+    Simulate two future budget allocation scenarios, compare expected sales and expenditures,
+    and generate visualizations to compare both scenarios using line graphs in SGD.
+    """
+    result = compute_future_budget_forecast()
+    run_inferences(render_future_budget_forecast(result))
+    return result.summary()
+
+
+def compute_weighted_budget_allocation():
+    """
+    Allocate the future budget across strategies, weighted by efficiency and historical sales.
+    """
     total_sales_strategy1 = 712_806_328.76
     total_sales_strategy2 = 3_667_628_376.09
     total_sales_strategy3 = 50_496_439.04
@@ -159,6 +208,17 @@ def plot_weighted_budget_allocation():
     recommended_budgets = [recommended_budget_strategy1, recommended_budget_strategy2, recommended_budget_strategy3]
     expected_sales = [expected_sales_strategy1, expected_sales_strategy2, expected_sales_strategy3]
 
+    return WeightedBudgetResult(strategies, recommended_budgets, expected_sales)
+
+
+def render_weighted_budget_allocation(result):
+    """
+    Plot the weighted budget allocation and the sales expected from it.
+    """
+    strategies = result.strategies
+    recommended_budgets = result.recommended_budgets
+    expected_sales = result.expected_sales
+
     plt.figure(figsize=(12, 6))
     plt.plot(strategies, recommended_budgets, marker='o', color='green', label='Weighted Budget')
     plt.title('Weighted Budget Allocation by Strategy [SGD]')
@@ -175,18 +235,11 @@ def plot_weighted_budget_allocation():
     plt.legend()
     st.pyplot(plt)
 
-    # Generating inference for weighted budget allocation
-    budget_summary = {
-        "Recommended Budget Strategy 1": f"SGD {recommended_budget_strategy1:,.2f}",
-        "Recommended Budget Strategy 2": f"SGD {recommended_budget_strategy2:,.2f}",
-        "Recommended Budget Strategy 3": f"SGD {recommended_budget_strategy3:,.2f}",
-        "Expected Sales Strategy 1": f"SGD {expected_sales_strategy1:,.2f}",
-        "Expected Sales Strategy 2": f"SGD {expected_sales_strategy2:,.2f}",
-        "Expected Sales Strategy 3": f"SGD {expected_sales_strategy3:,.2f}"
-    }
+    # Request an inference for the weighted budget allocation
+    return [request_inference(result.summary(), "Weighted Budget Allocation")]
 
-    try:
-        inference_result = generate_inference(budget_summary, "Weighted Budget Allocation")
-        st.write(f"Inference: {inference_result}")
-    except Exception as e:
-        st.error(f"Error generating inference: {e}")
+
+def plot_weighted_budget_allocation():
+    result = compute_weighted_budget_allocation()
+    run_inferences(render_weighted_budget_allocation(result))
+    return result.summary()
@@ -0,0 +1,235 @@
+# incremental_ols.py
+
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from batched_ols import grouped_cross_products, grouped_fit, ols_statistics, solve_normal_equations
+from model_registry import MODEL_REGISTRY, ModelFit, model_fingerprint, parse_formula
+from snapshot_cache import SNAPSHOT_DIR, clean_changed_rows, watermark_stamp
+
+# Key of the single group when a model is not segmented
+ALL_ROWS = 'All'
+
+
+@dataclass
+class SufficientStats:
+    formula: str
+    by: tuple  # Segment columns (empty for an unsegmented model)
+    keys: list  # Segment keys, one per group (ALL_ROWS when unsegmented)
+    xtx: np.ndarray  # (groups, p, p) X'X, with the constant as first column
+    xty: np.ndarray  # (groups, p) X'y
+    yty: np.ndarray  # (groups,) y'y
+    nobs: np.ndarray  # (groups,) number of rows
+    watermark: str = None  # Snapshot watermark the statistics correspond to
+
+    def update(self, added=None, removed=None):
+        """
+        Return the statistics after adding the rows of added and taking out the rows of removed.
+        Only the changed rows are read, and the result equals sufficient_stats on the new data.
+        """
+        merged = {key: i for i, key in enumerate(self.keys)}
+        keys = list(self.keys)
+        deltas = []
+        for frame, sign in ((added, 1), (removed, -1)):
+            if frame is None or frame.empty:
+                continue
+            delta = sufficient_stats(frame, self.formula, self.by)
+            for key in delta.keys:
+                if key not in merged:
+                    merged[key] = len(keys)
+                    keys.append(key)
+            deltas.append((delta, sign))
+
+        n_groups, p = len(keys), self.xtx.shape[1]
+        xtx, xty = np.zeros((n_groups, p, p)), np.zeros((n_groups, p))
+        yty, nobs = np.zeros(n_groups), np.zeros(n_groups, dtype=np.int64)
+        old = np.arange(len(self.keys))
+        xtx[old], xty[old], yty[old], nobs[old] = self.xtx, self.xty, self.yty, self.nobs
+
+        for delta, sign in deltas:
+            rows = [merged[key] for key in delta.keys]
+            np.add.at(xtx, rows, sign * delta.xtx)
+            np.add.at(xty, rows, sign * delta.xty)
+            np.add.at(yty, rows, sign * delta.yty)
+            np.add.at(nobs, rows, sign * delta.nobs)
+
+        return SufficientStats(self.formula, self.by, keys, xtx, xty, yty, nobs, self.watermark)
+
+    def solve(self):
+        """
+        Fit every segment from the statistics alone. Returns a batched_ols.GroupedFit without rows.
+        """
+        _, regressors = parse_formula(self.formula)
+        keep = np.flatnonzero(self.nobs > 0)
+        xtx, xty, yty, nobs = self.xtx[keep], self.xty[keep], self.yty[keep], self.nobs[keep]
+        keys = [self.keys[i] for i in keep]
+        index = pd.MultiIndex.from_tuples(keys, names=self.by) if len(self.by) > 1 else pd.Index(
+            keys, name=self.by[0] if self.by else None)
+
+        params, xtx_inv, rank = solve_normal_equations(xtx, xty)
+
+        # RSS = y'y - b'X'y at the least squares solution; TSS = y'y - (sum y)^2 / n
+        rss = np.maximum(yty - np.einsum('gi,gi->g', params, xty), 0.0)
+        tss = yty - xty[:, 0] ** 2 / nobs
+        return grouped_fit(self.formula, self.by, index, ['const'] + regressors,
+                           params, xtx_inv, rank, rss, tss, nobs)
+
+    def model_fit(self, key=ALL_ROWS):
+        """
+        The fit of one group as a model_registry.ModelFit (without the statsmodels summary text).
+        """
+        _, regressors = parse_formula(self.formula)
+        names = ['const'] + regressors
+        g = self.keys.index(key)
+        xtx, xty, yty, nobs = self.xtx[g:g + 1], self.xty[g:g + 1], self.yty[g:g + 1], self.nobs[g:g + 1]
+
+        params, xtx_inv, rank = solve_normal_equations(xtx, xty)
+        rss = np.maximum(yty - np.einsum('gi,gi->g', params, xty), 0.0)
+        tss = yty - xty[:, 0] ** 2 / nobs
+        bse, tvalues, pvalues, rsquared, df_resid = ols_statistics(params, xtx_inv, rank, rss, tss, nobs)
+        sigma2 = rss[0] / df_resid[0] if df_resid[0] > 0 else np.nan
+
+        return ModelFit(
+            formula=self.formula,
+            segment=None if not self.by else (self.by, key),
+            params=pd.Series(params[0], index=names),
+            cov_params=pd.DataFrame(sigma2 * xtx_inv[0], index=names, columns=names),
+            bse=pd.Series(bse[0], index=names),
+            tvalues=pd.Series(tvalues[0], index=names),
+            pvalues=pd.Series(pvalues[0], index=names),
+            rsquared=rsquared[0],
+            nobs=int(nobs[0]),
+            exog_means=pd.Series(xtx[0, 0, 1:] / nobs[0], index=regressors),
+            summary_text=None,
+        )
+
+
+def _plain_key(key):
+    """
+    A segment key with NumPy scalars turned into Python values, so it survives a JSON round trip.
+    """
+    if isinstance(key, tuple):
+        return tuple(_plain_key(value) for value in key)
+    return key.item() if isinstance(key, np.generic) else key
+
+
+def sufficient_stats(df, formula, by=()):
+    """
+    X'X, X'y, y'y and n per segment for formula on df, with the same row selection as the
+    regressions: numeric response and regressors, no missing values.
+    """
+    response, regressors = parse_formula(formula)
+    by = tuple(by)
+    data = df.set_axis(df.columns.str.strip().str.lower(), axis=1)[list(by) + [response] + regressors].copy()
+    for col in [response] + regressors:
+        data[col] = pd.to_numeric(data[col], errors='coerce')
+    data = data.dropna()
+
+    if by:
+        grouped = data.groupby(list(by), observed=True, sort=True)
+        codes = grouped.ngroup().to_numpy()
+        keys = [_plain_key(key) for key in grouped.size().index]
+    else:
+        codes = np.zeros(len(data), dtype=np.int64)
+        keys = [ALL_ROWS]
+
+    X = np.column_stack([np.ones(len(data))] + [data[col].to_numpy(dtype=float) for col in regressors])
+    y = data[response].to_numpy(dtype=float)
+    xtx, xty, yty, nobs = grouped_cross_products(codes, X, y, len(keys))
+    return SufficientStats(formula, by, keys, xtx, xty, yty, nobs.astype(np.int64))
+
+
+def stats_path(base_id, table_name, formula, by=(), snapshot_dir=SNAPSHOT_DIR):
+    """
+    Where the statistics of a model are stored, next to the table's snapshot.
+    """
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', f"{base_id}__{table_name}__{formula}__{'_'.join(by) or 'all'}")
+    return os.path.join(snapshot_dir, f"{slug}.ols.npz")
+
+
+def save_stats(stats, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    header = {
+        'formula': stats.formula,
+        'by': list(stats.by),
+        'keys': [list(key) if isinstance(key, tuple) else key for key in stats.keys],
+        'watermark': stats.watermark,
+    }
+    # Write to a temporary file first so an interrupted save never leaves torn statistics
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, header=json.dumps(header), xtx=stats.xtx, xty=stats.xty,
+                 yty=stats.yty, nobs=stats.nobs)
+    os.replace(path + '.tmp', path)
+
+
+def load_stats(path):
+    """
+    Load stored statistics, or None if there are none (or they cannot be read).
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as arrays:
+            header = json.loads(str(arrays['header']))
+            keys = [tuple(key) if isinstance(key, list) else key for key in header['keys']]
+            return SufficientStats(header['formula'], tuple(header['by']), keys, arrays['xtx'],
+                                   arrays['xty'], arrays['yty'], arrays['nobs'], header['watermark'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def update_model_stats(sync, clean, df_cleaned, base_id, table_name, models, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Bring the stored statistics of each (formula, by) model in line with a snapshot sync and
+    register the resulting fits, so the regressions do not refit the whole history.
+
+    sync is the snapshot_cache.SyncResult, clean the cleaning function applied to the table and
+    df_cleaned the cleaned merged table. Statistics are updated with only the changed rows when
+    they belong to the previous sync; otherwise (first load, or out of step) they are rebuilt.
+    Returns the number of models that were updated incrementally.
+    """
+    updated = 0
+    for formula, by in models:
+        path = stats_path(base_id, table_name, formula, by, snapshot_dir)
+        stats = None if sync.full_reload else load_stats(path)
+
+        if stats is not None and stats.watermark == watermark_stamp(sync.previous_watermark):
+            stats = stats.update(clean_changed_rows(sync.added, clean, sync.frame.columns),
+                                 clean_changed_rows(sync.removed, clean, sync.frame.columns))
+            # Guard against statistics drifting from the data, e.g. after a snapshot was edited
+            response, regressors = parse_formula(formula)
+            if stats.nobs.sum() != _complete_rows(df_cleaned, [response] + regressors, by):
+                stats = None
+            else:
+                updated += 1
+        else:
+            stats = None
+
+        if stats is None:
+            stats = sufficient_stats(df_cleaned, formula, by)
+        stats.watermark = watermark_stamp(sync.watermark)
+        save_stats(stats, path)
+
+        # Serve the fits from the statistics from now on
+        fingerprint = model_fingerprint(df_cleaned, formula, list(by) or None)
+        if by:
+            MODEL_REGISTRY.store_grouped(fingerprint, formula, by, stats.solve())
+        else:
+            MODEL_REGISTRY.store(fingerprint, formula, stats.model_fit())
+    return updated
+
+
+def _complete_rows(df, numeric_columns, by):
+    """
+    Number of rows the regressions use: numeric columns parse as numbers and nothing is missing.
+    """
+    data = df.set_axis(df.columns.str.strip().str.lower(), axis=1)
+    complete = data[list(by)].notna().all(axis=1)
+    for col in numeric_columns:
+        complete &= pd.to_numeric(data[col], errors='coerce').notna()
+    return int(complete.sum())
@@ -1,13 +1,51 @@
+import os
+import queue
 import openai
 import streamlit as st
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from inference_cache import InferenceCache, inference_cache_key
+from summary_encoder import encode_summary
+
+MODEL = "gpt-3.5-turbo"  # Latest supported model
+SYSTEM_PROMPT = "You are a helpful business advisor."
+MAX_TOKENS = 350  # Reduce tokens to fit everything more concisely
+TEMPERATURE = 0.7  # Adjust for response creativity
+
+# Set INFERENCE_CACHE=0 to always call the API
+INFERENCE_CACHE_ENABLED = os.environ.get('INFERENCE_CACHE', '1') != '0'
+
+# Maximum number of completion requests in flight at once
+INFERENCE_CONCURRENCY = int(os.environ.get('INFERENCE_CONCURRENCY', '4'))
+
+# Set INFERENCE_STREAMING=0 to write each inference only once it is complete
+INFERENCE_STREAMING = os.environ.get('INFERENCE_STREAMING', '1') != '0'
+
+# An inference an analysis wants to show; placeholder is where it goes on the page (or None)
+InferenceRequest = namedtuple('InferenceRequest', ['data_summary', 'analysis_type', 'placeholder'])
+
+_response_cache = None
 
-# Function to generate inferences from OpenAI API with a business-friendly perspective
-def generate_inference(data_summary, analysis_type):
-    openai.api_key = st.secrets["openai"]["api_key"]
+
+def get_inference_cache():
+    """
+    Lazily open the on-disk response cache shared by all sessions.
+    """
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = InferenceCache()
+    return _response_cache
+
+
+def build_prompt(data_summary, analysis_type, token_budget=None):
+    # Encode the summary compactly so the prompt stays small and its cache key stable
+    data_summary = encode_summary(data_summary, token_budget)
 
     # Prepare a business-friendly prompt for the OpenAI API
-    prompt = f"""
-    Here is the data summary for {analysis_type}: {data_summary}. 
+    return f"""
+    Here is the data summary for {analysis_type}:
+    {data_summary}
+
     Please provide key insights in simple business terms, including:
     1. Analysis of the sales trends and performance of each strategy.
     2. Recommendations for how the business can optimize or adjust based on this analysis.
@@ -15,21 +53,192 @@ def generate_inference(data_summary, analysis_type):
     Keep the insights concise and focused.
     """
 
+
+def _openai_client():
+    openai.api_key = st.secrets["openai"]["api_key"]
+    return openai
+
+
+def _chunk_text(chunk):
+    """
+    The text carried by one chunk of a streamed ChatCompletion (may be empty).
+    """
+    choices = chunk['choices']
+    if not choices:
+        return ''
+    return choices[0].get('delta', {}).get('content') or ''
+
+
+def _complete(prompt, use_cache=None, client=None, cache=None, on_token=None):
+    """
+    Return the completion for a prompt, from the cache when possible. Raises on API errors.
+
+    When on_token is given the completion is streamed and on_token(text) is called with each
+    piece as it arrives; a cached answer is passed to it in one piece.
+    """
+    if use_cache is None:
+        use_cache = INFERENCE_CACHE_ENABLED
+    if use_cache:
+        cache = cache or get_inference_cache()
+        key = inference_cache_key(MODEL, SYSTEM_PROMPT, prompt, TEMPERATURE, MAX_TOKENS)
+        cached = cache.get(key)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached)
+            return cached
+
+    if client is None:
+        client = _openai_client()
+
     # Call the OpenAI ChatCompletion API with the latest model
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",  # Latest supported model
-            messages=[
-                {"role": "system", "content": "You are a helpful business advisor."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=350,  # Reduce tokens to fit everything more concisely
-            temperature=0.7  # Adjust for response creativity
-        )
-
-        # Return the generated business-friendly inference
-        return response['choices'][0]['message']['content'].strip()
+    response = client.ChatCompletion.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+        stream=on_token is not None
+    )
+
+    if on_token is None:
+        inference = response['choices'][0]['message']['content']
+    else:
+        # Hand over the tokens as they arrive and keep the full text for the cache
+        pieces = []
+        for chunk in response:
+            text = _chunk_text(chunk)
+            if text:
+                pieces.append(text)
+                on_token(text)
+        inference = ''.join(pieces)
+
+    # Return the generated business-friendly inference
+    inference = inference.strip()
+
+    if use_cache:
+        cache.set(key, inference)
+    return inference
+
 
+# Function to generate inferences from OpenAI API with a business-friendly perspective
+def generate_inference(data_summary, analysis_type, use_cache=None, client=None, cache=None, placeholder=None):
+    """
+    Generate business insights for an analysis summary.
+
+    Identical requests are answered from the on-disk cache. Pass use_cache=False to bypass it,
+    and a stand-in for the openai module as client (e.g. in tests). With a placeholder
+    (st.empty()) the answer is streamed into it as it is generated.
+    """
+    on_token = None
+    if placeholder is not None and INFERENCE_STREAMING:
+        streamed = []
+
+        def on_token(text):
+            streamed.append(text)
+            placeholder.markdown(f"Inference: {''.join(streamed)}")
+
+    try:
+        inference = _complete(build_prompt(data_summary, analysis_type), use_cache, client, cache, on_token)
     except Exception as e:
         st.error(f"Error generating inference: {e}")
         return None
+    if placeholder is not None:
+        placeholder.write(f"Inference: {inference}")
+    return inference
+
+
+def is_empty_summary(data_summary):
+    """
+    True for summaries with nothing to say (None, empty containers, empty frames).
+    """
+    if data_summary is None:
+        return True
+    if hasattr(data_summary, 'empty'):
+        return data_summary.empty
+    if isinstance(data_summary, (str, dict, list, tuple)):
+        return len(data_summary) == 0
+    return False
+
+
+def request_inference(data_summary, analysis_type):
+    """
+    Reserve a spot on the page for an inference; it is filled in by run_inferences.
+    """
+    return InferenceRequest(data_summary, analysis_type, st.empty())
+
+
+def dispatch_inferences(requests, on_result, max_concurrency=None, use_cache=None, client=None, cache=None,
+                        on_token=None):
+    """
+    Generate the inferences for a batch of requests concurrently.
+
+    Requests with empty summaries are dropped and identical prompts are sent only once.
+    on_result(request, inference, error) is called from the calling thread as each one completes.
+    With on_token(request, text_so_far) the completions are streamed, and it is called from
+    the calling thread as new text arrives.
+    """
+    prompts = {}  # prompt -> requests sharing it
+    for request in requests:
+        if is_empty_summary(request.data_summary):
+            continue
+        prompt = build_prompt(request.data_summary, request.analysis_type)
+        prompts.setdefault(prompt, []).append(request)
+
+    if not prompts:
+        return
+
+    # Workers only talk to the calling thread through this queue, since Streamlit
+    # elements can only be updated from the script thread
+    events = queue.Queue()
+
+    def work(prompt):
+        streamer = None
+        if on_token is not None:
+            def streamer(text):
+                events.put(('token', prompt, text))
+        try:
+            events.put(('done', prompt, _complete(prompt, use_cache, client, cache, streamer), None))
+        except Exception as e:
+            events.put(('done', prompt, None, e))
+
+    max_workers = min(max_concurrency or INFERENCE_CONCURRENCY, len(prompts))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for prompt in prompts:
+            executor.submit(work, prompt)
+
+        streamed = {prompt: '' for prompt in prompts}
+        pending = len(prompts)
+        while pending:
+            event = events.get()
+            prompt = event[1]
+            if event[0] == 'token':
+                streamed[prompt] += event[2]
+                for request in prompts[prompt]:
+                    on_token(request, streamed[prompt])
+            else:
+                pending -= 1
+                for request in prompts[prompt]:
+                    on_result(request, event[2], event[3])
+
+
+def run_inferences(requests, max_concurrency=None, stream=None):
+    """
+    Generate the inferences requested by an analysis and write each into its placeholder,
+    token by token while it is generated unless streaming is turned off.
+    """
+    if stream is None:
+        stream = INFERENCE_STREAMING
+
+    def show_partial(request, text):
+        request.placeholder.markdown(f"Inference: {text}")
+
+    def show(request, inference, error):
+        if error is not None:
+            request.placeholder.error(f"Error generating inference: {error}")
+        else:
+            request.placeholder.write(f"Inference: {inference}")
+
+    dispatch_inferences(requests, show, max_concurrency=max_concurrency,
+                        on_token=show_partial if stream else None)
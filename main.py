@@ -1,88 +1,111 @@
-import pandas as pd
 from data_cleaning import clean_data
-from eda import plot_correlation_matrix, plot_sales_by_account_type, plot_sales_trend
-from regression import perform_regression
-from time_series_analysis import analyze_time_series
-from market_segmentation import perform_segmentation
-from competitor_analysis import analyze_competitors
-from future_budget import future_budget_forecasting, plot_weighted_budget_allocation
-from dollar_value_sales import calculate_sales_from_strategy
-from simulate_reallocation_and_switching_cost import simulate_reallocation_and_switching_costs
-from inference import generate_inference  # Import inference function
-from pyairtable import Api
+from eda import compute_correlation_matrix, compute_sales_by_account_type, compute_sales_trend
+from regression import compute_regression
+from time_series_analysis import compute_time_series
+from market_segmentation import compute_segmentation
+from account_clustering import CLUSTER_COLUMN, attach_clusters, compute_account_clusters, save_assignments
+from competitor_analysis import compute_competitor_analysis
+from event_study import compute_event_study
+from future_budget import compute_future_budget_forecast, compute_weighted_budget_allocation
+from dollar_value_sales import compute_sales_from_strategy
+from simulate_reallocation_and_switching_cost import compute_reallocation_and_switching_costs
+from inference import InferenceRequest, dispatch_inferences  # Import inference functions
+from airtable_loader import fetch_table_frame
+from rollup_cube import build_rollup_cube
+from arima_models import model_store_path
 
 # Airtable credentials (replace with your actual credentials or load from a config file)
 airtable_token = 'your_personal_access_token'  # Replace with your actual token
 base_id = 'your_base_id'  # Replace with your actual base ID
 table_name = 'Your Table Name'  # Replace with your actual table name
 
-# Initialize the Airtable API and load data
-try:
-    api = Api(airtable_token)
-    table = api.table(base_id, table_name)
-    records = table.all()
-    data = [record['fields'] for record in records]
-    df = pd.DataFrame(data)
-
-    # Clean the data using your existing function
-    df_cleaned = clean_data(df)
-    print("Data successfully loaded and cleaned.")
-except Exception as e:
-    print(f"Error loading/cleaning data: {e}")
-    df_cleaned = None
-
-if df_cleaned is not None:
+# Inferences are collected while the analyses run and generated concurrently at the end
+inference_requests = []
+
+
+def report(result, analysis_type):
+    """
+    Print the summary of an analysis result and queue an inference for it.
+    """
+    summary = result.summary()
+    print(f"{analysis_type}: {summary}")
+    inference_requests.append(InferenceRequest(summary, analysis_type, None))
+
+
+def print_inference(request, inference, error):
+    """
+    Print an inference as soon as it is generated.
+    """
+    if error is not None:
+        print(f"Error generating inference for {request.analysis_type}: {error}")
+    else:
+        print(f"Inference for {request.analysis_type}: {inference}")
+
+
+# Pool workers import this script as '__mp_main__', so the analyses only run when it is executed
+if __name__ == '__main__':
+    # Initialize the Airtable API and load data
     try:
-        # Perform EDA
-        print("Starting Exploratory Data Analysis (EDA)...")
-        plot_correlation_matrix(df_cleaned)
-        generate_inference(df_cleaned, "Correlation Matrix")  # Add inference
-
-        plot_sales_by_account_type(df_cleaned)
-        generate_inference(df_cleaned, "Sales by Account Type")  # Add inference
-
-        plot_sales_trend(df_cleaned)
-        generate_inference(df_cleaned, "Sales Trend")  # Add inference
-
-        # Perform regression analysis
-        print("Running regression analysis...")
-        model = perform_regression(df_cleaned)  # Store the regression model for later use
-        generate_inference(df_cleaned, "Regression Analysis")  # Add inference
-
-        # Dollar Value of Sales
-        print("Calculating Dollar Value of Sales...")
-        calculate_sales_from_strategy(df_cleaned)
-        generate_inference(df_cleaned, "Dollar Value of Sales")  # Add inference
-
-        # Simulate reallocation, switching costs, and calculate AMI
-        print("Simulating reallocation and switching costs...")
-        simulate_reallocation_and_switching_costs(df_cleaned, model)
-        generate_inference(df_cleaned, "Reallocation & Switching Costs")  # Add inference
-
-        # Time series analysis
-        #print("Starting time series analysis...")
-        #analyze_time_series(df_cleaned)
-        #generate_inference(df_cleaned, "Time Series Analysis")  # Add inference
-
-        # Market segmentation
-        print("Performing market segmentation...")
-        perform_segmentation(df_cleaned)
-        generate_inference(df_cleaned, "Market Segmentation")  # Add inference
-
-        # Competitor impact analysis
-        print("Analyzing competitor impact...")
-        analyze_competitors(df_cleaned)
-        generate_inference(df_cleaned, "Competitor Analysis")  # Add inference
-
-        # Future budgeting and resource allocation
-        print("Calculating future budgeting and resource allocation...")
-        future_budget_forecasting()
-        generate_inference(df_cleaned, "Future Budget Forecasting")  # Add inference
-
-        plot_weighted_budget_allocation()
-        generate_inference(df_cleaned, "Weighted Budget Allocation")  # Add inference
+        df = fetch_table_frame(airtable_token, base_id, table_name)
+
+        # Clean the data using your existing function
+        df_cleaned = clean_data(df)
+        print("Data successfully loaded and cleaned.")
 
+        # Month x account type x district x competitor brand totals, shared by the trend views
+        cube = build_rollup_cube(df_cleaned)
     except Exception as e:
-        print(f"An error occurred during analysis: {e}")
-else:
-    print("No data to process. Exiting...")
+        print(f"Error loading/cleaning data: {e}")
+        df_cleaned = None
+
+    if df_cleaned is not None:
+        try:
+            # Perform EDA
+            print("Starting Exploratory Data Analysis (EDA)...")
+            report(compute_correlation_matrix(df_cleaned), "Correlation Matrix")
+            report(compute_sales_by_account_type(df_cleaned), "Sales by Account Type")
+            report(compute_sales_trend(df_cleaned, cube), "Sales Trend")
+
+            # Perform regression analysis
+            print("Running regression analysis...")
+            report(compute_regression(df_cleaned), "Regression Analysis")
+
+            # Dollar Value of Sales
+            print("Calculating Dollar Value of Sales...")
+            report(compute_sales_from_strategy(df_cleaned), "Dollar Value of Sales")
+
+            # Simulate reallocation, switching costs, and calculate AMI
+            print("Simulating reallocation and switching costs...")
+            report(compute_reallocation_and_switching_costs(df_cleaned), "Reallocation & Switching Costs")
+
+            # Time series analysis
+            print("Starting time series analysis...")
+            report(compute_time_series(df_cleaned, cube=cube, store=model_store_path(base_id, table_name, ())), "Time Series Analysis")
+
+            # Market segmentation, by account type and by behavioural account clusters
+            print("Performing market segmentation...")
+            report(compute_segmentation(df_cleaned, cube), "Market Segmentation")
+            clustering = compute_account_clusters(df_cleaned)
+            save_assignments(clustering, base_id, table_name)
+            report(clustering, "Behavioural Account Segmentation")
+            report(compute_segmentation(attach_clusters(df_cleaned, clustering.assignments), segment_by=CLUSTER_COLUMN),
+                   "Market Segmentation by Behavioural Cluster")
+
+            # Competitor impact analysis
+            print("Analyzing competitor impact...")
+            report(compute_competitor_analysis(df_cleaned, cube), "Competitor Analysis")
+            report(compute_event_study(df_cleaned), "Competitor Entry Event Study")
+
+            # Future budgeting and resource allocation
+            print("Calculating future budgeting and resource allocation...")
+            report(compute_future_budget_forecast(), "Future Budget Forecasting")
+            report(compute_weighted_budget_allocation(), "Weighted Budget Allocation")
+
+            # Generate the inferences for all analyses
+            print("Generating inferences...")
+            dispatch_inferences(inference_requests, print_inference)
+
+        except Exception as e:
+            print(f"An error occurred during analysis: {e}")
+    else:
+        print("No data to process. Exiting...")
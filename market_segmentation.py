@@ -2,78 +2,175 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import streamlit as st
-from inference import generate_inference  # Import the inference function
+from dataclasses import dataclass
+from inference import request_inference, run_inferences  # Import the inference functions
+from density import scatter_or_density
+from correlation_engine import correlation_from_sums, grouped_correlations
+from rollup_cube import CUBE_DIMENSIONS
+from account_clustering import CLUSTER_COLUMN
 
-def perform_segmentation(df):
+
+# Metrics whose correlation with the number of competitor brands is shown per segment
+SEGMENT_METRICS = ['sales', 'qty', 'strategy1', 'strategy2', 'strategy3']
+
+# Columns the market can be segmented by: column -> label
+SEGMENT_LABELS = {
+    'acctype': 'Account Type',
+    CLUSTER_COLUMN: 'Behavioural Cluster',
+}
+
+
+@dataclass
+class SegmentationResult:
+    segmented_data: pd.DataFrame  # Average sales by segment and competitor brands
+    correlations: pd.DataFrame  # Correlation between competitor brands and sales per segment
+    data: pd.DataFrame  # Segment, 'compbrand' and 'sales' rows, for the scatter plots
+    correlation_grid: pd.DataFrame = None  # Segment x metric correlation with competitor brands
+    segment_by: str = 'acctype'
+
+    def summary(self):
+        return {
+            "Segmented Data Summary": self.segmented_data.describe().to_dict(),
+            "Correlation Summary": self.correlations.describe().to_dict(),
+            f"Correlation With Competitor Brands by {SEGMENT_LABELS.get(self.segment_by, self.segment_by)}": (
+                None if self.correlation_grid is None else self.correlation_grid.to_dict()
+            ),
+        }
+
+
+def _cube_correlations(cube, by, metrics):
     """
-    Segment the market by account types and analyze the sales performance with respect to 
-    the number of competitor brands. Visualize the relationship and correlation.
+    Correlation between competitor brands and each metric per group of the by columns, from the
+    cube's sums. compbrand is constant within a cell, so its sums follow from the cell counts.
     """
-    st.header("Market Segmentation by Account Type")
-
-    # Ensure 'compbrand', 'sales', and 'acctype' columns exist in the dataset
-    if 'compbrand' in df.columns and 'sales' in df.columns and 'acctype' in df.columns:
-        
-        # Group by account type and competitor brands, then calculate average sales
-        segmented_data = df.groupby(['acctype', 'compbrand'])['sales'].mean().reset_index()
-
-        # Display the segmented data in Streamlit (optional, to check the structure)
-        st.write("Segmented Data (Average Sales by Account Type and Competitor Brands):")
-        st.dataframe(segmented_data)
-
-        # Calculate correlation between competitor brands and sales for each account type
-        correlations_by_accType = df.groupby('acctype').apply(
-            lambda x: x['compbrand'].corr(x['sales'])
-        ).reset_index()
-
-        # Rename columns for clarity
-        correlations_by_accType.columns = ['Account Type', 'Correlation']
-
-        # Display correlations in Streamlit
-        st.write("Correlation Between Competitor Brands and Sales by Account Type:")
-        st.dataframe(correlations_by_accType)
-
-        # Plot sales vs competitor brands for each account type
-        st.subheader("Sales vs Competitor Brands for Each Account Type")
-        plt.figure(figsize=(14, 8))
-
-        # Creating subplots for each account type
-        account_types = df['acctype'].unique()
-        for i, accType in enumerate(account_types, 1):
-            plt.subplot(2, 2, i)
-            subset = df[df['acctype'] == accType]
-            sns.scatterplot(data=subset, x='compbrand', y='sales', hue='compbrand', palette='coolwarm')
-            plt.title(f"Sales vs Competitor Brands for {accType}")
-            plt.xlabel("Number of Competitor Brands")
-            plt.ylabel("Sales (SGD)")
-            plt.grid(True)
-
-        plt.tight_layout()
-        st.pyplot(plt)
-
-        # Bar plot of correlation by account type
-        st.subheader("Correlation Between Competitor Brands and Sales by Account Type")
-        plt.figure(figsize=(10, 6))
-        sns.barplot(data=correlations_by_accType, x='Account Type', y='Correlation', palette='Blues_d')
-        plt.title('Correlation Between Competitor Brands and Sales by Account Type')
-        plt.xlabel('Account Type')
-        plt.ylabel('Correlation')
-        plt.xticks(rotation=45)
-        plt.grid(True)
-        st.pyplot(plt)
+    cells = cube.cells[cube.cells['compbrand'].notna()]
+    brands = cells['compbrand']
+    sums = cells[list(by)].copy()
+    for metric in metrics:
+        count = cells[f'{metric}_count']
+        sums[f'{metric} n'] = count
+        sums[f'{metric} x'] = brands * count
+        sums[f'{metric} xx'] = brands ** 2 * count
+        sums[f'{metric} y'] = cells[f'{metric}_sum']
+        sums[f'{metric} yy'] = cells[f'{metric}_sumsq']
+        sums[f'{metric} xy'] = brands * cells[f'{metric}_sum']
+    sums = sums.groupby(list(by), observed=True, sort=True).sum()
+    return pd.DataFrame({
+        metric: correlation_from_sums(*(sums[f'{metric} {stat}'].to_numpy() for stat in ('n', 'x', 'y', 'xx', 'yy', 'xy')))
+        for metric in metrics
+    }, index=sums.index)
 
-        # Generate inference based on the segmentation analysis
-        segmentation_summary = {
-            "Segmented Data Summary": segmented_data.describe().to_dict(),
-            "Correlation Summary": correlations_by_accType.describe().to_dict(),
-        }
 
-        # Updated generate_inference call with analysis_type
-        try:
-            inference_result = generate_inference(segmentation_summary, "Market Segmentation Analysis")
-            st.write(f"Inference: {inference_result}")
-        except Exception as e:
-            st.error(f"Error generating inference: {e}")
+def compute_segmentation(df, cube=None, segment_by='acctype'):
+    """
+    Segment the market by account types (or by another segment column, such as the behavioural
+    clusters of account_clustering) and compute the sales performance with respect to the number
+    of competitor brands, together with the correlation of competitor brands with sales and the
+    other metrics per segment (all from grouped sums, see correlation_engine.grouped_correlations).
+    With a rollup_cube.RollupCube of the same data, the averages and correlations are read
+    from the cube (account type segments only).
+    """
+    # Ensure 'compbrand', 'sales', and the segment columns exist in the dataset
+    if not ('compbrand' in df.columns and 'sales' in df.columns and segment_by in df.columns):
+        raise ValueError(f"Required columns 'compbrand', 'sales', or '{segment_by}' are missing in the dataset.")
+    label = SEGMENT_LABELS.get(segment_by, segment_by)
 
+    if cube is not None and segment_by in CUBE_DIMENSIONS:
+        metrics = [metric for metric in SEGMENT_METRICS if metric in cube.measures]
+        segmented_data = cube.mean([segment_by, 'compbrand'], 'sales').rename('sales').reset_index()
+        correlation_grid = _cube_correlations(cube, [segment_by], metrics)
     else:
-        st.error("Required columns 'compbrand', 'sales', or 'acctype' are missing in the dataset.")
+        metrics = [metric for metric in SEGMENT_METRICS if metric in df.columns]
+        # Group by segment and competitor brands, then calculate average sales
+        segmented_data = df.groupby([segment_by, 'compbrand'], observed=True)['sales'].mean().reset_index()
+
+        # Correlation between competitor brands and every metric for each segment
+        correlation_grid = grouped_correlations(
+            df, segment_by, [('compbrand', metric) for metric in metrics]
+        ).droplevel('x', axis=1)
+    correlation_grid.index.name = label
+    correlation_grid.columns.name = None
+
+    # Rename columns for clarity
+    correlations_by_segment = correlation_grid['sales'].rename('Correlation').reset_index()
+
+    return SegmentationResult(segmented_data, correlations_by_segment, df[[segment_by, 'compbrand', 'sales']],
+                              correlation_grid, segment_by)
+
+
+def render_segmentation(result):
+    """
+    Display the market segmentation tables, plots and inference.
+    """
+    segment_by = result.segment_by
+    label = SEGMENT_LABELS.get(segment_by, segment_by)
+    st.header(f"Market Segmentation by {label}")
+
+    # Display the segmented data in Streamlit (optional, to check the structure)
+    st.write(f"Segmented Data (Average Sales by {label} and Competitor Brands):")
+    st.dataframe(result.segmented_data)
+
+    # Display correlations in Streamlit
+    st.write(f"Correlation Between Competitor Brands and Sales by {label}:")
+    st.dataframe(result.correlations)
+
+    # Plot sales vs competitor brands for each segment
+    df = result.data
+    st.subheader(f"Sales vs Competitor Brands for Each {label}")
+
+    # Creating subplots for each segment, two per row
+    segments = df[segment_by].dropna().unique()
+    n_rows = max((len(segments) + 1) // 2, 1)
+    plt.figure(figsize=(14, 4 * n_rows))
+    for i, segment in enumerate(segments, 1):
+        ax = plt.subplot(n_rows, 2, i)
+        subset = df[df[segment_by] == segment]
+        scatter_or_density(ax, subset, 'compbrand', 'sales', hue='compbrand', palette='coolwarm')
+        plt.title(f"Sales vs Competitor Brands for {segment}")
+        plt.xlabel("Number of Competitor Brands")
+        plt.ylabel("Sales (SGD)")
+        plt.grid(True)
+
+    plt.tight_layout()
+    st.pyplot(plt)
+
+    # Bar plot of correlation by segment
+    st.subheader(f"Correlation Between Competitor Brands and Sales by {label}")
+    plt.figure(figsize=(10, 6))
+    sns.barplot(data=result.correlations, x=label, y='Correlation', palette='Blues_d')
+    plt.title(f'Correlation Between Competitor Brands and Sales by {label}')
+    plt.xlabel(label)
+    plt.ylabel('Correlation')
+    plt.xticks(rotation=45)
+    plt.grid(True)
+    st.pyplot(plt)
+
+    # Correlation of competitor brands with every metric, per segment
+    if result.correlation_grid is not None and result.correlation_grid.shape[1] > 1:
+        st.subheader(f"Correlation Between Competitor Brands and Each Metric by {label}")
+        fig, ax = plt.subplots(figsize=(10, 6))
+        sns.heatmap(result.correlation_grid, annot=True, fmt='.2f', cmap='coolwarm', vmin=-1, vmax=1, ax=ax)
+        ax.set_xlabel('Metric')
+        ax.set_ylabel(label)
+        st.pyplot(fig)
+        plt.close(fig)
+
+    # Inference request with analysis_type
+    return [request_inference({
+        f"Average sales by {label.lower()} and competitor brands": result.segmented_data,
+        "Correlation between competitor brands and sales": result.correlations.set_index(label)['Correlation'],
+    }, "Market Segmentation Analysis")]
+
+
+def perform_segmentation(df):
+    """
+    Segment the market by account types and analyze the sales performance with respect to
+    the number of competitor brands. Visualize the relationship and correlation.
+    """
+    try:
+        result = compute_segmentation(df)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    run_inferences(render_segmentation(result))
+    return result.summary()
@@ -0,0 +1,213 @@
+# model_registry.py
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+import statsmodels.api as sm
+
+from batched_ols import fit_grouped_ols
+from fixed_effects import CLUSTER_COLUMN, fit_fixed_effects
+from result_cache import dataset_fingerprint
+
+
+@dataclass
+class ModelFit:
+    formula: str
+    segment: tuple  # (column, value) the rows were restricted to, or None
+    params: pd.Series
+    cov_params: pd.DataFrame
+    bse: pd.Series
+    tvalues: pd.Series
+    pvalues: pd.Series
+    rsquared: float
+    nobs: int
+    exog_means: pd.Series  # Mean of each regressor over the fitted rows
+    summary_text: str  # statsmodels summary, or None when fitted from sufficient statistics
+
+
+def parse_formula(formula):
+    """
+    Split 'y ~ x1 + x2' into the response and the regressors. A constant is always added.
+    """
+    response, _, terms = formula.partition('~')
+    regressors = [term.strip() for term in terms.split('+') if term.strip()]
+    if not response.strip() or not regressors:
+        raise ValueError(f"Unsupported formula: {formula!r}")
+    return response.strip(), regressors
+
+
+def _select(df, columns):
+    """
+    The requested columns of df, matched case- and whitespace-insensitively.
+    """
+    normalized = df.columns.str.strip().str.lower()
+    missing = [col for col in columns if col not in normalized]
+    if missing:
+        raise ValueError(f"Missing columns for regression: {', '.join(missing)}")
+    return df.set_axis(normalized, axis=1)[columns]
+
+
+def model_fingerprint(df, formula, segment_columns=None):
+    """
+    Fingerprint of only the columns a model uses, so unrelated columns do not affect it.
+    segment_columns is a column name or a list of them.
+    """
+    response, regressors = parse_formula(formula)
+    if segment_columns is None:
+        segment_columns = []
+    elif isinstance(segment_columns, str):
+        segment_columns = [segment_columns]
+    columns = [response] + regressors + list(segment_columns)
+    return dataset_fingerprint(_select(df, list(dict.fromkeys(columns))))
+
+
+def fit_ols(df, formula, segment=None):
+    """
+    Fit an OLS model with a constant on the rows of df (restricted to the segment, if any)
+    where the response and regressors are numeric.
+    """
+    response, regressors = parse_formula(formula)
+    columns = list(dict.fromkeys([response] + regressors + ([segment[0]] if segment is not None else [])))
+    data = _select(df, columns)
+
+    if segment is not None:
+        data = data[data[segment[0]] == segment[1]]
+
+    # Coerce to numeric and drop incomplete rows
+    data = data[[response] + regressors].apply(pd.to_numeric, errors='coerce').dropna()
+
+    X = sm.add_constant(data[regressors], has_constant='add')
+    model = sm.OLS(data[response], X).fit()
+
+    return ModelFit(
+        formula=formula,
+        segment=segment,
+        params=model.params,
+        cov_params=model.cov_params(),
+        bse=model.bse,
+        tvalues=model.tvalues,
+        pvalues=model.pvalues,
+        rsquared=model.rsquared,
+        nobs=int(model.nobs),
+        exog_means=data[regressors].mean(),
+        summary_text=str(model.summary()),
+    )
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU registry of fitted models keyed by (dataset fingerprint, formula, segment),
+    so a model is fitted once per dataset no matter how many analyses use it.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._fits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fit(self, df, formula, segment=None, fingerprint=None):
+        """
+        Return the fit of formula on df (restricted to segment=(column, value), if given),
+        reusing an earlier fit of the same model on the same data.
+
+        fingerprint identifies the data; by default only the columns the model uses are hashed.
+        """
+        if fingerprint is None:
+            fingerprint = model_fingerprint(df, formula, segment[0] if segment is not None else None)
+        key = (fingerprint, formula, segment)
+
+        with self._lock:
+            if key in self._fits:
+                self._fits.move_to_end(key)
+                self.hits += 1
+                return self._fits[key]
+            self.misses += 1
+
+        # Fit outside the lock so other sessions are not blocked meanwhile
+        fit = fit_ols(df, formula, segment)
+        self._store(key, fit)
+        return fit
+
+    def fit_grouped(self, df, formula, by, fingerprint=None):
+        """
+        Return the fit of formula on every segment of df defined by the columns in by
+        (see batched_ols.fit_grouped_ols), reusing an earlier fit on the same data.
+        """
+        by = tuple(by)
+        if fingerprint is None:
+            fingerprint = model_fingerprint(df, formula, list(by))
+        key = (fingerprint, formula, ('by',) + by)
+
+        with self._lock:
+            if key in self._fits:
+                self._fits.move_to_end(key)
+                self.hits += 1
+                return self._fits[key]
+            self.misses += 1
+
+        response, regressors = parse_formula(formula)
+        fit = fit_grouped_ols(_select(df, list(dict.fromkeys([response] + regressors + list(by)))),
+                              response, regressors, by, formula)
+        self._store(key, fit)
+        return fit
+
+    def fit_fixed_effects(self, df, formula, absorb, cluster=CLUSTER_COLUMN, by=(), fingerprint=None):
+        """
+        Return the fit of formula with the fixed effects in absorb and standard errors clustered
+        by cluster, per segment of the columns in by (see fixed_effects.fit_fixed_effects),
+        reusing an earlier fit on the same data.
+        """
+        absorb, by = tuple(absorb), tuple(by)
+        extra_columns = list(dict.fromkeys(by + absorb + (cluster,)))
+        if fingerprint is None:
+            fingerprint = model_fingerprint(df, formula, extra_columns)
+        key = (fingerprint, formula, ('absorb',) + absorb + ('cluster', cluster, 'by') + by)
+
+        with self._lock:
+            if key in self._fits:
+                self._fits.move_to_end(key)
+                self.hits += 1
+                return self._fits[key]
+            self.misses += 1
+
+        response, regressors = parse_formula(formula)
+        fit = fit_fixed_effects(_select(df, list(dict.fromkeys([response] + regressors + extra_columns))),
+                                response, regressors, absorb, cluster, by, formula)
+        self._store(key, fit)
+        return fit
+
+    def _store(self, key, fit):
+        with self._lock:
+            self._fits[key] = fit
+            self._fits.move_to_end(key)
+            while len(self._fits) > self.max_entries:
+                self._fits.popitem(last=False)
+
+    def store(self, fingerprint, formula, fit, segment=None):
+        """
+        Register a fit obtained elsewhere (e.g. from sufficient statistics) under the key
+        fit() would use for the same data.
+        """
+        self._store((fingerprint, formula, segment), fit)
+
+    def store_grouped(self, fingerprint, formula, by, fit):
+        """
+        Register a grouped fit obtained elsewhere under the key fit_grouped() would use.
+        """
+        self._store((fingerprint, formula, ('by',) + tuple(by)), fit)
+
+    def clear(self):
+        with self._lock:
+            self._fits.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._fits)}
+
+
+# Module-level instance, shared by every Streamlit session served by this process
+MODEL_REGISTRY = ModelRegistry()
@@ -0,0 +1,28 @@
+# process_pools.py
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes are started from a clean server process rather than forked from the
+# Streamlit server, whose threads may hold locks at the time of the fork
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Modules the fork server imports once, so every worker starts with them (and the functions
+# the pools run) already loaded
+PRELOAD_MODULES = ['numpy', 'pandas', 'statsmodels.tsa.arima.model', 'sklearn.cluster',
+                   'bootstrap', 'arima_models', 'time_series_analysis', 'account_clustering']
+
+POOL_CONTEXT = multiprocessing.get_context(POOL_START_METHOD)
+if POOL_START_METHOD == 'forkserver':
+    POOL_CONTEXT.set_forkserver_preload(PRELOAD_MODULES)
+
+
+def process_pool(max_workers, **kwargs):
+    """
+    A ProcessPoolExecutor whose workers are started with POOL_START_METHOD.
+
+    Workers started that way import the main script as '__mp_main__' before taking work, so
+    the entry scripts (app.py, main.py) keep everything but their imports and definitions under
+    an `if __name__ == '__main__':` guard.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=POOL_CONTEXT, **kwargs)
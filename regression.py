@@ -1,127 +1,275 @@
 import streamlit as st
 import pandas as pd
-import statsmodels.api as sm
-import altair as alt
-from inference import generate_inference  # Import the inference function
+from dataclasses import dataclass, field
+from inference import request_inference, run_inferences  # Import the inference functions
+from model_registry import MODEL_REGISTRY, model_fingerprint
+from fixed_effects import CLUSTER_COLUMN
+from density import scatter_chart
 
-def segmented_strategy_analysis(segment_data, segment_name):
+STRATEGY_COLUMNS = ['strategy1', 'strategy2', 'strategy3']
+STRATEGY_FORMULA = 'sales ~ ' + ' + '.join(STRATEGY_COLUMNS)
+
+# Ways to segment the regression: label -> columns
+SEGMENTATIONS = {
+    'Account type': ('acctype',),
+    'Account type × district': ('acctype', 'district'),
+}
+
+# Segments beyond this many (the largest first) are only shown in the coefficient table
+MAX_DETAILED_SEGMENTS = 12
+
+# Models whose sufficient statistics are kept next to the snapshot: (formula, segment columns)
+INCREMENTAL_MODELS = [(STRATEGY_FORMULA, ())] + [(STRATEGY_FORMULA, by) for by in SEGMENTATIONS.values()]
+
+
+@dataclass
+class SegmentRegression:
+    name: object
+    params: pd.Series
+    bse: pd.Series
+    tvalues: pd.Series
+    pvalues: pd.Series
+    rsquared: float
+    nobs: int
+    summary_text: str  # Full statsmodels summary, or None when it was not requested
+    data: pd.DataFrame  # Strategy columns and sales of the segment, for the plots
+
+    def coefficient_table(self):
+        return pd.DataFrame({
+            'coef': self.params, 'std err': self.bse, 't': self.tvalues, 'P>|t|': self.pvalues
+        })
+
+
+@dataclass
+class RegressionResult:
+    segments: list = field(default_factory=list)
+    errors: dict = field(default_factory=dict)  # Segment name -> error message
+    coefficients: pd.DataFrame = None  # One row per segment: coefficients, p-values, R² and observations
+    fixed_effects: tuple = ()  # Absorbed fixed effects (standard errors then clustered by account)
+
+    def summary(self):
+        return {segment.name: segment.params.to_dict() for segment in self.segments}
+
+
+def prepare_regression_data(df, extra_columns=()):
+    """
+    Select sales, the strategy columns and any extra columns, coerce the numeric ones
+    and drop rows with missing values. The input DataFrame is left untouched.
+    """
+    columns = df.columns.str.strip().str.lower()
+    wanted = ['sales'] + STRATEGY_COLUMNS
+    wanted += [col for col in extra_columns if col in columns and col not in wanted]
+    df = df.set_axis(columns, axis=1)[wanted].copy()
+
+    # Ensure 'sales' and strategies are numeric
+    for col in ['sales'] + STRATEGY_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Drop rows with missing values in these columns
+    return df.dropna(subset=['sales'] + STRATEGY_COLUMNS)
+
+
+def fit_segment_regression(segment_data, segment_name, fingerprint=None):
+    """
+    Fit sales ~ strategy1 + strategy2 + strategy3 with statsmodels for the rows of one segment,
+    including the full model summary.
+    The fit comes from the model registry when this segment was fitted before.
+    """
+    model = MODEL_REGISTRY.fit(segment_data, STRATEGY_FORMULA, fingerprint=fingerprint)
+
+    return SegmentRegression(
+        name=segment_name,
+        params=model.params,
+        bse=model.bse,
+        tvalues=model.tvalues,
+        pvalues=model.pvalues,
+        rsquared=model.rsquared,
+        nobs=model.nobs,
+        summary_text=model.summary_text,
+        data=segment_data[STRATEGY_COLUMNS + ['sales']],
+    )
+
+
+def segment_label(key):
+    """
+    Display name of a segment key (a value, or a tuple of values for several columns).
+    """
+    if isinstance(key, tuple):
+        return ' × '.join(str(value) for value in key)
+    return key
+
+
+def compute_regression(df, segment_by=SEGMENTATIONS['Account type'], full_summary=False, fixed_effects=()):
+    """
+    Fit the strategy regression separately for each segment (each account type by default).
+
+    All segments are fitted at once by the batched engine; statsmodels is only used when
+    full_summary is requested, for the segments that are shown in detail.
+    With fixed_effects (e.g. ('accid',) or ('accid', 'month')) those effects are absorbed and the
+    standard errors are clustered by account; full summaries are not available then.
+    """
+    segment_by = list(segment_by)
+    fixed_effects = tuple(fixed_effects)
+    columns = df.columns.str.strip().str.lower()
+
+    # Check if the segment and fixed-effect columns exist after cleaning
+    for col in segment_by + list(fixed_effects) + ([CLUSTER_COLUMN] if fixed_effects else []):
+        if col not in columns:
+            raise ValueError(f"The '{col}' column is missing from the data after cleaning.")
+
+    loaded = df
+    df = prepare_regression_data(df, extra_columns=segment_by)
+
+    # Ensure the segment columns have non-empty values
+    for col in segment_by:
+        if df[col].isnull().all():
+            raise ValueError(f"No valid '{col}' data found after cleaning.")
+
+    if fixed_effects:
+        fit = MODEL_REGISTRY.fit_fixed_effects(loaded, STRATEGY_FORMULA, fixed_effects, by=segment_by)
+        full_summary = False
+    else:
+        # Fingerprint the data as loaded, so fits registered from stored statistics are found
+        fingerprint = model_fingerprint(loaded, STRATEGY_FORMULA, segment_by)
+        fit = MODEL_REGISTRY.fit_grouped(df, STRATEGY_FORMULA, segment_by, fingerprint=fingerprint)
+
+    # A fit from stored statistics has no rows; group them once for the plots
+    segment_rows = df.groupby(segment_by, observed=True).indices if fit.data is None else None
+    fitted = fit.nobs.drop(list(fit.errors))
+    detailed = set(fitted.sort_values(ascending=False, kind='stable').index[:MAX_DETAILED_SEGMENTS])
+
+    result = RegressionResult(fixed_effects=fixed_effects)
+    for position, key in enumerate(fit.keys):
+        segment_name = segment_label(key)
+        if key in fit.errors:
+            result.errors[segment_name] = fit.errors[key]
+            continue
+
+        if segment_rows is None:
+            segment_data = fit.segment_data(position)[STRATEGY_COLUMNS + ['sales']]
+        else:
+            segment_data = df.iloc[segment_rows[key]][STRATEGY_COLUMNS + ['sales']]
+        if full_summary and key in detailed:
+            try:
+                result.segments.append(fit_segment_regression(segment_data, segment_name))
+            except Exception as e:
+                result.errors[segment_name] = str(e)
+            continue
+
+        result.segments.append(SegmentRegression(
+            name=segment_name,
+            params=fit.params.loc[key],
+            bse=fit.bse.loc[key],
+            tvalues=fit.tvalues.loc[key],
+            pvalues=fit.pvalues.loc[key],
+            rsquared=fit.rsquared.loc[key],
+            nobs=int(fit.nobs.loc[key]),
+            summary_text=None,
+            data=segment_data,
+        ))
+
+    # One row per segment for the overview table
+    result.coefficients = pd.DataFrame([
+        {
+            'Segment': segment.name,
+            **segment.params.add_prefix('coef ').to_dict(),
+            **segment.pvalues.add_prefix('P>|t| ').to_dict(),
+            'R²': segment.rsquared,
+            'Observations': segment.nobs,
+        }
+        for segment in result.segments
+    ])
+    return result
+
+
+def render_segment_regression(segment):
     """
-    Perform regression analysis for each account type segment and generate plots for each strategy.
+    Display the regression summary and strategy plots for one segment.
     """
+    segment_name = segment.name
+    segment_data = segment.data
     st.header(f"Regression Analysis for {segment_name}")
 
-    # Independent variables (strategies)
-    X = segment_data[['strategy1', 'strategy2', 'strategy3']]
-    X = sm.add_constant(X)  # Adds a constant term for the regression
+    # Display the summary of the regression model
+    st.subheader(f"Regression Summary for {segment_name}")
+    if segment.summary_text is not None:
+        st.text(segment.summary_text)
+    else:
+        st.write(f"R²: {segment.rsquared:.3f}, observations: {segment.nobs:,}")
+        st.dataframe(segment.coefficient_table())
 
-    # Dependent variable (sales)
-    y = segment_data['sales']
+    # Generate inference using the model's summary (e.g., coefficients)
+    inference_request = request_inference(segment.params.to_dict(), "Segmented Regression Analysis")
 
-    # Fit the model
-    try:
-        model = sm.OLS(y, X).fit()
-
-        # Display the summary of the regression model
-        st.subheader(f"Regression Summary for {segment_name}")
-        st.text(model.summary())
-
-        # Generate inference using the model's summary (e.g., coefficients)
-        inference_result = generate_inference(model.params.to_dict(), "Segmented Regression Analysis")
-        st.write(f"Inference: {inference_result}")
-
-        # Plot strategy1 vs. sales with regression line
-        base = alt.Chart(segment_data).mark_point().encode(
-            x='strategy1', y='sales', tooltip=['strategy1', 'sales']
-        ).properties(
-            title=f"{segment_name}: Strategy 1 Impact on Sales"
-        )
-        line = base.transform_regression('strategy1', 'sales').mark_line()
-        plot1 = base + line
-        st.altair_chart(plot1, use_container_width=True)
-
-        # Plot strategy2 vs. sales with regression line
-        base2 = alt.Chart(segment_data).mark_point().encode(
-            x='strategy2', y='sales', tooltip=['strategy2', 'sales']
-        ).properties(
-            title=f"{segment_name}: Strategy 2 Impact on Sales"
-        )
-        line2 = base2.transform_regression('strategy2', 'sales').mark_line()
-        plot2 = base2 + line2
-        st.altair_chart(plot2, use_container_width=True)
-
-        # Plot strategy3 vs. sales with regression line
-        base3 = alt.Chart(segment_data).mark_point().encode(
-            x='strategy3', y='sales', tooltip=['strategy3', 'sales']
-        ).properties(
-            title=f"{segment_name}: Strategy 3 Impact on Sales"
-        )
-        line3 = base3.transform_regression('strategy3', 'sales').mark_line()
-        plot3 = base3 + line3
-        st.altair_chart(plot3, use_container_width=True)
-    
-    except Exception as e:
-        st.error(f"Error in regression for {segment_name}: {e}")
-
-def perform_regression(df):
-    """
-    Perform regression analysis by account type and plot regression lines for each strategy.
+    # Plot each strategy vs. sales with the fitted regression line; large segments are
+    # binned into density tiles before being sent to the browser
+    for i, strategy in enumerate(STRATEGY_COLUMNS, 1):
+        chart = scatter_chart(segment_data, strategy, 'sales', segment.params[strategy],
+                              f"{segment_name}: Strategy {i} Impact on Sales")
+        st.altair_chart(chart, use_container_width=True)
+
+    return [inference_request]
+
+
+def render_regression(result):
+    """
+    Display the segmented regression results.
     """
     st.header("Segmented Strategy Regression Analysis")
+    if result.fixed_effects:
+        st.caption(f"Fixed effects: {', '.join(result.fixed_effects)}; "
+                   f"standard errors clustered by {CLUSTER_COLUMN}. R² is the within R².")
 
-    # Ensure columns are in lowercase for consistency
-    df.columns = df.columns.str.strip().str.lower()
-
-    # Check if 'acctype' exists after cleaning
-    if 'acctype' not in df.columns:
-        st.error("The 'acctype' column is missing from the data after cleaning.")
-        return
+    if result.coefficients is not None and len(result.segments) > 1:
+        st.subheader("Coefficients by Segment")
+        st.dataframe(result.coefficients)
 
-    # Ensure 'sales' and strategies are numeric
-    df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
-    df['strategy1'] = pd.to_numeric(df['strategy1'], errors='coerce')
-    df['strategy2'] = pd.to_numeric(df['strategy2'], errors='coerce')
-    df['strategy3'] = pd.to_numeric(df['strategy3'], errors='coerce')
+    # Detailed results and plots for the largest segments only
+    detailed = sorted(result.segments, key=lambda segment: -segment.nobs)[:MAX_DETAILED_SEGMENTS]
+    if len(detailed) < len(result.segments):
+        st.info(f"Showing details for the {len(detailed)} largest of {len(result.segments)} segments; "
+                f"all segments are listed in the table above.")
 
-    # Drop rows with missing values in these columns
-    df = df.dropna(subset=['sales', 'strategy1', 'strategy2', 'strategy3'])
+    inference_requests = []
+    for segment in detailed:
+        inference_requests += render_segment_regression(segment)
 
-    # Ensure 'acctype' has non-empty values
-    if df['acctype'].isnull().all():
-        st.warning("No valid 'acctype' data found after cleaning.")
-        return
+    for segment_name, message in result.errors.items():
+        st.error(f"Error in regression for {segment_name}: {message}")
 
-    # Segment the data by account type
-    for segment_name in df['acctype'].unique():
-        segment_data = df[df['acctype'] == segment_name]
-        segmented_strategy_analysis(segment_data, segment_name)
+    return inference_requests
 
 
-def perform_overall_regression(df):
+def perform_regression(df, segment_by=SEGMENTATIONS['Account type'], full_summary=False, fixed_effects=()):
     """
-    Perform overall regression analysis without segmentation and return the model for AMI.
+    Perform regression analysis by segment (account type by default) and plot regression lines
+    for each strategy, optionally with account (and month) fixed effects.
     """
-    # Ensure 'sales' and strategies are numeric
-    df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
-    df['strategy1'] = pd.to_numeric(df['strategy1'], errors='coerce')
-    df['strategy2'] = pd.to_numeric(df['strategy2'], errors='coerce')
-    df['strategy3'] = pd.to_numeric(df['strategy3'], errors='coerce')
+    try:
+        result = compute_regression(df, segment_by, full_summary, fixed_effects)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    run_inferences(render_regression(result))
+    return result.summary()
 
-    # Drop rows with missing values in these columns
-    df = df.dropna(subset=['sales', 'strategy1', 'strategy2', 'strategy3'])
 
-    # Define independent variables (strategies)
-    X = df[['strategy1', 'strategy2', 'strategy3']]
-    X = sm.add_constant(X)  # Adds a constant term for the regression
+def fit_overall_regression(df):
+    """
+    Fit the overall strategy regression without segmentation.
+    The fit is shared through the model registry with the dollar value and AMI analyses.
+    """
+    return MODEL_REGISTRY.fit(df, STRATEGY_FORMULA)
 
-    # Dependent variable (sales)
-    y = df['sales']
 
-    # Fit the model
-    model = sm.OLS(y, X).fit()
+def perform_overall_regression(df):
+    """
+    Perform overall regression analysis without segmentation and return the model for AMI.
+    """
+    model = fit_overall_regression(df)
 
     # Generate inference from the model's summary (e.g., coefficients)
-    inference_result = generate_inference(model.params.to_dict(), "Overall Regression Analysis")  # Add analysis type
-    st.write(f"Inference: {inference_result}")
+    run_inferences([request_inference(model.params.to_dict(), "Overall Regression Analysis")])  # Add analysis type
 
     # Return the model to be used in AMI calculations
     return model
@@ -0,0 +1,117 @@
+# result_cache.py
+
+import dataclasses
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def dataset_fingerprint(df):
+    """
+    Content fingerprint of a DataFrame (column names, dtypes, index and values).
+    Compute it once when the data is loaded; it is the cache key for every analysis.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def estimate_size(obj):
+    """
+    Rough in-memory size of an analysis result, in bytes.
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True))
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage())
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return sum(estimate_size(getattr(obj, f.name)) for f in dataclasses.fields(obj))
+    if isinstance(obj, dict):
+        return sum(estimate_size(key) + estimate_size(value) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_size(item) for item in obj)
+    return sys.getsizeof(obj)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of analysis results keyed by (dataset fingerprint, analysis, parameters).
+    Bounded both by number of entries and by the estimated total size of the cached results.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(compute, fingerprint, params):
+        name = f"{compute.__module__}.{compute.__qualname__}"
+        return fingerprint, name, tuple(sorted((key, repr(value)) for key, value in params.items()))
+
+    def compute(self, compute, df, fingerprint=None, **params):
+        """
+        Return compute(df, **params), reusing a cached result for the same data and parameters.
+        """
+        if fingerprint is None:
+            fingerprint = dataset_fingerprint(df)
+        key = self.make_key(compute, fingerprint, params)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # Compute outside the lock so other sessions are not blocked meanwhile
+        result = compute(df, **params)
+        self.put(key, result)
+        return result
+
+    def put(self, key, result):
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._total_bytes += size
+
+            # Evict the least recently used results until both limits hold
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+            }
+
+
+# Module-level instance, shared by every Streamlit session served by this process
+RESULT_CACHE = ResultCache()
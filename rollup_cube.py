@@ -0,0 +1,191 @@
+# rollup_cube.py
+
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from result_cache import dataset_fingerprint
+from snapshot_cache import SNAPSHOT_DIR, clean_changed_rows, watermark_stamp
+
+CUBE_DIMENSIONS = ['month', 'acctype', 'district', 'compbrand']
+CUBE_MEASURES = ['sales', 'qty', 'strategy1', 'strategy2', 'strategy3']
+
+# Dimensions that are used as numbers (e.g. the average number of competitor brands)
+NUMERIC_DIMENSIONS = ['compbrand']
+
+
+@dataclass(repr=False)
+class RollupCube:
+    # One row per combination of the dimensions (missing values included) with the number of
+    # rows and, per measure, '<measure>_sum', '<measure>_count' (non-missing) and '<measure>_sumsq'
+    cells: pd.DataFrame
+    measures: list
+    watermark: str = None  # Snapshot watermark the cube corresponds to
+
+    def __repr__(self):
+        # Short and content-based, so a cube can be part of a result cache key
+        return f"RollupCube({dataset_fingerprint(self.cells)})"
+
+    def rollup(self, dimensions):
+        """
+        Totals of every cell column per combination of the given dimensions. Cells with a missing
+        value in any of those dimensions are left out, like a groupby over the rows would.
+        """
+        return self.cells.groupby(list(dimensions), observed=True, sort=True)[self.value_columns].sum()
+
+    def mean(self, dimensions, measure):
+        """
+        Mean of a measure per combination of the given dimensions, over the rows where it is present.
+        """
+        totals = self.rollup(dimensions)
+        totals = totals[totals[f'{measure}_count'] > 0]
+        return totals[f'{measure}_sum'] / totals[f'{measure}_count']
+
+    def where(self, filters):
+        """
+        The cube restricted to the cells matching a filter selection ({dimension: allowed values}),
+        which is the cube of the filtered rows.
+        """
+        keep = pd.Series(True, index=self.cells.index)
+        for dimension, allowed in filters.items():
+            keep &= self.cells[dimension].isin(list(allowed))
+        return RollupCube(self.cells[keep], self.measures, self.watermark)
+
+    @property
+    def value_columns(self):
+        return ['rows'] + [f'{measure}_{stat}' for measure in self.measures for stat in ('sum', 'count', 'sumsq')]
+
+    def rebuild_months(self, df, months):
+        """
+        Return the cube with the cells of the given months recomputed from df, and all other
+        cells kept as they are. Only the rows of those months are prepared and aggregated.
+        """
+        months = pd.DatetimeIndex(months)
+        month = pd.to_datetime(df.iloc[:, df.columns.str.strip().str.lower().get_loc('month')], errors='coerce')
+        fresh = _aggregate(_cube_frame(df[month.isin(months).to_numpy()], self.measures), self.measures)
+        kept = self.cells[~self.cells['month'].isin(months)]
+        cells = pd.concat([kept, fresh], ignore_index=True)
+        return RollupCube(_restore_categories(cells, self.cells), self.measures, self.watermark)
+
+
+def _cube_frame(df, measures):
+    """
+    The dimension and measure columns of df, with months as dates and numbers as floats.
+    """
+    data = df.set_axis(df.columns.str.strip().str.lower(), axis=1)[CUBE_DIMENSIONS + measures].copy()
+    data['month'] = pd.to_datetime(data['month'], errors='coerce')
+    for col in NUMERIC_DIMENSIONS + measures:
+        data[col] = pd.to_numeric(data[col], errors='coerce').astype(float)
+    return data
+
+
+def _aggregate(data, measures):
+    """
+    One pass of grouped sums over the rows: counts, sums and sums of squares per cell.
+    """
+    values = data[CUBE_DIMENSIONS].copy()
+    values['rows'] = 1
+    for measure in measures:
+        column = data[measure]
+        values[f'{measure}_sum'] = column
+        values[f'{measure}_count'] = column.notna().astype(np.int64)
+        values[f'{measure}_sumsq'] = column ** 2
+    grouped = values.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)
+    return grouped.sum(min_count=0).reset_index()
+
+
+def _restore_categories(cells, template):
+    """
+    Give categorical dimensions the categories of template after a concat may have dropped them.
+    """
+    for col in CUBE_DIMENSIONS:
+        if isinstance(template[col].dtype, pd.CategoricalDtype) and not isinstance(cells[col].dtype, pd.CategoricalDtype):
+            cells[col] = cells[col].astype('category')
+    return cells
+
+
+def build_rollup_cube(df):
+    """
+    Aggregate the cleaned data to month x acctype x district x compbrand cells. Returns None
+    when df lacks one of the dimensions; measures that are missing are left out.
+    """
+    columns = set(df.columns.str.strip().str.lower())
+    if not set(CUBE_DIMENSIONS) <= columns:
+        return None
+    measures = [measure for measure in CUBE_MEASURES if measure in columns]
+    return RollupCube(_aggregate(_cube_frame(df, measures), measures), measures)
+
+
+def cube_paths(base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Where the cube of a table is stored, next to the table's snapshot: (cells, metadata).
+    """
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', f"{base_id}__{table_name}")
+    return (
+        os.path.join(snapshot_dir, f"{slug}.cube.parquet"),
+        os.path.join(snapshot_dir, f"{slug}.cube.json"),
+    )
+
+
+def save_cube(cube, base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    data_path, meta_path = cube_paths(base_id, table_name, snapshot_dir)
+
+    # Write to temporary files first so an interrupted save never leaves a torn cube
+    cube.cells.to_parquet(data_path + '.tmp', index=False)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump({'measures': cube.measures, 'watermark': cube.watermark}, f, indent=2)
+    os.replace(data_path + '.tmp', data_path)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def load_cube(base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Load a stored cube, or None if there is none (or it cannot be read).
+    """
+    data_path, meta_path = cube_paths(base_id, table_name, snapshot_dir)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path) as f:
+            metadata = json.load(f)
+        return RollupCube(pd.read_parquet(data_path), metadata['measures'], metadata['watermark'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def update_rollup_cube(sync, clean, df_cleaned, base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Bring the stored cube in line with a snapshot sync and return it.
+
+    When the stored cube belongs to the previous sync, only the months that had records added,
+    updated or deleted are re-aggregated; otherwise (first load, or out of step) the cube is
+    rebuilt. Returns None when the data has no cube dimensions.
+    """
+    cube = None if sync.full_reload else load_cube(base_id, table_name, snapshot_dir)
+
+    if cube is not None and cube.watermark == watermark_stamp(sync.previous_watermark):
+        months = set()
+        for frame in (clean_changed_rows(sync.added, clean, sync.frame.columns),
+                      clean_changed_rows(sync.removed, clean, sync.frame.columns)):
+            if frame is not None:
+                months.update(pd.to_datetime(frame['month'], errors='coerce').dropna().unique())
+        if months:
+            cube = cube.rebuild_months(df_cleaned, sorted(months))
+        # Guard against a cube drifting from the data, e.g. after a snapshot was edited
+        if cube.cells['rows'].sum() != len(df_cleaned):
+            cube = None
+    else:
+        cube = None
+
+    if cube is None:
+        cube = build_rollup_cube(df_cleaned)
+        if cube is None:
+            return None
+    cube.watermark = watermark_stamp(sync.watermark)
+    save_cube(cube, base_id, table_name, snapshot_dir)
+    return cube
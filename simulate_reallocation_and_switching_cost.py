@@ -1,97 +1,171 @@
 import pandas as pd
 import altair as alt
+from scipy import stats
 import streamlit as st
-import statsmodels.api as sm
-from inference import generate_inference  # Importing the inference function
+from dataclasses import dataclass
+from inference import request_inference, run_inferences  # Importing the inference functions
+from regression import STRATEGY_COLUMNS, STRATEGY_FORMULA, fit_overall_regression, prepare_regression_data
+from bootstrap import BOOTSTRAP_REPLICATES, CONFIDENCE_LEVEL, bootstrap_ols
+from fixed_effects import CLUSTER_COLUMN
+from model_registry import MODEL_REGISTRY
+
+REALLOCATION_PERCENTAGE = 0.50  # 50% of strategy3's budget
+SWITCHING_COST_PERCENTAGE = 0.10  # 10% reduction due to switching costs
+
+
+@dataclass
+class EfficiencyResult:
+    strategy1: float
+    strategy2: float
+    strategy3: float
+
+    def table(self):
+        return pd.DataFrame({
+            'Strategy': ['Strategy 1', 'Strategy 2', 'Strategy 3'],
+            'Efficiency (Sales per Dollar Spent)': [self.strategy1, self.strategy2, self.strategy3]
+        })
+
+    def summary(self):
+        return self.table().describe().to_dict()
+
+
+@dataclass
+class SimulatedSalesResult:
+    new_total_sales: float
+    chart_data: pd.DataFrame  # 'Strategy' and 'Sales' for Strategy 1, Strategy 2 and Total
+
+    def summary(self):
+        return self.chart_data.describe().to_dict()
+
+
+@dataclass
+class MarginalImpactResult:
+    coefficients: dict  # Strategy -> regression coefficient
+    average_spending: dict  # Strategy -> mean spending
+    ami: dict  # Strategy -> average marginal impact
+    intervals: pd.DataFrame = None  # Intervals of coefficients and AMIs, if computed
+    interval_method: str = None  # How the intervals were obtained
+    fixed_effects: tuple = ()  # Fixed effects absorbed by the regression
+
+    def summary(self):
+        summary = {f'AMI Strategy {i}': self.ami[strategy] for i, strategy in enumerate(STRATEGY_COLUMNS, 1)}
+        if self.intervals is not None:
+            for i, strategy in enumerate(STRATEGY_COLUMNS, 1):
+                interval = self.intervals.loc[('AMI', strategy)]
+                summary[f'AMI Strategy {i} {CONFIDENCE_LEVEL:.0%} CI'] = (interval['lower'], interval['upper'])
+        return summary
+
+
+@dataclass
+class ReallocationSimulationResult:
+    efficiency: EfficiencyResult
+    reallocation: SimulatedSalesResult
+    switching: SimulatedSalesResult
+    ami: MarginalImpactResult
+
+    def summary(self):
+        return {
+            'Efficiency': self.efficiency.summary(),
+            'Strategy Reallocation': self.reallocation.summary(),
+            'Switching Costs': self.switching.summary(),
+            'Average Marginal Impact': self.ami.summary(),
+        }
+
+
+def _strategy_sales_shares(df):
+    """
+    Sales attributed to each strategy in proportion to its share of the total strategy value.
+    """
+    total_strategy = df['strategy1'] + df['strategy2'] + df['strategy3']
+    return [(df['sales'] * (df[strategy] / total_strategy)).sum() for strategy in STRATEGY_COLUMNS]
 
 
-def calculate_efficiency(df):
+def compute_efficiency(df):
     """
     Calculate the efficiency of each strategy in terms of sales per unit spent.
     Efficiency = (Total Sales from Strategy) / (Total Spending on Strategy)
     """
     # Total spending for each strategy is the sum of the strategy values
-    total_spending_strategy1 = df['strategy1'].sum()
-    total_spending_strategy2 = df['strategy2'].sum()
-    total_spending_strategy3 = df['strategy3'].sum()
+    total_spending = [df[strategy].sum() for strategy in STRATEGY_COLUMNS]
 
     # Sales from each strategy is calculated as the contribution from each strategy directly
-    total_sales_strategy1 = df['sales'] * (df['strategy1'] / (df['strategy1'] + df['strategy2'] + df['strategy3']))
-    total_sales_strategy2 = df['sales'] * (df['strategy2'] / (df['strategy1'] + df['strategy2'] + df['strategy3']))
-    total_sales_strategy3 = df['sales'] * (df['strategy3'] / (df['strategy1'] + df['strategy2'] + df['strategy3']))
-
-    # Summing up the total sales for each strategy
-    total_sales_strategy1 = total_sales_strategy1.sum()
-    total_sales_strategy2 = total_sales_strategy2.sum()
-    total_sales_strategy3 = total_sales_strategy3.sum()
+    total_sales = _strategy_sales_shares(df)
 
     # Calculate efficiency: sales per dollar spent
-    efficiency_strategy1 = total_sales_strategy1 / total_spending_strategy1
-    efficiency_strategy2 = total_sales_strategy2 / total_spending_strategy2
-    efficiency_strategy3 = total_sales_strategy3 / total_spending_strategy3
+    return EfficiencyResult(*[sales / spending for sales, spending in zip(total_sales, total_spending)])
 
-    # Display the results
-    st.write(f"Efficiency of Strategy 1 (Sales per Dollar Spent): ${efficiency_strategy1:,.2f}")
-    st.write(f"Efficiency of Strategy 2 (Sales per Dollar Spent): ${efficiency_strategy2:,.2f}")
-    st.write(f"Efficiency of Strategy 3 (Sales per Dollar Spent): ${efficiency_strategy3:,.2f}")
 
-    return efficiency_strategy1, efficiency_strategy2, efficiency_strategy3
+def render_efficiency(result):
+    """
+    Display the efficiency of each strategy.
+    """
+    st.write(f"Efficiency of Strategy 1 (Sales per Dollar Spent): ${result.strategy1:,.2f}")
+    st.write(f"Efficiency of Strategy 2 (Sales per Dollar Spent): ${result.strategy2:,.2f}")
+    st.write(f"Efficiency of Strategy 3 (Sales per Dollar Spent): ${result.strategy3:,.2f}")
 
-def display_efficiency_table(df):
+
+def calculate_efficiency(df):
     """
-    Display the calculated efficiency scores of each strategy in a table.
+    Calculate the efficiency of each strategy in terms of sales per unit spent.
+    Efficiency = (Total Sales from Strategy) / (Total Spending on Strategy)
     """
-    efficiency_strategy1, efficiency_strategy2, efficiency_strategy3 = calculate_efficiency(df)
+    result = compute_efficiency(df)
+    render_efficiency(result)
+    return result.strategy1, result.strategy2, result.strategy3
 
-    efficiency_data = {
-        'Strategy': ['Strategy 1', 'Strategy 2', 'Strategy 3'],
-        'Efficiency (Sales per Dollar Spent)': [
-            efficiency_strategy1,
-            efficiency_strategy2,
-            efficiency_strategy3
-        ]
-    }
 
-    efficiency_df = pd.DataFrame(efficiency_data)
+def render_efficiency_table(result):
+    """
+    Display the calculated efficiency scores of each strategy in a table.
+    """
+    render_efficiency(result)
 
     # Display the efficiency table
     st.subheader("Efficiency of Each Strategy")
-    st.table(efficiency_df)
+    st.table(result.table())
 
     # Generate inference using OpenAI based on the efficiency data
-    efficiency_summary = efficiency_df.describe().to_dict()
-    inference_result = generate_inference(efficiency_summary, "Efficiency Analysis")  # Added analysis type
-    st.write(f"Inference: {inference_result}")
+    return [request_inference(result.summary(), "Efficiency Analysis")]  # Added analysis type
 
-def simulate_strategy_reallocation(df):
+
+def display_efficiency_table(df):
     """
-    Simulate reallocating resources from the least efficient strategy (Strategy 3) to the more efficient ones.
+    Display the calculated efficiency scores of each strategy in a table.
     """
-    efficiency_strategy1, efficiency_strategy2, efficiency_strategy3 = calculate_efficiency(df)
+    run_inferences(render_efficiency_table(compute_efficiency(df)))
 
-    reallocation_percentage = 0.50  # 50% of strategy3's budget
-    spending_reallocated = df['strategy3'].sum() * reallocation_percentage
+
+def compute_strategy_reallocation(df, efficiency):
+    """
+    Simulate reallocating resources from the least efficient strategy (Strategy 3) to the more efficient ones.
+    """
+    spending_reallocated = df['strategy3'].sum() * REALLOCATION_PERCENTAGE
     spending_to_strategy1 = spending_reallocated / 2
     spending_to_strategy2 = spending_reallocated / 2
 
     new_total_spending_strategy1 = df['strategy1'].sum() + spending_to_strategy1
     new_total_spending_strategy2 = df['strategy2'].sum() + spending_to_strategy2
 
-    new_sales_strategy1 = new_total_spending_strategy1 * efficiency_strategy1
-    new_sales_strategy2 = new_total_spending_strategy2 * efficiency_strategy2
+    new_sales_strategy1 = new_total_spending_strategy1 * efficiency.strategy1
+    new_sales_strategy2 = new_total_spending_strategy2 * efficiency.strategy2
 
     # Summing the new sales values to get the total
     new_total_sales = new_sales_strategy1 + new_sales_strategy2
 
-    # Display the results
-    st.write(f"New Total Sales after Reallocation: ${new_total_sales:,.2f}")
-
     reallocation_chart = pd.DataFrame({
         'Strategy': ['Strategy 1', 'Strategy 2', 'Total'],
         'Sales': [new_sales_strategy1, new_sales_strategy2, new_total_sales]
     })
+    return SimulatedSalesResult(new_total_sales, reallocation_chart)
+
+
+def render_strategy_reallocation(result):
+    """
+    Display the sales after reallocating Strategy 3's budget.
+    """
+    st.write(f"New Total Sales after Reallocation: ${result.new_total_sales:,.2f}")
 
-    chart = alt.Chart(reallocation_chart).mark_bar().encode(
+    chart = alt.Chart(result.chart_data).mark_bar().encode(
         x='Strategy',
         y='Sales',
         color='Strategy'
@@ -100,37 +174,38 @@ def simulate_strategy_reallocation(df):
     st.altair_chart(chart)
 
     # Generate inference based on the reallocation result
-    reallocation_summary = reallocation_chart.describe().to_dict()
-    inference_result = generate_inference(reallocation_summary, "Strategy Reallocation")  # Added analysis type
-    st.write(f"Inference: {inference_result}")
+    return [request_inference(result.summary(), "Strategy Reallocation")]  # Added analysis type
 
-def simulate_switching_costs(df, efficiency_strategy1, efficiency_strategy2, efficiency_strategy3):
+
+def simulate_strategy_reallocation(df):
+    """
+    Simulate reallocating resources from the least efficient strategy (Strategy 3) to the more efficient ones.
+    """
+    efficiency = compute_efficiency(df)
+    render_efficiency(efficiency)
+    run_inferences(render_strategy_reallocation(compute_strategy_reallocation(df, efficiency)))
+
+
+def compute_switching_costs(df, efficiency):
     """
     Simulate switching costs when reallocating resources between strategies.
     Adjust the impact of switching costs to reflect a more meaningful portion of the budget.
     """
-    reallocation_percentage = 0.50  # Percentage of strategy3's budget to be reallocated
-    switching_cost_percentage = 0.10  # 10% reduction due to switching costs
-
     # Calculate the total reallocated spending from strategy 3
-    spending_reallocated = df['strategy3'].sum() * reallocation_percentage
+    spending_reallocated = df['strategy3'].sum() * REALLOCATION_PERCENTAGE
     reallocated_to_strategy1 = spending_reallocated / 2
     reallocated_to_strategy2 = spending_reallocated / 2
 
     # Adjust efficiencies after applying the switching cost penalty
-    adjusted_efficiency_strategy1 = efficiency_strategy1 * (1 - switching_cost_percentage)
-    adjusted_efficiency_strategy2 = efficiency_strategy2 * (1 - switching_cost_percentage)
+    adjusted_efficiency_strategy1 = efficiency.strategy1 * (1 - SWITCHING_COST_PERCENTAGE)
+    adjusted_efficiency_strategy2 = efficiency.strategy2 * (1 - SWITCHING_COST_PERCENTAGE)
 
     # Calculate new sales for strategy 1 and strategy 2 after reallocating from strategy 3
     new_sales_strategy1_after_switching = adjusted_efficiency_strategy1 * reallocated_to_strategy1
     new_sales_strategy2_after_switching = adjusted_efficiency_strategy2 * reallocated_to_strategy2
 
     # Add back the existing total sales for strategy 1 and strategy 2
-    total_sales_strategy1 = df['sales'] * (df['strategy1'] / (df['strategy1'] + df['strategy2'] + df['strategy3']))
-    total_sales_strategy2 = df['sales'] * (df['strategy2'] / (df['strategy1'] + df['strategy2'] + df['strategy3']))
-
-    total_sales_strategy1 = total_sales_strategy1.sum()
-    total_sales_strategy2 = total_sales_strategy2.sum()
+    total_sales_strategy1, total_sales_strategy2, _ = _strategy_sales_shares(df)
 
     # Recalculate total sales after switching costs
     new_total_sales_after_switching = (
@@ -139,16 +214,21 @@ def simulate_switching_costs(df, efficiency_strategy1, efficiency_strategy2, eff
         total_sales_strategy1 + total_sales_strategy2
     )
 
-    # Display the results
-    st.write(f"New Total Sales after Switching Costs: ${new_total_sales_after_switching:,.2f}")
-
-    # Plot the switching cost impact in a bar chart
     switching_cost_chart = pd.DataFrame({
         'Strategy': ['Strategy 1', 'Strategy 2', 'Total'],
         'Sales': [new_sales_strategy1_after_switching, new_sales_strategy2_after_switching, new_total_sales_after_switching]
     })
+    return SimulatedSalesResult(new_total_sales_after_switching, switching_cost_chart)
+
+
+def render_switching_costs(result):
+    """
+    Display the sales after switching costs.
+    """
+    st.write(f"New Total Sales after Switching Costs: ${result.new_total_sales:,.2f}")
 
-    chart = alt.Chart(switching_cost_chart).mark_bar().encode(
+    # Plot the switching cost impact in a bar chart
+    chart = alt.Chart(result.chart_data).mark_bar().encode(
         x='Strategy',
         y='Sales',
         color='Strategy'
@@ -157,79 +237,149 @@ def simulate_switching_costs(df, efficiency_strategy1, efficiency_strategy2, eff
     st.altair_chart(chart)
 
     # Generate inference based on the switching costs result
-    switching_summary = switching_cost_chart.describe().to_dict()
-    inference_result = generate_inference(switching_summary, "Switching Costs")  # Added analysis type
-    st.write(f"Inference: {inference_result}")
+    return [request_inference(result.summary(), "Switching Costs")]  # Added analysis type
 
 
-def calculate_average_marginal_impact(df):
+def simulate_switching_costs(df, efficiency_strategy1, efficiency_strategy2, efficiency_strategy3):
     """
-    Calculate the Average Marginal Impact (AMI) for each strategy.
-    This function includes the regression calculation directly.
+    Simulate switching costs when reallocating resources between strategies.
+    Adjust the impact of switching costs to reflect a more meaningful portion of the budget.
     """
-    st.header("Average Marginal Impact (AMI) Calculation")
+    efficiency = EfficiencyResult(efficiency_strategy1, efficiency_strategy2, efficiency_strategy3)
+    run_inferences(render_switching_costs(compute_switching_costs(df, efficiency)))
 
-    # Ensure 'sales' and strategy columns are numeric
-    df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
-    df['strategy1'] = pd.to_numeric(df['strategy1'], errors='coerce')
-    df['strategy2'] = pd.to_numeric(df['strategy2'], errors='coerce')
-    df['strategy3'] = pd.to_numeric(df['strategy3'], errors='coerce')
 
-    # Drop rows with missing values in these columns
-    df = df.dropna(subset=['sales', 'strategy1', 'strategy2', 'strategy3'])
-
-    # Run the regression
-    X = df[['strategy1', 'strategy2', 'strategy3']]
-    X = sm.add_constant(X)  # Adds a constant term for the regression
-    y = df['sales']
+def _clustered_intervals(fit, average_spending, confidence=CONFIDENCE_LEVEL):
+    """
+    Intervals of the coefficients and AMIs of a fixed-effects fit from its clustered standard errors,
+    in the layout of bootstrap.BootstrapResult.intervals.
+    """
+    critical = stats.t.ppf(1 - (1 - confidence) / 2, fit.df_resid.iloc[0])
+    rows = []
+    for kind, factor in (('coefficient', 1.0), ('AMI', pd.Series(average_spending))):
+        estimates = fit.params.iloc[0] * factor
+        errors = fit.bse.iloc[0] * factor
+        for term in STRATEGY_COLUMNS:
+            rows.append({
+                'kind': kind,
+                'term': term,
+                'estimate': estimates[term],
+                'std err': errors[term],
+                'lower': estimates[term] - critical * errors[term],
+                'upper': estimates[term] + critical * errors[term],
+            })
+    return pd.DataFrame(rows).set_index(['kind', 'term'])
+
+
+def compute_average_marginal_impact(df, n_bootstrap=BOOTSTRAP_REPLICATES, fixed_effects=()):
+    """
+    Calculate the Average Marginal Impact (AMI) for each strategy.
+    The overall strategy regression is shared with the other analyses through the model registry.
+    With n_bootstrap > 0 and an 'accid' column, confidence intervals for the coefficients and
+    AMIs come from an account-clustered bootstrap.
+    With fixed_effects (e.g. ('accid',)) the coefficients come from the fixed-effects regression
+    and the intervals from its account-clustered standard errors.
+    """
+    fixed_effects = tuple(fixed_effects)
+    if fixed_effects:
+        fit = MODEL_REGISTRY.fit_fixed_effects(df, STRATEGY_FORMULA, fixed_effects)
+        params = fit.params.iloc[0]
+        # Spending over the rows the fixed-effects regression used
+        extra_columns = list(dict.fromkeys(fixed_effects + (CLUSTER_COLUMN,)))
+        exog_means = prepare_regression_data(df, extra_columns).dropna(subset=extra_columns)[STRATEGY_COLUMNS].mean()
+    else:
+        model = fit_overall_regression(df)
+        params, exog_means = model.params, model.exog_means
+
+    coefficients, average_spending, ami = {}, {}, {}
+    for strategy in STRATEGY_COLUMNS:
+        # Extract coefficients from the regression model
+        coefficients[strategy] = params[strategy]
+
+        # Average spending for each strategy over the rows used in the regression
+        average_spending[strategy] = exog_means[strategy]
+
+        # Calculate the Average Marginal Impact (AMI) for each strategy
+        ami[strategy] = coefficients[strategy] * average_spending[strategy]
+
+    intervals, interval_method = None, None
+    if fixed_effects:
+        intervals = _clustered_intervals(fit, average_spending)
+        interval_method = f"standard errors clustered by {CLUSTER_COLUMN}"
+    elif n_bootstrap and 'accid' in df.columns.str.strip().str.lower():
+        intervals = bootstrap_ols(df, STRATEGY_FORMULA, cluster='accid', n_replicates=n_bootstrap).intervals()
+        interval_method = "account-clustered bootstrap"
+
+    return MarginalImpactResult(coefficients, average_spending, ami, intervals, interval_method, fixed_effects)
+
+
+def render_average_marginal_impact(result):
+    """
+    Display the Average Marginal Impact (AMI) for each strategy.
+    """
+    st.header("Average Marginal Impact (AMI) Calculation")
+    if result.fixed_effects:
+        st.caption(f"Coefficients from the regression with fixed effects: {', '.join(result.fixed_effects)}")
 
-    # Fit the regression model
-    model = sm.OLS(y, X).fit()
+    # Display the results
+    for i, strategy in enumerate(STRATEGY_COLUMNS, 1):
+        st.write(f"**Average Marginal Impact of Strategy {i}:** ${result.ami[strategy]:,.2f}")
 
-    # Extract coefficients from the regression model
-    coeff_strategy1 = model.params['strategy1']
-    coeff_strategy2 = model.params['strategy2']
-    coeff_strategy3 = model.params['strategy3']
+    # Uncertainty of the estimates
+    if result.intervals is not None:
+        st.subheader(f"{CONFIDENCE_LEVEL:.0%} Confidence Intervals ({result.interval_method})")
+        st.dataframe(result.intervals)
 
-    # Calculate the average spending for each strategy
-    average_spending_strategy1 = df['strategy1'].mean()
-    average_spending_strategy2 = df['strategy2'].mean()
-    average_spending_strategy3 = df['strategy3'].mean()
+    # Generate inference based on AMI calculation
+    return [request_inference(result.summary(), "Average Marginal Impact")]  # Added analysis type
 
-    # Calculate the Average Marginal Impact (AMI) for each strategy
-    ami_strategy1 = coeff_strategy1 * average_spending_strategy1
-    ami_strategy2 = coeff_strategy2 * average_spending_strategy2
-    ami_strategy3 = coeff_strategy3 * average_spending_strategy3
 
-    # Display the results
-    st.write(f"**Average Marginal Impact of Strategy 1:** ${ami_strategy1:,.2f}")
-    st.write(f"**Average Marginal Impact of Strategy 2:** ${ami_strategy2:,.2f}")
-    st.write(f"**Average Marginal Impact of Strategy 3:** ${ami_strategy3:,.2f}")
+def calculate_average_marginal_impact(df, fixed_effects=()):
+    """
+    Calculate the Average Marginal Impact (AMI) for each strategy.
+    """
+    result = compute_average_marginal_impact(df, fixed_effects=fixed_effects)
+    run_inferences(render_average_marginal_impact(result))
+    return result.summary()
 
-    # Generate inference based on AMI calculation
-    ami_summary = {
-        'AMI Strategy 1': ami_strategy1,
-        'AMI Strategy 2': ami_strategy2,
-        'AMI Strategy 3': ami_strategy3
-    }
-    inference_result = generate_inference(ami_summary, "Average Marginal Impact")  # Added analysis type
-    st.write(f"Inference: {inference_result}")
 
-    return ami_strategy1, ami_strategy2, ami_strategy3
+def compute_reallocation_and_switching_costs(df):
+    """
+    Compute the efficiency, reallocation, switching cost and AMI analyses in one go.
+    """
+    efficiency = compute_efficiency(df)
+    return ReallocationSimulationResult(
+        efficiency=efficiency,
+        reallocation=compute_strategy_reallocation(df, efficiency),
+        switching=compute_switching_costs(df, efficiency),
+        ami=compute_average_marginal_impact(df),
+    )
 
 
-def simulate_reallocation_and_switching_costs(df, model):
+def render_reallocation_and_switching_costs(result):
+    """
+    Display the strategy reallocation and switching cost simulation.
+    """
     st.header("Simulate Strategy Reallocation and Switching Costs")
-    
+
     # Display Efficiency Table First
-    display_efficiency_table(df)
-    
+    inference_requests = render_efficiency_table(result.efficiency)
+
     st.subheader("1. Strategy Reallocation")
-    simulate_strategy_reallocation(df)
-    
+    render_efficiency(result.efficiency)
+    inference_requests += render_strategy_reallocation(result.reallocation)
+
     st.subheader("2. Switching Costs Impact")
-    efficiency_strategy1, efficiency_strategy2, efficiency_strategy3 = calculate_efficiency(df)
-    simulate_switching_costs(df, efficiency_strategy1, efficiency_strategy2, efficiency_strategy3)
+    render_efficiency(result.efficiency)
+    inference_requests += render_switching_costs(result.switching)
 
     st.subheader("3. Average Marginal Impact (AMI) of Each Strategy")
-    calculate_average_marginal_impact(df)
+    inference_requests += render_average_marginal_impact(result.ami)
+
+    return inference_requests
+
+
+def simulate_reallocation_and_switching_costs(df, model=None):
+    result = compute_reallocation_and_switching_costs(df)
+    run_inferences(render_reallocation_and_switching_costs(result))
+    return result.summary()
@@ -0,0 +1,189 @@
+# snapshot_cache.py
+
+import json
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from airtable_loader import AIRTABLE_API_URL, fetch_table_frame
+
+SNAPSHOT_DIR = '.airtable_snapshots'
+RECORD_ID_COLUMN = '_record_id'
+
+# Records modified this close to the previous sync are fetched again, to absorb clock skew
+WATERMARK_SKEW = timedelta(minutes=5)
+
+# Snapshots not checked for deleted records for this long are checked on the next sync
+DELETION_CHECK_MAX_AGE = timedelta(hours=24)
+
+# frame: merged table; added: new versions of created/updated records;
+# removed: previous versions of updated/deleted records (both include RECORD_ID_COLUMN);
+# previous_watermark: watermark of the snapshot the changes were applied to (None on a full reload);
+# deletions_checked: when the snapshot was last checked for deleted records (None if never)
+SyncResult = namedtuple('SyncResult', ['frame', 'added', 'removed', 'full_reload', 'watermark',
+                                       'previous_watermark', 'deletions_checked'])
+
+
+def snapshot_paths(base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Return the (data, metadata) file paths of the snapshot for a (base_id, table_name) pair.
+    """
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', f"{base_id}__{table_name}")
+    return (
+        os.path.join(snapshot_dir, f"{slug}.parquet"),
+        os.path.join(snapshot_dir, f"{slug}.json"),
+    )
+
+
+def load_snapshot(base_id, table_name, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Load a stored snapshot and its metadata, or (None, None) if there is none.
+    """
+    data_path, meta_path = snapshot_paths(base_id, table_name, snapshot_dir)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None, None
+
+    with open(meta_path) as f:
+        metadata = json.load(f)
+    return pd.read_parquet(data_path), metadata
+
+
+def save_snapshot(df, base_id, table_name, watermark, snapshot_dir=SNAPSHOT_DIR, write_data=True,
+                  deletions_checked=None):
+    """
+    Write the snapshot as Parquet plus a small JSON metadata file holding the watermark (and when
+    the snapshot was last checked for deleted records). With write_data=False only the metadata
+    is refreshed (nothing changed since the last sync).
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    data_path, meta_path = snapshot_paths(base_id, table_name, snapshot_dir)
+
+    # Write to temporary files first so an interrupted sync never leaves a torn snapshot
+    if write_data:
+        df.to_parquet(data_path + '.tmp', index=False)
+    metadata = {
+        'base_id': base_id,
+        'table_name': table_name,
+        'watermark': watermark.isoformat(),
+        'row_count': len(df),
+        'deletions_checked': deletions_checked.isoformat() if deletions_checked is not None else None,
+    }
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    if write_data:
+        os.replace(data_path + '.tmp', data_path)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+def modified_since_formula(watermark):
+    """
+    Airtable formula selecting records created or modified after the watermark.
+    """
+    stamp = watermark.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    return (
+        f"OR(IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE('{stamp}')), "
+        f"IS_AFTER(CREATED_TIME(), DATETIME_PARSE('{stamp}')))"
+    )
+
+
+def watermark_stamp(watermark):
+    """
+    The watermark of a sync as stored with derived data (ISO format), or None.
+    """
+    return None if watermark is None else watermark.isoformat()
+
+
+def clean_changed_rows(frame, clean, columns=None):
+    """
+    Changed rows of a sync (SyncResult.added or .removed) cleaned like the table, or None.
+    Airtable leaves empty fields out of its records, so the rows are first given every column
+    of the merged table (columns, e.g. SyncResult.frame.columns), with the fields they lack missing.
+    """
+    if frame is None or frame.empty:
+        return None
+    if columns is not None:
+        frame = frame.reindex(columns=columns)
+    return clean(frame.drop(columns=[RECORD_ID_COLUMN], errors='ignore'))
+
+
+def _with_record_ids(frame):
+    """
+    The fetched frame, with an (empty) record ID column even when no records came back.
+    """
+    if RECORD_ID_COLUMN not in frame.columns:
+        frame = frame.assign(**{RECORD_ID_COLUMN: pd.Series(index=frame.index, dtype=object)})
+    return frame
+
+
+def sync_table(api_token, base_id, table_name, snapshot_dir=SNAPSHOT_DIR, detect_deletions=False,
+               max_workers=4, on_progress=None, api_url=AIRTABLE_API_URL,
+               deletion_check_max_age=DELETION_CHECK_MAX_AGE):
+    """
+    Bring the local snapshot of an Airtable table up to date and return the merged table.
+
+    Without a snapshot the whole table is downloaded. Otherwise only records modified since
+    the stored watermark are fetched and merged by record ID. Deleted records cannot be seen
+    that way: an ID-only scan of the whole table (one request per 100 records) drops the
+    records that no longer exist in Airtable. It is run when detect_deletions is set, and
+    otherwise only when the snapshot was last checked more than deletion_check_max_age ago
+    (None to check on demand only), so deleted records do not linger indefinitely.
+
+    Returns:
+    SyncResult with the merged frame and the rows that changed
+    """
+    sync_started = datetime.now(timezone.utc)
+    snapshot, metadata = load_snapshot(base_id, table_name, snapshot_dir)
+
+    # Snapshots without record IDs cannot be merged into, so they are replaced
+    if snapshot is None or RECORD_ID_COLUMN not in snapshot.columns:
+        frame = _with_record_ids(fetch_table_frame(
+            api_token, base_id, table_name, max_workers=max_workers,
+            record_id_column=RECORD_ID_COLUMN, on_progress=on_progress, api_url=api_url
+        ))
+        watermark = sync_started - WATERMARK_SKEW
+        save_snapshot(frame, base_id, table_name, watermark, snapshot_dir, deletions_checked=sync_started)
+        return SyncResult(frame, frame, frame.iloc[:0], True, watermark, None, sync_started)
+
+    # Fetch only what changed since the previous sync (usually a handful of pages)
+    previous_watermark = datetime.fromisoformat(metadata['watermark'])
+    added = _with_record_ids(fetch_table_frame(
+        api_token, base_id, table_name, max_workers=1,
+        partitions=[modified_since_formula(previous_watermark)],
+        record_id_column=RECORD_ID_COLUMN, on_progress=on_progress, api_url=api_url
+    ))
+
+    snapshot_ids = snapshot[RECORD_ID_COLUMN]
+    stale = pd.Series(False, index=snapshot.index)
+    if not added.empty:
+        stale |= snapshot_ids.isin(added[RECORD_ID_COLUMN])
+
+    deletions_checked = metadata.get('deletions_checked')
+    deletions_checked = datetime.fromisoformat(deletions_checked) if deletions_checked else None
+    if deletion_check_max_age is not None and (
+            deletions_checked is None or sync_started - deletions_checked > deletion_check_max_age):
+        detect_deletions = True
+    if detect_deletions:
+        # Only the record IDs (plus one field, which Airtable requires) are downloaded here
+        probe_fields = [col for col in snapshot.columns if col != RECORD_ID_COLUMN][:1]
+        live = _with_record_ids(fetch_table_frame(
+            api_token, base_id, table_name, max_workers=max_workers, fields=probe_fields,
+            record_id_column=RECORD_ID_COLUMN, api_url=api_url
+        ))
+        stale |= ~snapshot_ids.isin(live[RECORD_ID_COLUMN])
+        deletions_checked = sync_started
+
+    removed = snapshot[stale]
+    frame = snapshot[~stale].reset_index(drop=True)
+    if not added.empty:
+        frame = pd.concat([frame, added], ignore_index=True, sort=False)
+
+    watermark = sync_started - WATERMARK_SKEW
+    changed = not added.empty or not removed.empty
+    save_snapshot(frame, base_id, table_name, watermark, snapshot_dir, write_data=changed,
+                  deletions_checked=deletions_checked)
+
+    return SyncResult(frame, added, removed, False, watermark, previous_watermark, deletions_checked)
@@ -0,0 +1,221 @@
+import os
+import numbers
+import numpy as np
+import pandas as pd
+
+# Approximate number of prompt tokens a data summary may take (about 4 characters per token)
+SUMMARY_TOKEN_BUDGET = int(os.environ.get('SUMMARY_TOKEN_BUDGET', '600'))
+CHARS_PER_TOKEN = 4
+
+# Detail levels tried in turn until the summary fits the budget: the number of
+# correlation pairs, trend points, table rows or mapping entries shown
+DETAIL_LEVELS = (24, 12, 8, 5, 3)
+
+QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+QUANTILE_LABELS = ['min', 'p25', 'median', 'p75', 'max']
+
+
+def estimate_tokens(text):
+    """
+    Rough token count of a piece of text.
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def format_value(value):
+    """
+    Format a scalar compactly: 4 significant digits, thousands separators for large
+    numbers and dates without a time of day.
+    """
+    if value is None:
+        return 'n/a'
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value))
+    if isinstance(value, numbers.Integral):
+        return f"{int(value):,}"
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if np.isnan(value):
+            return 'n/a'
+        if abs(value) >= 1000:
+            return f"{value:,.0f}"
+        return f"{value:.4g}"
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        value = pd.Timestamp(value)
+        if pd.isna(value):
+            return 'n/a'
+        if value == value.normalize():
+            return value.strftime('%Y-%m') if value.day == 1 else value.strftime('%Y-%m-%d')
+        return value.strftime('%Y-%m-%d %H:%M')
+    return str(value)
+
+
+def _is_time_index(index):
+    return isinstance(index, (pd.DatetimeIndex, pd.PeriodIndex))
+
+
+def _is_correlation_matrix(df):
+    if df.shape[0] < 2 or df.shape[0] != df.shape[1] or not df.index.equals(df.columns):
+        return False
+    values = df.to_numpy(dtype=float, na_value=np.nan)
+    finite = values[~np.isnan(values)]
+    return finite.size > 0 and np.all(np.abs(finite) <= 1 + 1e-9)
+
+
+def _encode_correlations(df, max_items):
+    """
+    The strongest off-diagonal pairs of a correlation matrix, strongest first.
+    """
+    values = df.to_numpy(dtype=float, na_value=np.nan)
+    rows, cols = np.triu_indices_from(values, k=1)
+    pairs = values[rows, cols]
+    keep = ~np.isnan(pairs)
+    rows, cols, pairs = rows[keep], cols[keep], pairs[keep]
+
+    # Sort on |r|, breaking ties by position so the output is stable
+    order = np.lexsort((cols, rows, -np.abs(pairs)))[:max_items]
+    lines = [f"strongest {len(order)} of {len(pairs)} pairs:"]
+    lines += [f"{df.index[rows[i]]}~{df.columns[cols[i]]}: {format_value(pairs[i])}" for i in order]
+    return '\n'.join(lines)
+
+
+def _time_series_frame(df):
+    """
+    Index a frame by its only datetime column, or return None when it has not exactly one.
+    """
+    if _is_time_index(df.index):
+        return df
+    time_columns = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    if len(time_columns) != 1:
+        return None
+    return df.set_index(time_columns[0]).sort_index()
+
+
+def _encode_trend(series, max_items):
+    """
+    A time series as overall statistics plus evenly spaced points, first and last included.
+    """
+    series = series.dropna()
+    if series.empty:
+        return 'no data'
+    n = len(series)
+    start, end = series.iloc[0], series.iloc[-1]
+    parts = [
+        f"{n} points from {format_value(series.index[0])} to {format_value(series.index[-1])}",
+        f"start {format_value(start)}, end {format_value(end)}"
+        + (f" ({(end - start) / abs(start):+.1%})" if start else ''),
+        f"mean {format_value(series.mean())}, min {format_value(series.min())} ({format_value(series.idxmin())}),"
+        f" max {format_value(series.max())} ({format_value(series.idxmax())})",
+    ]
+    positions = np.unique(np.linspace(0, n - 1, min(n, max_items)).round().astype(int))
+    parts.append('points: ' + ', '.join(
+        f"{format_value(series.index[i])}={format_value(series.iloc[i])}" for i in positions
+    ))
+    return '\n'.join(parts)
+
+
+def _encode_distribution(series):
+    """
+    Key quantiles and mean of a numeric series, or the most frequent values otherwise.
+    """
+    series = series.dropna()
+    if series.empty:
+        return 'no data'
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        quantiles = series.quantile(QUANTILES).to_numpy()
+        stats = [f"{label}={format_value(value)}" for label, value in zip(QUANTILE_LABELS, quantiles)]
+        return f"n={len(series):,}, mean={format_value(series.mean())}, " + ', '.join(stats)
+    counts = series.value_counts().head(5)
+    return f"n={len(series):,}, top: " + ', '.join(f"{value} ({count:,})" for value, count in counts.items())
+
+
+def _encode_frame(df, max_items):
+    if df.empty:
+        return 'no data'
+    if _is_correlation_matrix(df):
+        return _encode_correlations(df, max_items)
+
+    trend = _time_series_frame(df)
+    if trend is not None:
+        numeric = trend.select_dtypes('number')
+        blocks = [f"{col}:\n{_encode_trend(numeric[col], max_items)}" for col in numeric.columns[:max_items]]
+        if blocks:
+            return '\n'.join(blocks)
+
+    if len(df) <= max_items:
+        # Small tables are shown row by row, labelled unless the index is just a row number
+        labelled = not isinstance(df.index, pd.RangeIndex)
+        return '\n'.join(
+            (f"{label}: " if labelled else '')
+            + ', '.join(f"{col}={format_value(value)}" for col, value in row.items())
+            for label, row in df.iterrows()
+        )
+
+    lines = [f"{len(df):,} rows"]
+    lines += [f"{col}: {_encode_distribution(df[col])}" for col in df.columns[:max_items]]
+    if len(df.columns) > max_items:
+        lines.append(f"... ({len(df.columns) - max_items} more columns)")
+    return '\n'.join(lines)
+
+
+def _encode_series(series, max_items):
+    if series.empty:
+        return 'no data'
+    if _is_time_index(series.index):
+        return _encode_trend(series, max_items)
+    if len(series) <= max_items:
+        return ', '.join(f"{key}={format_value(value)}" for key, value in series.items())
+    return _encode_distribution(series)
+
+
+def _indent(text):
+    return '\n'.join('  ' + line for line in text.split('\n'))
+
+
+def _encode(obj, max_items):
+    if isinstance(obj, pd.DataFrame):
+        return _encode_frame(obj, max_items)
+    if isinstance(obj, pd.Series):
+        return _encode_series(obj, max_items)
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        lines = []
+        for key, value in items[:max_items]:
+            text = _encode(value, max_items)
+            lines.append(f"{key}:\n{_indent(text)}" if '\n' in text else f"{key}: {text}")
+        if len(items) > max_items:
+            lines.append(f"... ({len(items) - max_items} more)")
+        return '\n'.join(lines)
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        items = list(obj)
+        text = ', '.join(_encode(item, max_items) for item in items[:max_items])
+        if len(items) > max_items:
+            text += f", ... ({len(items) - max_items} more)"
+        return text
+    return format_value(obj)
+
+
+def encode_summary(data_summary, token_budget=None):
+    """
+    Encode an analysis summary (DataFrame, Series, dict, list or scalar) as compact,
+    deterministic text for a prompt.
+
+    Correlation matrices are reduced to their strongest pairs, time series to a few evenly
+    spaced points plus overall statistics and large tables to key quantiles. Detail is
+    lowered until the text fits token_budget (SUMMARY_TOKEN_BUDGET by default).
+    """
+    if token_budget is None:
+        token_budget = SUMMARY_TOKEN_BUDGET
+    if isinstance(data_summary, str):
+        text = data_summary
+    else:
+        for max_items in DETAIL_LEVELS:
+            text = _encode(data_summary, max_items)
+            if estimate_tokens(text) <= token_budget:
+                return text
+
+    # Still too long at the lowest detail level: cut it off
+    max_chars = token_budget * CHARS_PER_TOKEN
+    if len(text) > max_chars:
+        text = text[:max_chars - 4].rstrip() + ' ...'
+    return text
@@ -0,0 +1,123 @@
+# stub_airtable.py
+
+import json
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from airtable_loader import RECORD_ID_ALPHABET
+
+
+class StubAirtable:
+    """
+    Stand-in for the Airtable REST API on a local port. Serves one table from a list of records
+    with offset pagination. filterByFormula is applied when it is a record ID partition
+    (REGEX_MATCH(RECORD_ID(), ...)) or mapped to record IDs in `formulas`; any other formula is
+    answered with 422, like Airtable answers formulas it cannot evaluate. The first
+    `rate_limited` requests are answered with 429 and `retry_after` as their Retry-After header.
+    """
+
+    def __init__(self, records, rate_limited=0, retry_after=None):
+        self.records = list(records)
+        self.formulas = {}
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v0"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _matches(self, formula):
+        """
+        Predicate on record IDs selecting the records of a formula, or None when it is not understood.
+        """
+        if formula is None:
+            return lambda record_id: True
+        if formula in self.formulas:
+            return self.formulas[formula].__contains__
+        partition = re.fullmatch(r"REGEX_MATCH\(RECORD_ID\(\), '(.*)'\)", formula)
+        if partition:
+            return re.compile(partition.group(1)).search
+        return None
+
+    def _page(self, query, matches):
+        records = [record for record in self.records if matches(record['id'])]
+        fields = query.get('fields[]')
+        if fields:
+            records = [dict(record, fields={name: value for name, value in record['fields'].items() if name in fields})
+                       for record in records]
+
+        start = int(query.get('offset', ['0'])[0])
+        size = int(query.get('pageSize', ['100'])[0])
+        payload = {'records': records[start:start + size]}
+        if start + size < len(records):
+            payload['offset'] = str(start + size)
+        return payload
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                matches = stub._matches(query.get('filterByFormula', [None])[0])
+                with stub._lock:
+                    stub.requests.append(query)
+                    limited = stub.rate_limited > 0
+                    if limited:
+                        stub.rate_limited -= 1
+                if limited:
+                    self.send_response(429)
+                    if stub.retry_after is not None:
+                        self.send_header('Retry-After', stub.retry_after)
+                    self.end_headers()
+                    return
+                if matches is None:
+                    self.send_response(422)
+                    self.end_headers()
+                    return
+                body = json.dumps(stub._page(query, matches)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def make_records(n, start=0):
+    """
+    n records with Airtable-like IDs (spread over the record ID partitions) and a few fields.
+    """
+    return [
+        {'id': f"rec{RECORD_ID_ALPHABET[i % len(RECORD_ID_ALPHABET)]}{i:013d}",
+         'fields': {'accid': f"A{i % 7}", 'sales': float(i)}}
+        for i in range(start, start + n)
+    ]
+
+
+def http_date(seconds_from_now=0):
+    """
+    An HTTP-date (as in a Retry-After header) the given number of seconds from now.
+    """
+    return formatdate(time.time() + seconds_from_now, usegmt=True)
@@ -0,0 +1,57 @@
+import time
+
+from airtable_loader import _retry_delay, fetch_table_frame, record_id_partitions
+from stub_airtable import StubAirtable, http_date, make_records
+
+
+def test_paginates_single_chain():
+    records = make_records(250)
+    with StubAirtable(records) as stub:
+        frame = fetch_table_frame('token', 'app1', 'Sales', partitions=[None], record_id_column='_id', api_url=stub.url)
+    assert len(stub.requests) == 3
+    assert frame['_id'].tolist() == [record['id'] for record in records]
+    assert frame['sales'].tolist() == [float(i) for i in range(250)]
+
+
+def test_merges_partitions_without_duplicates():
+    records = make_records(300)
+    partitions = record_id_partitions(4)
+    with StubAirtable(records) as stub:
+        frame = fetch_table_frame('token', 'app1', 'Sales', max_workers=4, record_id_column='_id', api_url=stub.url)
+    # One page per partition, each filtered to its slice of the record IDs
+    assert sorted(query['filterByFormula'][0] for query in stub.requests) == sorted(partitions)
+    assert len(frame) == 300
+    assert not frame['_id'].duplicated().any()
+    assert sorted(frame['_id']) == sorted(record['id'] for record in records)
+    assert sorted(frame['sales']) == [float(i) for i in range(300)]
+
+
+def test_drops_record_ids_unless_asked():
+    with StubAirtable(make_records(40)) as stub:
+        frame = fetch_table_frame('token', 'app1', 'Sales', max_workers=2, page_size=7, api_url=stub.url)
+    assert list(frame.columns) == ['accid', 'sales']
+    assert sorted(frame['sales']) == [float(i) for i in range(40)]
+
+
+def test_retries_rate_limits_with_http_date():
+    with StubAirtable(make_records(5), rate_limited=2, retry_after=http_date(-60)) as stub:
+        started = time.monotonic()
+        frame = fetch_table_frame('token', 'app1', 'Sales', partitions=[None], api_url=stub.url, backoff=0.01)
+    assert len(stub.requests) == 3
+    assert len(frame) == 5
+    assert time.monotonic() - started < 5
+
+
+def test_retries_rate_limits_with_seconds():
+    with StubAirtable(make_records(5), rate_limited=1, retry_after='0') as stub:
+        frame = fetch_table_frame('token', 'app1', 'Sales', partitions=[None], api_url=stub.url, backoff=0.01)
+    assert len(stub.requests) == 2
+    assert len(frame) == 5
+
+
+def test_retry_delay():
+    assert _retry_delay('2.5', 1.0) == 2.5
+    assert _retry_delay(None, 1.0) == 1.0
+    assert _retry_delay('not a date', 1.0) == 1.0
+    assert _retry_delay(http_date(-10), 1.0) == 0.0
+    assert 25 < _retry_delay(http_date(30), 1.0) <= 30
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import arima_models
+from arima_models import (_FitTimeout, SeriesModel, candidate_orders, differencing_order, forecast, neighbour_orders,
+                          select_model, starting_orders, time_limit)
+from time_series_analysis import compute_time_series
+
+
+def test_time_limit_interrupts_in_the_main_thread():
+    started = time.monotonic()
+    with pytest.raises(_FitTimeout):
+        with time_limit(1):
+            while time.monotonic() - started < 5:
+                pass
+    assert time.monotonic() - started < 2
+
+
+def test_time_limit_warns_when_it_cannot_be_enforced():
+    caught = []
+
+    def run():
+        with pytest.warns(RuntimeWarning, match="cannot be enforced"):
+            with time_limit(1):
+                pass
+        caught.append(True)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert caught == [True]
+
+
+def test_differencing_order_is_chosen_by_a_unit_root_test():
+    rng = np.random.default_rng(0)
+    assert differencing_order(rng.normal(0, 1, 60)) == 0
+    assert differencing_order(np.cumsum(rng.normal(0, 1, 60)) + np.arange(60)) == 1
+    assert differencing_order(np.full(60, 3.0)) == 0
+
+
+def test_candidates_share_the_differencing_order():
+    for d in (0, 1):
+        candidates = candidate_orders(48, 12, d)
+        assert {order[1] for order, _ in candidates} == {d}
+        assert set(starting_orders(48, 12, d)) <= set(candidates)
+    # Seasonal terms need two full periods
+    assert {seasonal for _, seasonal in candidate_orders(20, 12, 0)} == {(0, 0, 0, 0)}
+
+
+def test_neighbour_orders_are_one_step_away():
+    neighbours = neighbour_orders((1, 0, 1), (0, 0, 0, 0), 48, 12, 1)
+    assert ((1, 1, 1), (0, 0, 0, 0)) in neighbours
+    for order, seasonal_order in neighbours:
+        assert order[1] == 1
+        assert abs(order[0] - 1) + abs(order[2] - 1) + seasonal_order[0] <= 1
+    assert len(neighbours) == 6
+
+
+def test_select_model_refuses_to_compare_across_differencing_orders():
+    fit = (10.0, 12.0, {}, 1.0, 0.5)
+    with pytest.raises(ValueError):
+        select_model([(((1, 0, 0), (0, 0, 0, 0)), fit), (((1, 1, 0), (0, 0, 0, 0)), fit)])
+    better = (5.0, 30.0, {}, 1.0, 0.5)
+    fits = [(((1, 0, 0), (0, 0, 0, 0)), fit), (((2, 0, 0), (0, 0, 0, 0)), better), (((0, 0, 0), (0, 0, 0, 0)), None)]
+    assert select_model(fits, 'aic')[0] == (2, 0, 0)
+    assert select_model(fits, 'bic')[0] == (1, 0, 0)
+
+
+def test_forecast_is_bound_by_the_time_limit(monkeypatch):
+    model = SeriesModel((1, 0, 0), (0, 0, 0, 0), {'const': 0.0, 'ar.L1': 0.5, 'sigma2': 1.0}, 'aic', 0.0, 1.0, 0.5,
+                        1, '2024-12')
+    index = pd.date_range('2022-01-01', periods=36, freq='MS')
+    assert len(forecast(np.ones(36), index, model, 12, timeout=5)) == 12
+
+    def slow_series(values, index):
+        time.sleep(5)
+
+    monkeypatch.setattr(arima_models, '_series', slow_series)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        forecast(np.ones(36), index, model, 12, timeout=1)
+    assert time.monotonic() - started < 3
+
+
+def test_every_series_is_forecast_in_the_pool():
+    rng = np.random.default_rng(0)
+    months = pd.date_range('2021-01-01', periods=36, freq='MS')
+    df = pd.DataFrame({
+        'month': np.repeat(months, 2),
+        'acctype': ['Clinic', 'Hospital'] * 36,
+        'sales': rng.gamma(5.0, 100.0, 72) + np.tile([0.0, 500.0], 36),
+    })
+    result = compute_time_series(df, grain=('acctype',), max_workers=2, timeout=30)
+    assert [series.name for series in result.series] == ['Hospital', 'Clinic']
+    for series in result.series:
+        assert series.error is None
+        assert len(series.forecast) == 12
+        assert series.forecast.index[0] == pd.Timestamp('2024-01-01')
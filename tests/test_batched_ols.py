@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+from batched_ols import fit_grouped_ols
+
+
+def _panel(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'acctype': rng.choice(['Clinic', 'Hospital', 'Pharmacy'], n),
+        'district': rng.choice(['North', 'South'], n),
+        'strategy1': rng.gamma(2.0, 50.0, n),
+        'strategy2': rng.gamma(2.0, 30.0, n),
+        'strategy3': rng.gamma(2.0, 10.0, n),
+    })
+    df['sales'] = 200 + 1.5 * df['strategy1'] + 0.8 * df['strategy2'] - 0.3 * df['strategy3'] + rng.normal(0, 40, n)
+    df.loc[rng.choice(n, 10, replace=False), 'strategy2'] = np.nan
+    return df
+
+
+def test_grouped_ols_matches_statsmodels_per_segment():
+    df = _panel()
+    regressors = ['strategy1', 'strategy2', 'strategy3']
+    fit = fit_grouped_ols(df, 'sales', regressors, by=['acctype', 'district'])
+
+    assert len(fit.keys) == 6 and not fit.errors
+    for position, key in enumerate(fit.keys):
+        segment = df[(df['acctype'] == key[0]) & (df['district'] == key[1])]
+        expected = smf.ols('sales ~ strategy1 + strategy2 + strategy3', data=segment).fit()
+        names = ['Intercept'] + regressors
+        np.testing.assert_allclose(fit.params.loc[key].to_numpy(), expected.params[names].to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(fit.bse.loc[key].to_numpy(), expected.bse[names].to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(fit.pvalues.loc[key].to_numpy(), expected.pvalues[names].to_numpy(),
+                                   rtol=1e-6, atol=1e-12)
+        assert abs(fit.rsquared.loc[key] - expected.rsquared) < 1e-10
+        assert fit.nobs.loc[key] == expected.nobs
+        assert len(fit.segment_data(position)) == expected.nobs
+
+
+def test_grouped_ols_reports_segments_too_small_to_fit():
+    df = _panel(n=200).dropna()
+    df.iloc[:3, df.columns.get_loc('acctype')] = 'Tiny'
+    fit = fit_grouped_ols(df, 'sales', ['strategy1', 'strategy2', 'strategy3'], by=['acctype'])
+    assert list(fit.errors) == ['Tiny']
@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+
+from bootstrap import bootstrap_ols
+
+
+def test_replicates_do_not_depend_on_the_worker_processes():
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({'accid': rng.integers(0, 150, n), 'strategy1': rng.gamma(2.0, 50.0, n)})
+    df['sales'] = 100 + 2.0 * df['strategy1'] + rng.normal(0, 30, n)
+
+    inline = bootstrap_ols(df, 'sales ~ strategy1', n_replicates=60, max_workers=1)
+    pooled = bootstrap_ols(df, 'sales ~ strategy1', n_replicates=60, max_workers=2)
+    pd.testing.assert_frame_equal(inline.params, pooled.params)
+    assert len(pooled.params) == 60
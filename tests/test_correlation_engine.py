@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import (NUMERIC_BINS, grouped_correlations, identifier_columns, mixed_correlation_matrix,
+                                pearson_matrix)
+from eda import calculate_cramers_v, compute_correlation_matrix
+
+
+def panel(n_accounts=300, n_months=36, seed=0):
+    """
+    One row per account and month, with account attributes that never change.
+    """
+    rng = np.random.default_rng(seed)
+    accounts = pd.DataFrame({
+        'accid': [f'ACC{i:04d}' for i in range(n_accounts)],
+        'acctype': rng.choice(['Hospital', 'Clinic', 'Pharmacy'], n_accounts),
+        'accsize': rng.integers(1, 5, n_accounts),
+        'district': rng.choice([f'D{i}' for i in range(8)], n_accounts),
+    })
+    months = pd.date_range('2021-01-01', periods=n_months, freq='MS')
+    df = accounts.merge(pd.DataFrame({'month': months}), how='cross')
+    df['sales'] = rng.gamma(2.0, 500.0, len(df))
+    df['strategy1'] = rng.gamma(2.0, 50.0, len(df))
+    return df
+
+
+def test_account_ids_are_identifiers_in_panel_data():
+    df = panel()
+    result = compute_correlation_matrix(df)
+    assert 'accid' in result.excluded
+    assert 'accid' not in result.matrix.columns
+    assert {'acctype', 'district', 'sales'} <= set(result.matrix.columns)
+
+
+def test_identifier_cardinality_is_measured_per_period():
+    df = panel(n_accounts=120, n_months=12)
+    categorical = ['accid', 'acctype', 'district']
+    # 120 accounts over 1,440 rows: not one value per row, but one per account each month
+    assert identifier_columns(df, categorical) == []
+    assert identifier_columns(df, categorical, periods=df['month']) == ['accid']
+
+
+def mixed_frame(n=600, seed=1):
+    """
+    Numeric columns with missing values, and categorical columns including a two-level one.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'sales': rng.gamma(2.0, 500.0, n),
+        'qty': rng.integers(1, 30, n).astype(float),
+        'strategy1': rng.normal(100.0, 20.0, n),
+        'acctype': pd.Categorical(rng.choice(['Clinic', 'Hospital', 'Pharmacy'], n)),
+        'segment': pd.Categorical(rng.choice(['A', 'B'], n)),
+        'district': pd.Categorical(rng.choice([f'D{i}' for i in range(6)], n)),
+    })
+    df['strategy1'] += 0.02 * df['sales']
+    for col, share in (('sales', 0.1), ('qty', 0.05), ('acctype', 0.08)):
+        df.loc[rng.random(n) < share, col] = np.nan
+    return df
+
+
+def test_pearson_matrix_matches_dataframe_corr():
+    df = mixed_frame()[['sales', 'qty', 'strategy1']].assign(constant=1.0)
+    expected = df.corr()
+    np.testing.assert_allclose(pearson_matrix(df.to_numpy()), expected.to_numpy(), rtol=0, atol=1e-12)
+
+    complete = df.dropna()
+    np.testing.assert_allclose(pearson_matrix(complete.to_numpy()), complete.corr().to_numpy(), rtol=0, atol=1e-12)
+
+
+def test_mixed_matrix_matches_pairwise_statistics():
+    df = mixed_frame()
+    categorical = ['acctype', 'segment', 'district']
+    matrix = mixed_correlation_matrix(df, categorical)
+
+    numeric = ['sales', 'qty', 'strategy1']
+    np.testing.assert_allclose(matrix.loc[numeric, numeric].to_numpy(), df[numeric].corr().to_numpy(), rtol=0, atol=1e-12)
+
+    # Cramér's V wherever a categorical column is involved (with Yates' correction on the 2x2 table
+    # of 'segment' with itself); 'qty' has few enough levels to be used as is, while 'sales' is cut
+    # into quantile bins first
+    for x in categorical:
+        for y in categorical + ['qty']:
+            assert matrix.loc[x, y] == pytest.approx(calculate_cramers_v(df[x], df[y]), abs=1e-12)
+            assert matrix.loc[y, x] == matrix.loc[x, y]
+        binned = pd.qcut(df['sales'], NUMERIC_BINS, labels=False, duplicates='drop')
+        assert matrix.loc[x, 'sales'] == pytest.approx(calculate_cramers_v(df[x], binned), abs=1e-12)
+
+
+def test_sparse_counts_give_the_same_matrix():
+    df = mixed_frame()
+    categorical = ['acctype', 'segment', 'district']
+    dense = mixed_correlation_matrix(df, categorical)
+    sparse = mixed_correlation_matrix(df, categorical, memory_limit=0)
+    np.testing.assert_allclose(sparse.to_numpy(), dense.to_numpy(), rtol=0, atol=1e-12)
+
+
+def test_grouped_correlations_match_groupby_apply():
+    rng = np.random.default_rng(2)
+    n = 500
+    df = pd.DataFrame({
+        'acctype': rng.choice(['Clinic', 'Hospital', 'Pharmacy', None], n, p=[0.4, 0.35, 0.2, 0.05]),
+        'district': rng.integers(1, 5, n),
+        'sales': rng.gamma(2.0, 500.0, n),
+        'strategy1': rng.normal(100.0, 20.0, n),
+        'strategy2': rng.normal(50.0, 10.0, n),
+    })
+    df['strategy1'] += 0.05 * df['sales']
+    df.loc[rng.random(n) < 0.1, 'strategy2'] = np.nan
+    # A group with a single row, whose correlations are undefined
+    df.loc[n] = ['Mobile', 1, 100.0, 10.0, 5.0]
+    pairs = [('sales', 'strategy1'), ('sales', 'strategy2'), ('strategy1', 'strategy2')]
+
+    for by in ('acctype', ['acctype', 'district']):
+        result = grouped_correlations(df, by, pairs)
+        expected = df.groupby(by)[['sales', 'strategy1', 'strategy2']].apply(lambda g: g.corr())
+        assert len(result) == df.groupby(by).ngroups
+        for key in result.index:
+            for x, y in pairs:
+                value = expected.loc[key if isinstance(key, tuple) else (key,)].loc[x, y]
+                np.testing.assert_allclose(result.loc[key, (x, y)], value, rtol=0, atol=1e-12)
+        single = result.index.get_level_values(0) == 'Mobile'
+        assert single.sum() == 1 and result[single].isna().all(axis=None)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cleaning import CLEANING_SCHEMA, ColumnSpec, clean_data
+
+
+def _raw(n=6):
+    return pd.DataFrame({
+        'Unnamed: 0': range(n),
+        ' Month ': ['2024-01-01', '2024-02-01', 'not a date', '2024-03-01', '2024-03-01', '2024-04-01'][:n],
+        'accid': [101, 102, 103, 101, 102, 103][:n],
+        'acctype': ['Clinic', 'Hospital', 'Clinic', 'Clinic', 'Hospital', 'Clinic'][:n],
+        'district': ['1', '2', '2', '1', '2', '3'][:n],
+        'sales': [1200.0, 3400.7, 560.0, 980.0, 2200.0, 150.0][:n],
+        'qty': ['3', '4.5', None, 'x', '7', '2'][:n],
+        'strategy1': [10.5, np.nan, 3.25, 4.0, 5.0, 6.0][:n],
+        'notes': ['a', 'b', 'c', 'd', 'e', 'f'][:n],
+    })
+
+
+def test_clean_data_converts_dtypes_and_drops_rows():
+    df = clean_data(_raw())
+
+    assert list(df.columns) == ['month', 'accid', 'acctype', 'district', 'sales', 'qty', 'strategy1', 'notes']
+    # Rows whose 'qty' is missing or unparseable are dropped
+    assert list(df.index) == [0, 1, 4, 5]
+    assert df['month'].dtype == 'datetime64[ns]'
+    assert isinstance(df['accid'].dtype, pd.CategoricalDtype)
+    assert list(df['accid'].cat.categories) == ['101', '102', '103']
+    assert df['district'].dtype == np.int32
+    assert df['sales'].tolist() == [1200, 3400, 2200, 150]
+    # Not integral, so 'qty' stays a float; float32 holds these values exactly
+    assert df['qty'].dtype == np.float32
+    assert df['strategy1'].isna().tolist() == [False, True, False, False]
+    assert df['notes'].tolist() == ['a', 'b', 'e', 'f']
+
+
+def test_unparseable_months_are_filled():
+    df = clean_data(_raw().assign(qty='1'))
+    assert df['month'].iloc[2] == pd.Timestamp('1970-01-01')
+    assert df['qty'].dtype == np.int32
+
+
+def test_memory_usage_is_reported():
+    raw = _raw()
+    df = clean_data(raw)
+    usage = df.attrs['memory_usage']
+    assert usage['before'] == raw.memory_usage(deep=True).sum()
+    assert usage['after'] == df.memory_usage(deep=True).sum()
+    assert usage['after'] < usage['before']
+
+
+def test_missing_values_are_rejected_or_kept_as_missing():
+    with pytest.raises(ValueError, match="'sales'"):
+        clean_data(_raw().assign(sales=[1.0, np.nan, 2.0, 3.0, 4.0, 5.0]))
+
+    schema = dict(CLEANING_SCHEMA, sales=ColumnSpec('int'))
+    df = clean_data(_raw().assign(qty='1', sales=[1.0, np.nan, 2.0, 3.0, 4.0, 5.0]), schema)
+    assert df['sales'].dtype == 'Int32'
+    assert df['sales'].isna().tolist() == [False, True, False, False, False, False]
+    assert df['sales'].sum() == 15
+
+
+def test_missing_month_column_is_an_error():
+    with pytest.raises(KeyError):
+        clean_data(_raw().drop(columns=' Month '))
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+from event_study import REFERENCE_PERIOD, compute_event_study, detect_entries, entry_months
+
+
+def _panel(n_accounts=300, n_months=30, effect=-300.0, always_exposed=0, seed=0):
+    """
+    Monthly sales of accounts, about half of which see a competitor enter at a random month.
+    The last always_exposed accounts have competitors from the start, and their sales keep
+    falling as the competitors gain ground.
+    """
+    rng = np.random.default_rng(seed)
+    months = pd.date_range('2021-01-01', periods=n_months, freq='MS')
+    account = np.repeat(np.arange(n_accounts), n_months)
+    t = np.tile(np.arange(n_months), n_accounts)
+    entry = np.where(rng.random(n_accounts) < 0.5, rng.integers(3, n_months - 3, n_accounts), n_months + 1)
+    exposed = np.arange(n_accounts) >= n_accounts - always_exposed
+    entry[exposed] = n_months + 1
+    after = t >= entry[account]
+    compbrand = after.astype(int) + exposed[account].astype(int) * (1 + (t >= n_months // 2))
+    sales = (rng.normal(5000, 800, n_accounts)[account] + 20 * t + effect * after
+             - 30 * t * exposed[account] + rng.normal(0, 150, len(account)))
+    return pd.DataFrame({'accid': [f"A{a}" for a in account], 'month': months[t], 'compbrand': compbrand, 'sales': sales})
+
+
+def test_detect_entries_flags_accounts_exposed_from_the_start():
+    account = np.array([0, 0, 0, 1, 1, 1, 2, 2])
+    month = np.array([0, 1, 2, 0, 1, 2, 1, 2])
+    compbrand = np.array([0, 0, 1, 1, 1, 2, 0, 0], dtype=float)
+    entry_month, entry_rows, always_exposed = detect_entries(account, month, compbrand, 3)
+    assert entry_month.tolist() == [2, -1, -1]
+    assert entry_rows.tolist() == [2]
+    assert always_exposed.tolist() == [False, True, False]
+
+
+def test_effects_match_a_dummy_variable_regression():
+    df = _panel(n_accounts=120, n_months=24)
+    result = compute_event_study(df, window=(-3, 4))
+
+    # The same regression with explicit account and month dummies
+    data = df.assign(month_number=df['month'].dt.year * 12 + df['month'].dt.month)
+    entry = data[data['compbrand'] > data.groupby('accid')['compbrand'].shift()].groupby('accid')['month_number'].min()
+    relative = (data['month_number'] - data['accid'].map(entry)).clip(-3, 4)
+    names = []
+    for period in range(-3, 5):
+        if period != REFERENCE_PERIOD:
+            name = f"event_m{-period}" if period < 0 else f"event_{period}"
+            data[name] = (relative == period).astype(float)
+            names.append(name)
+    expected = smf.ols(f"sales ~ {' + '.join(names)} + C(accid) + C(month_number)", data=data).fit()
+
+    estimated = result.effects.drop(index=REFERENCE_PERIOD)['estimate'].to_numpy()
+    np.testing.assert_allclose(estimated, expected.params[names].to_numpy(), rtol=1e-6, atol=1e-6)
+
+
+def test_accounts_exposed_from_the_start_are_not_controls():
+    df = _panel(always_exposed=100, seed=1)
+    result = compute_event_study(df)
+
+    assert result.n_always_exposed == 100
+    assert result.n_accounts == 300 - 100
+    assert not set(result.events['accid']) & {f"A{a}" for a in range(200, 300)}
+    post = result.averages.loc['post']
+    assert post['lower'] < -300 < post['upper']
+    assert abs(result.averages.loc['pre', 'estimate']) < 50
+
+
+def test_entry_months_ignore_accounts_exposed_from_the_start():
+    df = _panel(always_exposed=250, seed=2)
+    # The exposed accounts' second competitor arrives in the middle month, which is no entry
+    assert '2022-04' not in entry_months(df, top=1)
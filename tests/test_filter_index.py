@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from account_clustering import CLUSTER_COLUMN
+from filter_index import FILTER_COLUMNS, build_filter_index, month_range, normalize_filters
+
+
+def _rows(n=1003, seed=0):
+    # A row count that is not a multiple of 8, so the packed bitmaps end in a partial byte
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'District': rng.integers(1, 5, n),
+        'acctype': pd.Categorical(rng.choice(['Clinic', 'Hospital', 'Pharmacy'], n)),
+        'month': pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 6, n) * 31, 'D'),
+        'sales': rng.gamma(2.0, 500.0, n),
+    }, index=pd.RangeIndex(100, 100 + n))
+
+
+def test_mask_matches_boolean_filtering():
+    df = _rows()
+    index = build_filter_index(df)
+    assert set(index.bitmaps) == {'district', 'acctype', 'month'}
+
+    filters = {'district': (1, 3), 'acctype': ('Clinic', 'Hospital')}
+    expected = df['District'].isin([1, 3]) & df['acctype'].isin(['Clinic', 'Hospital'])
+    np.testing.assert_array_equal(index.mask(filters), expected.to_numpy())
+    pd.testing.assert_frame_equal(index.select(df, filters), df[expected])
+
+
+def test_unknown_values_select_nothing_and_no_filters_select_everything():
+    df = _rows()
+    index = build_filter_index(df)
+    assert not index.mask({'acctype': ('Mobile',)}).any()
+    assert index.mask({}) is None
+    assert index.select(df, {}) is df
+
+
+def test_values_are_sorted():
+    index = build_filter_index(_rows())
+    assert index.values('district') == [1, 2, 3, 4]
+    assert index.values('acctype') == ['Clinic', 'Hospital', 'Pharmacy']
+    assert index.values('compbrand') == []
+
+
+def test_clusters_are_a_filter_column():
+    assert CLUSTER_COLUMN in FILTER_COLUMNS
+    df = _rows().assign(**{CLUSTER_COLUMN: lambda frame: pd.array(frame['District'] % 2 + 1, dtype='Int64')})
+    index = build_filter_index(df)
+    np.testing.assert_array_equal(index.mask({CLUSTER_COLUMN: (2,)}), (df[CLUSTER_COLUMN] == 2).to_numpy())
+
+
+def test_normalize_filters():
+    filters = {'district': [3, 1], 'acctype': [], 'month': None, 'compbrand': (2, 0)}
+    normalized = normalize_filters(filters)
+    assert normalized == {'compbrand': (0, 2), 'district': (1, 3)}
+    assert list(normalized) == ['compbrand', 'district']
+    assert normalize_filters({'district': (1, 3), 'compbrand': [0, 2]}) == normalized
+
+
+def test_month_range_is_inclusive():
+    months = pd.date_range('2024-01-01', periods=6, freq='MS')
+    assert month_range(months, pd.Timestamp('2024-02-01'), pd.Timestamp('2024-04-01')) == list(months[1:4])
+    assert month_range(months, pd.Timestamp('2025-01-01'), pd.Timestamp('2025-06-01')) == []
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+from fixed_effects import fit_fixed_effects
+
+
+def _panel(n_accounts=40, n_months=12, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'accid': np.repeat([f"A{i}" for i in range(n_accounts)], n_months),
+        'month': np.tile(np.arange(n_months), n_accounts),
+    })
+    account_effect = rng.normal(0, 300, n_accounts)[np.repeat(np.arange(n_accounts), n_months)]
+    df['strategy1'] = rng.gamma(2.0, 50.0, len(df)) + account_effect / 10
+    df['strategy2'] = rng.gamma(2.0, 30.0, len(df))
+    df['sales'] = account_effect + 5 * df['month'] + 1.5 * df['strategy1'] + 0.7 * df['strategy2'] + rng.normal(0, 30, len(df))
+    # An unbalanced panel
+    return df.drop(index=rng.choice(len(df), 25, replace=False)).reset_index(drop=True)
+
+
+def _dummy_ols(df, formula):
+    return smf.ols(formula, data=df).fit(cov_type='cluster', cov_kwds={'groups': pd.factorize(df['accid'])[0],
+                                                                        'use_correction': False})
+
+
+def test_account_effects_match_dummy_regression():
+    df = _panel()
+    regressors = ['strategy1', 'strategy2']
+    fit = fit_fixed_effects(df, 'sales', regressors, absorb=('accid',))
+    expected = _dummy_ols(df, 'sales ~ strategy1 + strategy2 + C(accid)')
+
+    np.testing.assert_allclose(fit.params.iloc[0].to_numpy(), expected.params[regressors].to_numpy(), rtol=1e-9)
+    # Same clustered sandwich, with the small-sample correction counting only the regressors
+    n, g, k = len(df), df['accid'].nunique(), len(regressors)
+    correction = np.sqrt(g / (g - 1) * (n - 1) / (n - k))
+    np.testing.assert_allclose(fit.bse.iloc[0].to_numpy(), expected.bse[regressors].to_numpy() * correction, rtol=1e-7)
+    assert fit.df_resid.iloc[0] == g - 1
+
+
+def test_account_and_month_effects_match_dummy_regression():
+    df = _panel(seed=1)
+    regressors = ['strategy1', 'strategy2']
+    fit = fit_fixed_effects(df, 'sales', regressors, absorb=('accid', 'month'))
+    expected = _dummy_ols(df, 'sales ~ strategy1 + strategy2 + C(accid) + C(month)')
+
+    np.testing.assert_allclose(fit.params.iloc[0].to_numpy(), expected.params[regressors].to_numpy(), rtol=1e-8)
+    n, g, k = len(df), df['accid'].nunique(), len(regressors)
+    correction = np.sqrt(g / (g - 1) * (n - 1) / (n - k))
+    np.testing.assert_allclose(np.sqrt(np.diagonal(fit.cov_params[0])),
+                               expected.bse[regressors].to_numpy() * correction, rtol=1e-6)
+
+
+def test_segmented_fit_matches_per_segment_fits():
+    df = _panel(n_accounts=60, seed=2)
+    df['acctype'] = np.where(df['accid'].str[1:].astype(int) % 2 == 0, 'Clinic', 'Hospital')
+    fit = fit_fixed_effects(df, 'sales', ['strategy1'], absorb=('accid',), by=('acctype',))
+    for key in fit.keys:
+        single = fit_fixed_effects(df[df['acctype'] == key], 'sales', ['strategy1'], absorb=('accid',))
+        np.testing.assert_allclose(fit.params.loc[key].to_numpy(), single.params.iloc[0].to_numpy(), rtol=1e-10)
+        np.testing.assert_allclose(fit.bse.loc[key].to_numpy(), single.bse.iloc[0].to_numpy(), rtol=1e-10)
@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import statsmodels.formula.api as smf
+
+from data_cleaning import clean_data
+from incremental_ols import load_stats, save_stats, stats_path, sufficient_stats, update_model_stats
+from snapshot_cache import SyncResult
+
+FORMULA = 'sales ~ strategy1 + strategy2'
+
+
+def _rows(n, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'acctype': rng.choice(['Clinic', 'Hospital'], n),
+        'strategy1': rng.gamma(2.0, 50.0, n),
+        'strategy2': rng.gamma(2.0, 30.0, n),
+    })
+    df['sales'] = 100 + 2.0 * df['strategy1'] + 0.5 * df['strategy2'] + rng.normal(0, 25, n)
+    return df
+
+
+def test_update_equals_recomputing_on_the_new_data():
+    old = _rows(500, 0)
+    removed = old.iloc[:40]
+    added = _rows(60, 1).assign(acctype=lambda df: np.where(np.arange(60) < 5, 'Pharmacy', df['acctype']))
+    new = pd.concat([old.iloc[40:], added], ignore_index=True)
+
+    updated = sufficient_stats(old, FORMULA, ('acctype',)).update(added, removed)
+    expected = sufficient_stats(new, FORMULA, ('acctype',))
+
+    order = [updated.keys.index(key) for key in expected.keys]
+    np.testing.assert_allclose(updated.xtx[order], expected.xtx, rtol=1e-10)
+    np.testing.assert_allclose(updated.xty[order], expected.xty, rtol=1e-10)
+    np.testing.assert_allclose(updated.yty[order], expected.yty, rtol=1e-10)
+    np.testing.assert_array_equal(updated.nobs[order], expected.nobs)
+
+
+def test_fits_from_statistics_match_statsmodels(tmp_path):
+    df = _rows(800, 2)
+    path = str(tmp_path / 'model.ols.npz')
+    save_stats(sufficient_stats(df, FORMULA, ('acctype',)), path)
+    fit = load_stats(path).solve()
+
+    for key in fit.keys:
+        expected = smf.ols(FORMULA, data=df[df['acctype'] == key]).fit()
+        np.testing.assert_allclose(fit.params.loc[key].to_numpy(), expected.params.to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(fit.bse.loc[key].to_numpy(), expected.bse.to_numpy(), rtol=1e-7)
+        assert abs(fit.rsquared.loc[key] - expected.rsquared) < 1e-9
+
+    model = sufficient_stats(df, FORMULA).model_fit()
+    expected = smf.ols(FORMULA, data=df).fit()
+    np.testing.assert_allclose(model.params.to_numpy(), expected.params.to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(model.cov_params.to_numpy(), expected.cov_params().to_numpy(), rtol=1e-7)
+    assert model.nobs == expected.nobs
+
+
+def _raw_rows(n, seed):
+    rng = np.random.default_rng(seed)
+    df = _rows(n, seed)
+    return df.assign(month=rng.choice(['2024-01-01', '2024-02-01', '2024-03-01'], n),
+                     _record_id=[f'rec{seed}_{i}' for i in range(n)])
+
+
+def test_changes_without_a_field_update_the_statistics(tmp_path):
+    snapshot = _raw_rows(400, 0)
+    first = SyncResult(snapshot, snapshot, snapshot.iloc[:0], True, datetime(2024, 1, 1, tzinfo=timezone.utc),
+                       None, None)
+    update_model_stats(first, clean_data, clean_data(snapshot), 'base', 'table', [(FORMULA, ('acctype',))],
+                       snapshot_dir=str(tmp_path))
+
+    # Airtable leaves empty fields out, so none of the changed records has a 'strategy2' column
+    added = _raw_rows(30, 1).drop(columns='strategy2')
+    removed = snapshot.iloc[:20]
+    frame = pd.concat([snapshot.iloc[20:], added], ignore_index=True)
+    second = SyncResult(frame, added, removed, False, datetime(2024, 1, 2, tzinfo=timezone.utc),
+                        first.watermark, None)
+    df_cleaned = clean_data(frame)
+    updated = update_model_stats(second, clean_data, df_cleaned, 'base', 'table', [(FORMULA, ('acctype',))],
+                                 snapshot_dir=str(tmp_path))
+
+    assert updated == 1
+    stats = load_stats(stats_path('base', 'table', FORMULA, ('acctype',), str(tmp_path)))
+    expected = sufficient_stats(df_cleaned, FORMULA, ('acctype',))
+    order = [stats.keys.index(key) for key in expected.keys]
+    np.testing.assert_allclose(stats.xtx[order], expected.xtx, rtol=1e-10)
+    np.testing.assert_array_equal(stats.nobs[order], expected.nobs)
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from inference import InferenceRequest, _complete, build_prompt, dispatch_inferences
+from inference_cache import InferenceCache
+
+
+class StubClient:
+    """
+    Stand-in for the openai module: answers each prompt with a fixed text, optionally after a
+    delay, as one message or as a stream of chunks.
+    """
+
+    def __init__(self, answers, delays=None):
+        self.answers = answers
+        self.delays = delays or {}
+        self.calls = []
+        self._lock = threading.Lock()
+        self.ChatCompletion = self
+
+    def _answer(self, prompt):
+        for marker, answer in self.answers.items():
+            if marker in prompt:
+                return marker, answer
+        raise KeyError(prompt)
+
+    def create(self, model, messages, max_tokens, temperature, stream=False):
+        prompt = messages[-1]['content']
+        marker, answer = self._answer(prompt)
+        with self._lock:
+            self.calls.append((marker, stream))
+        time.sleep(self.delays.get(marker, 0))
+        if not stream:
+            return {'choices': [{'message': {'content': f" {answer} "}}]}
+        words = answer.split(' ')
+        pieces = [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+        return iter([{'choices': [{'delta': {'content': piece}}]} for piece in pieces] + [{'choices': []}])
+
+
+def _request(name):
+    return InferenceRequest({'metric': name}, name, None)
+
+
+def test_cache_hits_skip_the_client(tmp_path):
+    cache = InferenceCache(str(tmp_path / 'cache.sqlite3'))
+    client = StubClient({'Trend': 'Sales are rising.'})
+    prompt = build_prompt({'metric': 1}, 'Trend')
+
+    assert _complete(prompt, use_cache=True, client=client, cache=cache) == 'Sales are rising.'
+    assert _complete(prompt, use_cache=True, client=client, cache=cache) == 'Sales are rising.'
+    assert len(client.calls) == 1
+
+    # A cached answer is handed to a streaming caller in one piece
+    tokens = []
+    assert _complete(prompt, use_cache=True, client=client, cache=cache, on_token=tokens.append) == 'Sales are rising.'
+    assert tokens == ['Sales are rising.'] and len(client.calls) == 1
+
+    assert _complete(prompt, use_cache=False, client=client, cache=cache) == 'Sales are rising.'
+    assert len(client.calls) == 2
+
+
+def test_streaming_and_non_streaming_completions(tmp_path):
+    client = StubClient({'Trend': 'Sales are rising fast.'})
+    prompt = build_prompt({'metric': 1}, 'Trend')
+
+    tokens = []
+    assert _complete(prompt, use_cache=False, client=client, on_token=tokens.append) == 'Sales are rising fast.'
+    assert tokens == ['Sales', ' are', ' rising', ' fast.']
+    assert _complete(prompt, use_cache=False, client=client) == 'Sales are rising fast.'
+    assert client.calls == [('Trend', True), ('Trend', False)]
+
+
+def test_dispatch_is_concurrent_deduplicated_and_reported_on_the_calling_thread():
+    client = StubClient(
+        {'Slow': 'slow answer', 'Fast': 'fast answer', 'Medium': 'medium answer'},
+        delays={'Slow': 0.4, 'Medium': 0.2},
+    )
+    requests = [_request('Slow'), _request('Fast'), _request('Medium'), _request('Fast'),
+                InferenceRequest({}, 'Empty', None)]
+    results, threads = [], set()
+
+    def on_result(request, inference, error):
+        threads.add(threading.current_thread())
+        results.append((request.analysis_type, inference, error))
+
+    started = time.monotonic()
+    dispatch_inferences(requests, on_result, max_concurrency=3, use_cache=False, client=client)
+    elapsed = time.monotonic() - started
+
+    # Identical prompts are sent once, empty summaries not at all, and the slow prompts overlap
+    assert sorted(marker for marker, _ in client.calls) == ['Fast', 'Medium', 'Slow']
+    assert elapsed < 0.55
+    # Results arrive as the completions finish, every duplicate request gets its own callback
+    assert results == [('Fast', 'fast answer', None), ('Fast', 'fast answer', None),
+                       ('Medium', 'medium answer', None), ('Slow', 'slow answer', None)]
+    assert threads == {threading.current_thread()}
+
+
+def test_dispatch_streams_tokens_in_order_and_reports_errors():
+    client = StubClient({'Trend': 'one two three'})
+    requests = [_request('Trend'), _request('Missing')]
+    partial, results = {}, {}
+
+    def on_token(request, text):
+        partial.setdefault(request.analysis_type, []).append(text)
+
+    def on_result(request, inference, error):
+        results[request.analysis_type] = (inference, error)
+
+    dispatch_inferences(requests, on_result, use_cache=False, client=client, on_token=on_token)
+
+    assert partial['Trend'] == ['one', 'one two', 'one two three']
+    assert results['Trend'] == ('one two three', None)
+    assert results['Missing'][0] is None and isinstance(results['Missing'][1], KeyError)
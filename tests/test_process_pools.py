@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+SCRIPT = """
+import os
+import sys
+
+sys.path.insert(0, {root!r})
+from process_pools import process_pool
+
+if __name__ == '__main__':
+    with open(os.path.join({directory!r}, 'runs'), 'a') as f:
+        f.write(f'{{os.getpid()}}\\n')
+    with process_pool(2) as executor:
+        print(sorted(executor.map(abs, [-3, -1, -2])))
+"""
+
+
+def test_workers_do_not_run_the_guarded_main_script(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = tmp_path / 'entry.py'
+    script.write_text(SCRIPT.format(root=root, directory=str(tmp_path)))
+
+    output = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120, check=True)
+    assert output.stdout.strip() == '[1, 2, 3]'
+    assert len((tmp_path / 'runs').read_text().split()) == 1
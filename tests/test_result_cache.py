@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from result_cache import ResultCache, dataset_fingerprint
+
+
+def _frame(seed=0, n=100):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'accid': rng.integers(0, 10, n), 'sales': rng.gamma(2.0, 500.0, n)})
+
+
+def counted():
+    """
+    An analysis that counts its calls in its calls attribute.
+    """
+    def scaled_sales(df, scale=1):
+        scaled_sales.calls += 1
+        return df['sales'].to_numpy() * scale
+
+    scaled_sales.calls = 0
+    return scaled_sales
+
+
+def test_hits_and_misses_are_counted():
+    cache, compute, df = ResultCache(), counted(), _frame()
+    first = cache.compute(compute, df, scale=2)
+    second = cache.compute(compute, df, scale=2)
+    cache.compute(compute, df, scale=3)
+
+    assert second is first
+    assert compute.calls == 2
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+    assert stats['bytes'] == 2 * first.nbytes
+
+
+def test_changed_data_invalidates_by_fingerprint():
+    cache, compute, df = ResultCache(), counted(), _frame()
+    cache.compute(compute, df)
+    changed = df.copy()
+    changed.loc[0, 'sales'] += 1
+    assert dataset_fingerprint(changed) != dataset_fingerprint(df)
+    assert dataset_fingerprint(df.copy()) == dataset_fingerprint(df)
+
+    cache.compute(compute, changed)
+    cache.compute(compute, df.copy())
+    assert compute.calls == 2
+
+    # A given fingerprint is trusted as the cache key, so the data is not hashed again
+    cache.compute(compute, changed, fingerprint=dataset_fingerprint(df))
+    assert compute.calls == 2
+
+
+def test_least_recently_used_results_are_evicted_first():
+    cache = ResultCache(max_entries=2)
+    frames = [_frame(seed) for seed in range(3)]
+    compute = counted()
+    cache.compute(compute, frames[0])
+    cache.compute(compute, frames[1])
+    cache.compute(compute, frames[0])  # Now frames[1] is the least recently used
+    cache.compute(compute, frames[2])
+    assert cache.stats()['entries'] == 2
+
+    cache.compute(compute, frames[0])
+    assert compute.calls == 3
+    cache.compute(compute, frames[1])
+    assert compute.calls == 4
+
+
+def test_byte_cap_bounds_the_cached_results():
+    compute = counted()
+    size = _frame()['sales'].to_numpy().nbytes
+    cache = ResultCache(max_bytes=2 * size)
+    for seed in range(4):
+        cache.compute(compute, _frame(seed))
+    stats = cache.stats()
+    assert (stats['entries'], stats['bytes']) == (2, 2 * size)
+
+    # Results larger than the cap are returned but never cached
+    large = _frame(9, n=1000)
+    cache.compute(compute, large)
+    cache.compute(compute, large)
+    assert compute.calls == 6
+    assert cache.stats()['entries'] == 2
+
+
+def test_clear_empties_the_cache():
+    cache = ResultCache()
+    cache.compute(counted(), _frame())
+    cache.clear()
+    assert (cache.stats()['entries'], cache.stats()['bytes']) == (0, 0)
@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from data_cleaning import clean_data
+from rollup_cube import CUBE_DIMENSIONS, build_rollup_cube, update_rollup_cube
+from snapshot_cache import SyncResult
+
+
+def _rows(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'month': pd.to_datetime('2023-01-01') + pd.to_timedelta(rng.integers(0, 12, n) * 31, 'D'),
+        'acctype': rng.choice(['Clinic', 'Hospital'], n),
+        'district': rng.choice(['North', 'South', None], n),
+        'compbrand': rng.integers(0, 4, n),
+        'sales': rng.gamma(2.0, 500.0, n),
+        'qty': rng.integers(1, 50, n).astype(float),
+    }).assign(month=lambda df: df['month'].dt.to_period('M').dt.to_timestamp())
+
+
+def _sorted_cells(cube):
+    cells = cube.cells.astype({col: object for col in CUBE_DIMENSIONS})
+    return cells.sort_values(CUBE_DIMENSIONS, na_position='first').reset_index(drop=True)
+
+
+def test_rebuilding_changed_months_equals_a_full_build():
+    old = _rows(3000, 0)
+    new = pd.concat([old[old['month'] != old['month'].iloc[0]], _rows(200, 1)], ignore_index=True)
+    changed = set(old['month'].iloc[:1]) | set(_rows(200, 1)['month'])
+
+    rebuilt = build_rollup_cube(old).rebuild_months(new, sorted(changed))
+    expected = build_rollup_cube(new)
+    pd.testing.assert_frame_equal(_sorted_cells(rebuilt), _sorted_cells(expected), check_dtype=False)
+
+
+def test_rollup_matches_grouped_rows():
+    df = _rows(2000, 2)
+    cube = build_rollup_cube(df)
+    expected = df.groupby(['acctype', 'month'])['sales'].agg(['sum', 'mean'])
+    np.testing.assert_allclose(cube.rollup(['acctype', 'month'])['sales_sum'], expected['sum'])
+    np.testing.assert_allclose(cube.mean(['acctype', 'month'], 'sales'), expected['mean'])
+
+
+def _raw_rows(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '_record_id': [f'rec{seed}_{i}' for i in range(n)],
+        'month': rng.choice(['2024-01-01', '2024-02-01', '2024-03-01'], n),
+        'acctype': rng.choice(['Clinic', 'Hospital'], n),
+        'district': rng.integers(1, 4, n),
+        'compbrand': rng.integers(0, 4, n),
+        'sales': rng.integers(100, 5000, n),
+        'strategy1': rng.gamma(2.0, 50.0, n),
+    })
+
+
+def test_changes_without_a_field_update_the_cube(tmp_path):
+    snapshot = _raw_rows(500, 0)
+    first = SyncResult(snapshot, snapshot, snapshot.iloc[:0], True, datetime(2024, 1, 1, tzinfo=timezone.utc),
+                       None, None)
+    update_rollup_cube(first, clean_data, clean_data(snapshot), 'base', 'table', snapshot_dir=str(tmp_path))
+
+    # Airtable leaves empty fields out, so none of the changed records has a 'month' or 'strategy1' column
+    added = _raw_rows(40, 1).drop(columns=['month', 'strategy1'])
+    frame = pd.concat([snapshot.iloc[25:], added], ignore_index=True)
+    second = SyncResult(frame, added, snapshot.iloc[:25], False, datetime(2024, 1, 2, tzinfo=timezone.utc),
+                        first.watermark, None)
+    df_cleaned = clean_data(frame)
+    cube = update_rollup_cube(second, clean_data, df_cleaned, 'base', 'table', snapshot_dir=str(tmp_path))
+
+    assert cube.watermark == second.watermark.isoformat()
+    pd.testing.assert_frame_equal(_sorted_cells(cube), _sorted_cells(build_rollup_cube(df_cleaned)),
+                                  check_dtype=False)
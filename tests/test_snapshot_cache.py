@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from snapshot_cache import (RECORD_ID_COLUMN, load_snapshot, modified_since_formula, save_snapshot, snapshot_paths,
+                            sync_table)
+from stub_airtable import StubAirtable, make_records
+
+
+def _sync(stub, tmp_path, **kwargs):
+    return sync_table('token', 'app1', 'Sales', snapshot_dir=str(tmp_path), api_url=stub.url, **kwargs)
+
+
+def _changed_since_last_sync(stub, tmp_path, ids):
+    # The stub only applies the delta formula of the stored watermark
+    _, metadata = load_snapshot('app1', 'Sales', str(tmp_path))
+    stub.formulas[modified_since_formula(datetime.fromisoformat(metadata['watermark']))] = set(ids)
+
+
+def test_delta_sync_fetches_only_changes(tmp_path):
+    records = make_records(500)
+    with StubAirtable(records) as stub:
+        first = _sync(stub, tmp_path)
+        assert first.full_reload and len(first.frame) == 500
+
+        # One record updated, one deleted
+        stub.records[3] = dict(stub.records[3], fields={'accid': 'A3', 'sales': -1.0})
+        deleted = stub.records.pop(10)
+        _changed_since_last_sync(stub, tmp_path, [stub.records[3]['id']])
+        requests_before = len(stub.requests)
+        delta = _sync(stub, tmp_path)
+
+    assert len(stub.requests) - requests_before == 1
+    assert not delta.full_reload
+    assert delta.added[RECORD_ID_COLUMN].tolist() == [records[3]['id']]
+    assert delta.removed[RECORD_ID_COLUMN].tolist() == [records[3]['id']]
+    frame = delta.frame.set_index(RECORD_ID_COLUMN)
+    assert len(frame) == 500 and frame.loc[records[3]['id'], 'sales'] == -1.0
+    # Deletions are only found on demand, or once the last check is old enough
+    assert deleted['id'] in frame.index
+    assert delta.deletions_checked == first.deletions_checked
+
+
+def test_delta_sync_detects_deletions_on_demand(tmp_path):
+    with StubAirtable(make_records(250)) as stub:
+        _sync(stub, tmp_path)
+        deleted = stub.records.pop(0)
+        _changed_since_last_sync(stub, tmp_path, [])
+        delta = _sync(stub, tmp_path, detect_deletions=True)
+
+    assert delta.removed[RECORD_ID_COLUMN].tolist() == [deleted['id']]
+    assert len(delta.frame) == 249
+    _, metadata = load_snapshot('app1', 'Sales', str(tmp_path))
+    assert datetime.fromisoformat(metadata['deletions_checked']) == delta.deletions_checked
+
+
+def test_delta_sync_detects_deletions_when_the_last_check_is_old(tmp_path):
+    with StubAirtable(make_records(250)) as stub:
+        first = _sync(stub, tmp_path)
+        deleted = stub.records.pop(0)
+        _changed_since_last_sync(stub, tmp_path, [])
+        assert _sync(stub, tmp_path, deletion_check_max_age=timedelta(hours=1)).removed.empty
+
+        # Backdate the last check past the maximum age
+        _, meta_path = snapshot_paths('app1', 'Sales', str(tmp_path))
+        with open(meta_path) as f:
+            metadata = json.load(f)
+        metadata['deletions_checked'] = (first.deletions_checked - timedelta(hours=2)).isoformat()
+        with open(meta_path, 'w') as f:
+            json.dump(metadata, f)
+        _changed_since_last_sync(stub, tmp_path, [])
+        assert _sync(stub, tmp_path, deletion_check_max_age=None).removed.empty
+
+        _changed_since_last_sync(stub, tmp_path, [])
+        delta = _sync(stub, tmp_path, deletion_check_max_age=timedelta(hours=1))
+
+    assert delta.removed[RECORD_ID_COLUMN].tolist() == [deleted['id']]
+    assert delta.deletions_checked > first.deletions_checked
+
+
+def test_sync_after_empty_table(tmp_path):
+    with StubAirtable([]) as stub:
+        first = _sync(stub, tmp_path)
+        assert RECORD_ID_COLUMN in first.frame.columns and first.frame.empty
+
+        stub.records = make_records(3)
+        _changed_since_last_sync(stub, tmp_path, [record['id'] for record in stub.records])
+        delta = _sync(stub, tmp_path)
+
+    assert not delta.full_reload
+    assert sorted(delta.frame[RECORD_ID_COLUMN]) == [record['id'] for record in make_records(3)]
+
+
+def test_snapshot_without_record_ids_is_reloaded(tmp_path):
+    save_snapshot(pd.DataFrame({'sales': [1.0]}), 'app1', 'Sales', datetime.now().astimezone(), str(tmp_path))
+    with StubAirtable(make_records(4)) as stub:
+        sync = _sync(stub, tmp_path)
+    assert sync.full_reload
+    assert len(sync.frame) == 4
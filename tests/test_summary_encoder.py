@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from summary_encoder import CHARS_PER_TOKEN, encode_summary, estimate_tokens
+
+
+def summaries(seed=0):
+    """
+    Analysis results of the kinds the app sends for inference, large enough to need trimming.
+    """
+    rng = np.random.default_rng(seed)
+    columns = [f'strategy{i}' for i in range(40)]
+    data = pd.DataFrame(rng.normal(size=(500, 40)), columns=columns)
+    months = pd.date_range('2015-01-01', periods=120, freq='MS')
+    sales = pd.Series(rng.gamma(2.0, 5000.0, 120), index=months, name='sales')
+    return {
+        'correlations': data.corr(),
+        'trend': sales,
+        'monthly': pd.DataFrame({'month': months, 'sales': sales.to_numpy(), 'qty': rng.integers(1, 50, 120)}),
+        'table': data.assign(acctype=rng.choice(['Clinic', 'Hospital', 'Pharmacy'], 500)),
+        'nested': {f'segment {i}': data.iloc[:, :i + 2].corr() for i in range(30)},
+        'list': list(rng.normal(size=1000)),
+        'text': 'x' * 10_000,
+    }
+
+
+@pytest.mark.parametrize('name', list(summaries()))
+@pytest.mark.parametrize('token_budget', [20, 100, 600])
+def test_summaries_fit_the_budget(name, token_budget):
+    text = encode_summary(summaries()[name], token_budget)
+    assert estimate_tokens(text) <= token_budget
+    assert len(text) <= token_budget * CHARS_PER_TOKEN
+
+
+def test_detail_is_lowered_before_cutting_off():
+    correlations = summaries()['correlations']
+    text = encode_summary(correlations, 80)
+    assert not text.endswith(' ...')
+    assert text.startswith('strongest 8 of 780 pairs:') and len(text.split('\n')) == 9
+    assert len(encode_summary(correlations, 10_000).split('\n')) - 1 == 24
+
+
+def test_encoding_is_deterministic():
+    first, second = summaries(), summaries()
+    for name in first:
+        text = encode_summary(first[name])
+        assert encode_summary(first[name]) == text
+        assert encode_summary(second[name]) == text
+
+
+def test_tied_correlations_keep_their_order():
+    columns = ['a', 'b', 'c', 'd']
+    matrix = pd.DataFrame(np.full((4, 4), 0.5), index=columns, columns=columns)
+    np.fill_diagonal(matrix.values, 1.0)
+    text = encode_summary(matrix)
+    assert text.split('\n')[1:] == ['a~b: 0.5', 'a~c: 0.5', 'a~d: 0.5', 'b~c: 0.5', 'b~d: 0.5', 'c~d: 0.5']
+    assert encode_summary(matrix.copy()) == text
@@ -1,80 +1,367 @@
+import os
+import warnings
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
+from dataclasses import dataclass, field
 from statsmodels.tsa.seasonal import seasonal_decompose
-from statsmodels.tsa.arima.model import ARIMA
 
-def analyze_time_series(df):
+from arima_models import (INFORMATION_CRITERION, SeriesModel, degraded, differencing_order,
+                          filter_model, fit_candidate, load_models, neighbour_orders, save_models, select_model,
+                          starting_orders)
+from arima_models import forecast as arima_forecast
+from process_pools import process_pool
+
+# Series that can be forecast: label -> columns the monthly sales are split by
+TIME_SERIES_GRAINS = {
+    'Total': (),
+    'Account type': ('acctype',),
+    'District': ('district',),
+}
+
+FORECAST_STEPS = 12
+SEASONAL_PERIOD = 12
+
+# Seconds one model fit may take before it is given up
+SERIES_TIMEOUT = int(os.environ.get('SERIES_TIMEOUT', '30'))
+
+# Series shown with their full decomposition (the largest first); all are in the forecast table
+MAX_DETAILED_SERIES = 6
+
+
+@dataclass
+class SeriesForecast:
+    name: object  # 'Total', or the value(s) of the grain columns
+    sales: pd.Series  # Monthly sales (rescaled), indexed by month start
+    decomposition: object = None  # statsmodels DecomposeResult, or None if the series is too short
+    forecast: pd.Series = None  # Forecast for the next FORECAST_STEPS months, indexed by month start
+    model: SeriesModel = None  # ARIMA model the forecast comes from
+    model_status: str = None  # 'reused' (stored model still fits), 'refitted' or 'fitted' (new series)
+    error: str = None
+
+
+@dataclass
+class TimeSeriesResult:
+    grain: tuple  # Columns the sales are split by (empty for the total)
+    sales_unit: str
+    series: list = field(default_factory=list)  # SeriesForecast, largest total sales first
+
+    def forecast_table(self):
+        """
+        One row per series with its forecast for each month.
+        """
+        return pd.DataFrame({
+            str(series.name): series.forecast for series in self.series if series.forecast is not None
+        }).T
+
+    def model_table(self):
+        """
+        One row per series with its ARIMA model and whether it was reused or refitted.
+        """
+        return pd.DataFrame([
+            {
+                'Series': str(series.name),
+                'Model': series.model.describe(),
+                series.model.criterion.upper(): series.model.score,
+                'Fitted through': series.model.fitted_through,
+                'Status': series.model_status,
+            }
+            for series in self.series if series.model is not None
+        ])
+
+    def summary(self):
+        summary = {"Sales Unit": self.sales_unit.strip() or "SGD"}
+        for series in self.series:
+            entry = {"Average Sales": series.sales.mean()}
+            if series.forecast is not None:
+                entry["Model"] = series.model.describe()
+                entry["Forecast"] = {month.strftime('%Y-%m'): value for month, value in series.forecast.items()}
+            summary[str(series.name)] = entry
+        return summary
+
+
+def monthly_sales(df, grain=(), cube=None):
     """
-    Perform time series analysis by decomposing the sales data and forecasting future values.
+    Total sales per month, one column per combination of the grain columns ('Total' when the
+    grain is empty), over every month from the first to the last (months without sales are 0).
+    With a rollup_cube.RollupCube of the same data, the totals are read from the cube.
     """
-    st.header("Time Series Analysis")
+    grain = list(grain)
+    if cube is not None:
+        totals = cube.rollup(['month'] + grain)['sales_sum']
+    else:
+        data = df[['month', 'sales'] + grain].copy()
+        data['month'] = pd.to_datetime(data['month'], errors='coerce')
+        data['sales'] = pd.to_numeric(data['sales'], errors='coerce')
 
-    # Ensure that 'month' and 'sales' are in the correct format
-    df['month'] = pd.to_datetime(df['month'], errors='coerce')
-    df['sales'] = pd.to_numeric(df['sales'], errors='coerce')
+        # Drop rows with missing or invalid data
+        data = data.dropna(subset=['month', 'sales'] + grain)
+        totals = data.groupby(['month'] + grain, observed=True)['sales'].sum()
 
-    # Drop rows with missing or invalid data
-    df = df.dropna(subset=['month', 'sales'])
+    if totals.empty:
+        raise ValueError("No data available after processing. Please check your date and value columns.")
 
-    if df.empty:
-        st.warning("No data available after processing. Please check your date and value columns.")
-        return
+    # One row per calendar month
+    totals = totals.reset_index()
+    value = totals.columns[-1]
+    totals['month'] = totals['month'].dt.to_period('M').dt.to_timestamp()
+    if grain:
+        table = totals.pivot_table(index='month', columns=grain, values=value, aggfunc='sum', observed=True)
+    else:
+        table = totals.groupby('month')[value].sum().to_frame('Total')
+    months = pd.date_range(table.index.min(), table.index.max(), freq='MS')
+    return table.reindex(months, fill_value=0).fillna(0)
+
+
+def _check_series(values, index, period, stored, timeout):
+    """
+    Decompose one monthly series, choose its order of differencing and, when it has a stored
+    model, run that model over it with the stored parameters. Runs in a worker process.
+    Returns (decomposition, differencing order, diagnostics of the stored model or None, error).
+    """
+    sales = pd.Series(values, index=pd.DatetimeIndex(index, freq='MS'))
+    decomposition, error = None, None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        if len(sales) >= 2 * period:
+            decomposition = seasonal_decompose(sales, model='additive', period=period)
+        else:
+            error = f"Seasonal decomposition needs {2 * period} months, the series has {len(sales)}."
+    checked = None if stored is None else filter_model(values, index, stored, timeout)
+    return decomposition, differencing_order(values), checked, error
+
+
+def _forecast_series(values, index, model, steps, timeout):
+    """
+    Forecast one series from its model. Runs in a worker process.
+    Returns (forecast, error), one of them None.
+    """
+    try:
+        return arima_forecast(values, index, model, steps, timeout), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _map(function, tasks, executor):
+    """
+    Apply function to each task (a tuple of arguments) across the executor's processes.
+    """
+    if not tasks:
+        return []
+    return list(executor.map(function, *zip(*tasks)))
+
+
+def _start_params(stored, order, seasonal_order):
+    """
+    The parameters of the stored model to warm-start a candidate with, when it has the same order.
+    """
+    if stored is not None and (order, seasonal_order) == (tuple(stored.order), tuple(stored.seasonal_order)):
+        return stored.params
+    return None
+
+
+def compute_time_series(df, grain=(), cube=None, store=None, refit=False, criterion=INFORMATION_CRITERION,
+                        max_workers=None, timeout=SERIES_TIMEOUT, seed_store=None):
+    """
+    Aggregate the sales to one monthly series per combination of the grain columns (the total by
+    default), decompose them and forecast each with the ARIMA model chosen for it.
+
+    Models are kept in store (see arima_models.model_store_path): a series whose stored model
+    still fits (its diagnostics have not degraded) is forecast with the stored parameters as is.
+    The others get a stepwise search over the candidate orders by AIC or BIC, warm-started from
+    the stored parameters where the order is unchanged. The order of differencing is chosen
+    first (see arima_models.differencing_order), so only orders with the same d are compared.
+    Models in seed_store (e.g. those of the unfiltered series) are neither reused nor updated;
+    the search of a series with a model there starts from that model's order.
+
+    Decompositions, checks, candidate fits and forecasts all run across a process pool, each
+    with a timeout. The pool is used even with a single worker: the timeouts are alarm signals,
+    which only work in a process's main thread.
+    """
+    table = monthly_sales(df, grain, cube)
 
     # Rescale sales if necessary
-    max_sales = df['sales'].max()
+    max_sales = table.to_numpy().max()
     if max_sales > 1000000:
-        df['sales'] = df['sales'] / 1000000
-        sales_unit = " (in millions)"
+        scale, sales_unit = 1000000, " (in millions)"
     elif max_sales > 1000:
-        df['sales'] = df['sales'] / 1000
-        sales_unit = " (in thousands)"
+        scale, sales_unit = 1000, " (in thousands)"
     else:
-        sales_unit = ""
+        scale, sales_unit = 1, ""
+    table = table / scale
 
-    # Set 'month' as the index
-    df.set_index('month', inplace=True)
+    # Largest series first
+    names = list(table.sum().sort_values(ascending=False, kind='stable').index)
+    values = {name: table[name].to_numpy(dtype=float) for name in names}
+    stored = load_models(store)
+    seeds = load_models(seed_store)
+    previous = {
+        name: stored.get(str(name)) if not refit and str(name) in stored and stored[str(name)].scale == scale else None
+        for name in names
+    }
 
-    # Decompose the time series (additive model by default)
-    st.subheader("Seasonal Decomposition")
-    decomposition = seasonal_decompose(df['sales'], model='additive', period=12)
-    fig = decomposition.plot()
-    fig.suptitle(f'Seasonal Decomposition of Sales{sales_unit}', fontsize=16)
-    plt.tight_layout()
-    st.pyplot(fig)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    with process_pool(max(1, min(max_workers, len(names)))) as executor:
+        checks = _map(_check_series, [
+            (values[name], table.index, SEASONAL_PERIOD, previous[name], timeout) for name in names
+        ], executor)
 
-    # Perform ARIMA forecasting
-    st.subheader("ARIMA Forecasting")
-    
-    try:
-        model = ARIMA(df['sales'], order=(1, 1, 1))
-        model_fit = model.fit()
-
-        # Forecast for the next 12 months
-        forecast_steps = 12
-        forecast = model_fit.forecast(steps=forecast_steps)
-
-        # Generate future dates for the forecast, starting from the last date in the data
-        last_date = df.index[-1]  # Get the last date in the dataset
-        forecast_dates = pd.date_range(last_date, periods=forecast_steps + 1, freq='M')[1:]  # Generate future dates
-
-        # Plot the forecast along with the historical data
-        st.subheader("Sales Forecast for the Next 12 Months")
-        plt.figure(figsize=(10, 6))
-        plt.plot(df['sales'], label='Historical Sales', color='blue', linewidth=2)
-        plt.plot(forecast_dates, forecast, label='Forecasted Sales', color='red', linestyle='--', linewidth=2)
-        plt.xlabel('Month')
-        plt.ylabel(f'Sales{sales_unit}')
-        plt.title('Historical and Forecasted Sales')
-        plt.legend(loc='best')
-        plt.xticks(rotation=45)
-        plt.grid(True)
+        # Keep stored models whose diagnostics held up, search orders for the rest
+        models, status = {}, {}
+        for name, (_, _, checked, _) in zip(names, checks):
+            if checked is not None and not degraded(previous[name], *checked):
+                models[name], status[name] = previous[name], 'reused'
+        to_search = [name for name in names if name not in models]
+
+        # Stepwise search: fit the starting candidates (those next to the seed model's order, if
+        # any), then the orders next to each series' best so far until none of them improves on
+        # it. Every round fits the candidates of all series across the pool at once.
+        n_obs = len(table)
+        differencing = {name: d for name, (_, d, _, _) in zip(names, checks)}
+        pending = {}
+        for name in to_search:
+            seed, d = seeds.get(str(name)), differencing[name]
+            seeded = [] if seed is None else neighbour_orders(seed.order, seed.seasonal_order, n_obs, SEASONAL_PERIOD, d)
+            pending[name] = seeded or starting_orders(n_obs, SEASONAL_PERIOD, d)
+        no_candidates = {name for name, candidates in pending.items() if not candidates}
+        tried = {name: {} for name in to_search}
+        while pending:
+            searches = [(name, candidate) for name, candidates in pending.items() for candidate in candidates]
+            fits = _map(fit_candidate, [
+                (values[name], table.index, order, seasonal_order, _start_params(previous[name], order, seasonal_order), timeout)
+                for name, (order, seasonal_order) in searches
+            ], executor)
+            for (name, candidate), fit in zip(searches, fits):
+                tried[name][candidate] = fit
+            pending = {}
+            for name in to_search:
+                best = select_model(list(tried[name].items()), criterion)
+                if best is None:
+                    continue
+                order, seasonal_order, _ = best
+                candidates = [
+                    candidate for candidate in neighbour_orders(order, seasonal_order, n_obs, SEASONAL_PERIOD, order[1])
+                    if candidate not in tried[name]
+                ]
+                if candidates:
+                    pending[name] = candidates
+
+        for name in to_search:
+            best = select_model(list(tried[name].items()), criterion)
+            if best is None:
+                continue
+            order, seasonal_order, (aic, bic, params, rmse, pvalue) = best
+            models[name] = SeriesModel(
+                order=tuple(order), seasonal_order=tuple(seasonal_order), params=params, criterion=criterion,
+                score=aic if criterion == 'aic' else bic, rmse=rmse, ljung_box_pvalue=pvalue, scale=scale,
+                fitted_through=table.index[-1].strftime('%Y-%m'),
+            )
+            status[name] = 'refitted' if str(name) in stored else 'fitted'
+
+        # The forecasts run in the pool too, so each is bound by the timeout
+        forecasts = dict(zip(models, _map(_forecast_series, [
+            (values[name], table.index, model, FORECAST_STEPS, timeout) for name, model in models.items()
+        ], executor)))
+
+    if store is not None and models:
+        save_models(dict(stored, **{str(name): model for name, model in models.items()}), store)
+
+    forecast_index = pd.date_range(table.index[-1], periods=FORECAST_STEPS + 1, freq='MS')[1:]
+    result = TimeSeriesResult(tuple(grain), sales_unit)
+    for name, (decomposition, _, _, error) in zip(names, checks):
+        model = models.get(name)
+        forecast = None
+        if model is not None:
+            forecast, failure = forecasts[name]
+            if forecast is not None:
+                forecast = pd.Series(forecast, index=forecast_index)
+            else:
+                error = f"{error} ARIMA forecasting failed: {failure}" if error else f"ARIMA forecasting failed: {failure}"
+        elif name in no_candidates:
+            error = f"Too few months ({len(table)}) to fit an ARIMA model."
+        else:
+            error = "No candidate ARIMA order could be fitted (all failed or timed out)."
+        result.series.append(SeriesForecast(
+            name=name,
+            sales=table[name],
+            decomposition=decomposition,
+            forecast=forecast,
+            model=model,
+            model_status=status.get(name),
+            error=error,
+        ))
+    return result
+
+
+def render_series(series, sales_unit):
+    """
+    Plot the seasonal decomposition and the ARIMA forecast of one series.
+    """
+    if series.decomposition is not None:
+        st.subheader(f"Seasonal Decomposition: {series.name}")
+        fig = series.decomposition.plot()
+        fig.suptitle(f'Seasonal Decomposition of Sales{sales_unit}', fontsize=16)
         plt.tight_layout()
-        st.pyplot(plt)
+        st.pyplot(fig)
+        plt.close(fig)
 
-        # Provide basic inference
-        st.write(f"The ARIMA model predicts sales for the next 12 months. The forecasted values show an expected sales trend, based on historical data and seasonal patterns.")
+    if series.forecast is None:
+        st.error(f"{series.name}: {series.error}")
+        return
+    if series.error is not None:
+        st.warning(f"{series.name}: {series.error}")
 
-    except Exception as e:
-        st.error(f"Error performing ARIMA forecasting: {e}")
+    # Plot the forecast along with the historical data
+    st.subheader(f"Sales Forecast for the Next {FORECAST_STEPS} Months: {series.name}")
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.plot(series.sales, label='Historical Sales', color='blue', linewidth=2)
+    ax.plot(series.forecast.index, series.forecast, label='Forecasted Sales', color='red', linestyle='--', linewidth=2)
+    ax.set_xlabel('Month')
+    ax.set_ylabel(f'Sales{sales_unit}')
+    ax.set_title('Historical and Forecasted Sales')
+    ax.legend(loc='best')
+    ax.tick_params(axis='x', rotation=45)
+    ax.grid(True)
+    fig.tight_layout()
+    st.pyplot(fig)
+    plt.close(fig)
+
+
+def render_time_series(result):
+    """
+    Plot the seasonal decomposition and the ARIMA forecast of each series.
+    """
+    st.header("Time Series Analysis")
+
+    if len(result.series) > 1:
+        st.subheader(f"Forecasts by {' × '.join(result.grain)}{result.sales_unit}")
+        st.dataframe(result.forecast_table())
+    models = result.model_table()
+    if not models.empty:
+        st.subheader("Forecasting Models")
+        st.dataframe(models)
+
+    if len(result.series) > MAX_DETAILED_SERIES:
+        st.info(f"Showing details for the {MAX_DETAILED_SERIES} largest of {len(result.series)} series; "
+                f"all forecasts are listed in the tables above.")
 
+    for series in result.series[:MAX_DETAILED_SERIES]:
+        render_series(series, result.sales_unit)
+
+    # Provide basic inference
+    st.write(f"The ARIMA model predicts sales for the next {FORECAST_STEPS} months. The forecasted values show an expected sales trend, based on historical data and seasonal patterns.")
+
+
+def analyze_time_series(df, grain=()):
+    """
+    Perform time series analysis by decomposing the sales data and forecasting future values.
+    """
+    try:
+        result = compute_time_series(df, grain)
+    except ValueError as e:
+        st.header("Time Series Analysis")
+        st.warning(str(e))
+        return
+    render_time_series(result)
+    return result.summary()
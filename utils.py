@@ -1,8 +1,7 @@
 # utils.py
 
-import pandas as pd
 import streamlit as st
-from pyairtable import Api
+from airtable_loader import fetch_table_frame
 
 # Load data from Airtable
 def load_data_from_airtable(api_token, base_id, table_name):
@@ -18,18 +17,8 @@ def load_data_from_airtable(api_token, base_id, table_name):
     DataFrame containing the loaded data
     """
     try:
-        # Initialize Airtable API
-        api = Api(api_token)
-
-        # Get the table object
-        table = api.table(base_id, table_name)
-
-        # Fetch all records from the Airtable table
-        records = table.all()
-
-        # Extract fields and convert to DataFrame
-        data = [record['fields'] for record in records]
-        df = pd.DataFrame(data)
+        # Fetch all pages concurrently and build the DataFrame column by column
+        df = fetch_table_frame(api_token, base_id, table_name)
 
         return df
     except Exception as e: